@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+import argparse
+import json
+import os
+from pathlib import Path
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+from colorama import init, Fore, Back
+init( autoreset=True )
+
+from vidz.convert import cConvert, ENGINES
+from vidz.deinterlace import cDeinterlace
+from vidz.probe import cProbe
+from vidz.runner import cRunner
+from vidz.scene import cScene, cInterval, SecondsToTimecode
+from vidz.source import cSourceFile
+from vidz.video import cVideo
+
+#---
+
+parser = argparse.ArgumentParser( description='Benchmark the clean/convert of split-and-clean.py and vob.py on synthetic sources.' )
+parser.add_argument( '-s', '--sizes',       type=int, nargs='+', default=[ 60, 300 ],   help='Durations (in seconds) of the synthetic sources' )
+parser.add_argument( '-e', '--engines',     choices=ENGINES, nargs='+', default=ENGINES, help='Engines of split-and-clean.py to benchmark' )
+parser.add_argument( '-c', '--chunks',      type=int,            default=os.cpu_count(), help='Number of chunks for the chunked cases (1 to skip them)' )
+parser.add_argument( '-r', '--repeat',      type=int,            default=1,             help='Number of runs of each case (the fastest one is kept)' )
+parser.add_argument( '-d', '--directory',                        default='benchmark',   help='Working directory (the sources are kept between the runs)' )
+parser.add_argument( '-o', '--output',                                                  help='Results file (json), default: <directory>/results-<date>.json' )
+parser.add_argument( '--ffmpeg',                                 default=shutil.which( 'ffmpeg' ),  help='The ffmpeg command pathfile' )
+parser.add_argument( '--ffprobe',                                default=shutil.which( 'ffprobe' ), help='The ffprobe command pathfile' )
+parser.add_argument( '--compare',                   nargs=2,                            help='Compare 2 results files (before, after) instead of running' )
+args = parser.parse_args()
+
+#---
+
+## Compare the results of 2 runs
+#
+#  @param  iBefore  pathlib.Path  The results of the first run
+#  @param  iAfter   pathlib.Path  The results of the second run
+def Compare( iBefore, iAfter ):
+    before = { ( r['case'], r['size'], r['interlaced'], r['phase'] ): r['seconds'] for r in json.loads( iBefore.read_text() )['results'] }
+    after = { ( r['case'], r['size'], r['interlaced'], r['phase'] ): r['seconds'] for r in json.loads( iAfter.read_text() )['results'] }
+
+    for key in sorted( before.keys() & after.keys() ):
+        case, size, interlaced, phase = key
+        ratio = after[key] / max( before[key], 0.001 )
+        color = Fore.GREEN if ratio < 0.95 else Fore.RED if ratio > 1.05 else Fore.WHITE
+        print( color + f'{case:>20} {size:>5}s {"i" if interlaced else "p"} {phase:>8}: {before[key]:8.2f}s -> {after[key]:8.2f}s (x{ratio:.2f})' )
+    for key in sorted( before.keys() ^ after.keys() ):
+        print( Fore.YELLOW + f'{key} is only in {"before" if key in before else "after"}' )
+
+if args.compare:
+    Compare( Path( args.compare[0] ), Path( args.compare[1] ) )
+    sys.exit()
+
+if args.ffmpeg is None or not Path( args.ffmpeg ).exists():
+    print( Back.RED + f'ffmpeg binary path doesn\'t exist: {args.ffmpeg}' )
+    sys.exit()
+if args.ffprobe is None or not Path( args.ffprobe ).exists():
+    print( Back.RED + f'ffprobe binary path doesn\'t exist: {args.ffprobe}' )
+    sys.exit()
+
+ffmpeg = Path( args.ffmpeg ).resolve()
+ffprobe = Path( args.ffprobe ).resolve()
+directory = Path( args.directory ).resolve()
+directory.mkdir( parents=True, exist_ok=True )
+
+#---
+
+## Create a synthetic source (if it doesn't already exist)
+#
+#  The video is a test pattern (pal), with 2 audio streams: english first, then french.
+#  An interlaced source is encoded as top field first, like the dvr/dvd recordings
+#
+#  @param  iDuration    int           The duration (in seconds)
+#  @param  iInterlaced  bool          The video is interlaced
+#  @param  iFormat      string        The container ('mpegts' for the dvr, 'vob' for the dvd)
+#  @param  iOutput      pathlib.Path  The source file
+#  @return              bool          The source exists
+def Generate( iDuration, iInterlaced, iFormat, iOutput ):
+    if iOutput.exists():
+        return True
+
+    if iInterlaced:
+        video = [ '-f', 'lavfi', '-i', f'testsrc2=size=720x576:rate=50:duration={iDuration}' ]
+        filters = [ '-vf', 'tinterlace=mode=interleave_top,setfield=tff', '-flags', '+ilme+ildct', '-top', '1' ]
+    else:
+        video = [ '-f', 'lavfi', '-i', f'testsrc2=size=720x576:rate=25:duration={iDuration}' ]
+        filters = []
+
+    temporary = iOutput.with_name( f'{iOutput.stem}.part{iOutput.suffix}' )
+    command = [ ffmpeg,
+                '-nostdin', '-y',
+                '-v', 'error',
+                *video,
+                '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={iDuration}',
+                '-f', 'lavfi', '-i', f'sine=frequency=880:sample_rate=48000:duration={iDuration}',
+                '-map', '0:v', '-map', '1:a', '-map', '2:a',
+                *filters,
+                '-c:v', 'mpeg2video', '-b:v', '5M', '-g', '12',
+                '-c:a', 'mp2' if iFormat == 'mpegts' else 'ac3', '-b:a', '192k',
+                '-metadata:s:a:0', 'language=eng',
+                '-metadata:s:a:1', 'language=fra',
+                '-f', iFormat,
+                temporary ]
+
+    print( Fore.CYAN + f'generate: {iOutput.name}' )
+    result = runner.Run( command )
+    if result.returncode:
+        temporary.unlink( missing_ok=True )
+        return False
+
+    os.replace( temporary, iOutput )
+    return True
+
+## Get the intervals of a synthetic source (3 parts, like a recording with ads)
+#
+#  @param  iDuration  int      The duration of the source (in seconds)
+#  @return            tuple[]  The start and the end of each interval (timecodes)
+def Intervals( iDuration ):
+    return [ ( SecondsToTimecode( iDuration * start ), SecondsToTimecode( iDuration * end ) )
+             for start, end in ( ( 0.05, 0.30 ), ( 0.40, 0.65 ), ( 0.75, 0.95 ) ) ]
+
+## Write the data.xml of the synthetic sources
+#
+#  It's not used by the benchmark itself, but it allows to run split-and-clean.py on the same entries
+#
+#  @param  iSources  tuple[]       The name, the duration and the file of each source
+#  @param  iOutput   pathlib.Path  The output directory of the entries
+def WriteData( iSources, iOutput ):
+    iOutput.mkdir( exist_ok=True )
+
+    root = ET.Element( 'root', ffmpeg=str( ffmpeg ), ffprobe=str( ffprobe ), output=str( iOutput ) )
+    for name, duration, pathfile in iSources:
+        xml_video = ET.SubElement( root, 'video', id=name, qscale='5', name=name )
+        xml_scene = ET.SubElement( xml_video, 'scene', file=str( pathfile ) )
+        for ss, to in Intervals( duration ):
+            ET.SubElement( xml_scene, 'interval', ss=ss, to=to )
+
+    ET.indent( root )
+    ET.ElementTree( root ).write( directory / 'data.xml', encoding='UTF-8', xml_declaration=True )
+
+## Split a synthetic vob in the files of a dvd folder (if it doesn't already exist)
+#
+#  A dvd splits its program stream in files of 1GB (at any sector), so the parts are only byte ranges
+#
+#  @param  iPathFile  pathlib.Path  The synthetic vob
+#  @param  iParts     int           The number of vob files
+#  @return            pathlib.Path  The 'VIDEO_TS' folder (VTS_01_1.VOB, VTS_01_2.VOB, ...)
+def SplitVob( iPathFile, iParts=3 ):
+    video_ts = iPathFile.with_suffix( '.VIDEO_TS' )
+    if video_ts.exists():
+        return video_ts
+
+    temporary = video_ts.with_name( f'{video_ts.name}.part' )
+    shutil.rmtree( temporary, ignore_errors=True )
+    temporary.mkdir()
+
+    size = iPathFile.stat().st_size
+    part_size = -( -size // iParts // 2048 ) * 2048
+    with iPathFile.open( 'rb' ) as infile:
+        for i in range( iParts ):
+            ( temporary / f'VTS_01_{i + 1}.VOB' ).write_bytes( infile.read( part_size ) )
+
+    os.replace( temporary, video_ts )
+    return video_ts
+
+## Write the data-vob.xml of a synthetic dvd
+#
+#  @param  iId      string        The id of the source
+#  @param  iName    string        The name of the video
+#  @param  iOutput  pathlib.Path  The output directory (with the '<id>.<name>/VIDEO_TS' dvd folder)
+def WriteDataVob( iId, iName, iOutput ):
+    root = ET.Element( 'root', ffmpeg=str( ffmpeg ), ffprobe=str( ffprobe ), output=str( iOutput ) )
+    root.set( 'dvd-root', str( iOutput ) )
+    xml_source = ET.SubElement( root, 'source', id=iId )
+    xml_video = ET.SubElement( xml_source, 'video', qscale='5', name=iName )
+    ET.SubElement( xml_video, 'file', vts='1', position='1' )
+
+    ET.indent( root )
+    ET.ElementTree( root ).write( iOutput / 'data-vob.xml', encoding='UTF-8', xml_declaration=True )
+
+## Get a new (empty) output directory for a run
+#
+#  @param  iName  string        The name of the run
+#  @return        pathlib.Path  The directory
+def RunDirectory( iName ):
+    path = directory / 'runs' / iName
+    shutil.rmtree( path, ignore_errors=True )
+    path.mkdir( parents=True )
+    return path
+
+## Benchmark split-and-clean.py (through cConvert, to time the clean and the convert separately)
+#
+#  A new output directory is used for each run, so nothing is reused from a previous run (manifest, probe index)
+#
+#  @param  iName        string        The name of the source
+#  @param  iPathFile    pathlib.Path  The source
+#  @param  iDuration    int           The duration of the source (in seconds)
+#  @param  iEngine      string        The engine of the convert
+#  @param  iChunks      int           The number of chunks
+#  @param  iInterlaced  bool          The source is interlaced (and deinterlaced)
+#  @return              dict          The time (in seconds) of each phase (and their cpu time)
+#  @return              None          A phase has failed
+def RunSplitAndClean( iName, iPathFile, iDuration, iEngine, iChunks, iInterlaced ):
+    output = RunDirectory( f'{iName}.{iEngine}.{iChunks}' )
+    probe = cProbe( ffprobe, output / 'vidz.probe.json', iRunner=runner )
+
+    video = cVideo( iName, iName, '5' )
+    video.BuildOutput( output )
+
+    source = cSourceFile( str( iPathFile ) )
+    source.Build()
+    scene = cScene( video )
+    scene.Source( source )
+    amap = probe.AudioOrder( iPathFile )
+    for ss, to in Intervals( iDuration ):
+        interval = cInterval()
+        interval.SS( ss )
+        interval.To( to )
+        interval.AMap( amap )
+        scene.AddInterval( interval )
+    scene.BuildOutput()
+
+    convert = cConvert( ffmpeg, probe, video, [ scene ] )
+    convert.Engine( iEngine )
+    convert.Chunks( iChunks )
+    convert.Deinterlace( cDeinterlace( probe, 'always' if iInterlaced else 'never' ) )
+    convert.Runner( cRunner( output / 'vidz.logs', iKeepResults=True ) )
+
+    phases = { 'cpu': {} }
+    start = time.perf_counter()
+    if not convert.RunClean( 1 ):
+        return None
+    phases['clean'] = time.perf_counter() - start
+    phases['cpu']['clean'] = CpuTime( convert.Runner().Results() )
+
+    start = time.perf_counter()
+    count = len( convert.Runner().Results() )
+    if not convert.RunConvert():
+        return None
+    phases['convert'] = time.perf_counter() - start
+    phases['cpu']['convert'] = CpuTime( convert.Runner().Results()[count:] )
+
+    phases['output_size'] = video.OutputAvi().stat().st_size
+    return phases
+
+## Benchmark vob.py (as a command, its code is not in the vidz package)
+#
+#  The dvd folder is linked in a new output directory, then vob.py concats (with the mode) and converts the vob files.
+#  The time of the concat is read from the history written by vob.py, the convert is the rest of the run
+#
+#  @param  iName        string        The name of the source
+#  @param  iVideoTS     pathlib.Path  The 'VIDEO_TS' folder of the source
+#  @param  iChunks      int           The number of chunks
+#  @param  iConcat      string        The concat mode of vob.py ('virtual', 'copy', 'cat')
+#  @param  iInterlaced  bool          The source is interlaced (and deinterlaced)
+#  @return              dict          The time (in seconds) of the concat (except 'virtual') and of the convert
+#  @return              None          The convert has failed
+def RunVob( iName, iVideoTS, iChunks, iConcat, iInterlaced ):
+    output = RunDirectory( f'{iName}.vob.{iConcat}.{iChunks}' )
+    video_ts = output / f'1.{iName}' / 'VIDEO_TS'
+    video_ts.mkdir( parents=True )
+    for pathfile in iVideoTS.iterdir():
+        try:
+            os.link( pathfile, video_ts / pathfile.name )
+        except OSError:
+            shutil.copyfile( pathfile, video_ts / pathfile.name )
+    WriteDataVob( '1', iName, output )
+
+    # The cpu time includes the one of the ffmpeg commands (waited by vob.py)
+    result = runner.Run( [ sys.executable, Path( __file__ ).resolve().parent / 'vob.py', '-i', '1',
+                           '-c', str( iChunks ),
+                           '--concat', iConcat,
+                           '--deinterlace', 'always' if iInterlaced else 'never' ], cwd=output, stdin=subprocess.DEVNULL )
+
+    avi = output / f'{iName}.avi'
+    if result.returncode or not avi.exists():
+        return None
+
+    phases = { 'cpu': {}, 'output_size': avi.stat().st_size }
+    concat_seconds, concat_cpu = 0.0, 0.0
+    if iConcat != 'virtual':
+        with sqlite3.connect( output / 'vidz.history.sqlite' ) as connection:
+            row = connection.execute( 'SELECT wall_seconds, cpu_seconds FROM steps WHERE kind = \'concat\' AND returncode = 0' ).fetchone()
+        if row is None:
+            return None
+        concat_seconds, concat_cpu = row
+        phases['concat'] = concat_seconds
+        # The kernel copy runs in vob.py itself (its cpu time is in the one of vob.py)
+        phases['cpu']['concat'] = concat_cpu
+
+    phases['convert'] = result.WallTime() - concat_seconds
+    cpu_time = result.CpuTime()
+    phases['cpu']['convert'] = cpu_time - ( concat_cpu or 0.0 ) if cpu_time is not None else None
+    return phases
+
+## Get the cpu time of some commands
+#
+#  @param  iResults  cResult[]  The results of the commands
+#  @return           float      The cpu time (in seconds)
+#  @return           None       It's unknown
+def CpuTime( iResults ):
+    if any( result.CpuTime() is None for result in iResults ):
+        return None
+    return sum( result.CpuTime() for result in iResults )
+
+#---
+
+runner = cRunner( directory / 'logs' )
+runner.CancelOnInterrupt()
+
+sources_directory = directory / 'sources'
+sources_directory.mkdir( exist_ok=True )
+
+sources = []
+for size in args.sizes:
+    for interlaced in ( False, True ):
+        name = f'synthetic-{size}{"i" if interlaced else "p"}'
+        ts = sources_directory / f'{name}.ts'
+        vob = sources_directory / f'{name}.vob'
+        if not Generate( size, interlaced, 'mpegts', ts ) or not Generate( size, interlaced, 'vob', vob ):
+            print( Back.RED + f'can\'t generate source: {name}' )
+            sys.exit()
+        sources.append( ( name, size, interlaced, ts, SplitVob( vob ) ) )
+
+WriteData( [ ( name, size, ts ) for name, size, _, ts, _ in sources ], directory / 'output' )
+
+cases = [ ( engine, 1 ) for engine in args.engines ]
+if args.chunks > 1:
+    cases.append( ( 'two-pass', args.chunks ) )
+
+# The concat modes of vob.py (without chunks), then the chunks (from the virtual concat)
+vob_cases = [ ( 'virtual', 1 ), ( 'copy', 1 ) ]
+if shutil.which( 'cat' ) is not None:
+    vob_cases.append( ( 'cat', 1 ) )
+if args.chunks > 1:
+    vob_cases.append( ( 'virtual', args.chunks ) )
+
+results = []
+
+## Add the results of a case
+#
+#  The fastest run is kept for each phase
+#
+#  @param  iCase        string    The name of the case
+#  @param  iSize        int       The duration of the source (in seconds)
+#  @param  iInterlaced  bool      The source is interlaced
+#  @param  iRuns        dict[]    The phases of each run
+def AddResults( iCase, iSize, iInterlaced, iRuns ):
+    if any( run is None for run in iRuns ):
+        print( Back.RED + f'failed: {iCase} {iSize}s' )
+        return
+
+    for phase in iRuns[0]:
+        if phase in ( 'output_size', 'cpu' ):
+            continue
+        fastest = min( iRuns, key=lambda iRun: iRun[phase] )
+        seconds = fastest[phase]
+        cpu_seconds = fastest['cpu'].get( phase )
+        results.append( { 'case': iCase, 'size': iSize, 'interlaced': iInterlaced, 'phase': phase,
+                          'seconds': round( seconds, 3 ), 'speed': round( iSize / max( seconds, 0.001 ), 2 ),
+                          'cpu_seconds': round( cpu_seconds, 3 ) if cpu_seconds is not None else None,
+                          'output_size': iRuns[0]['output_size'] } )
+        cpu = f', cpu {cpu_seconds:.2f}s' if cpu_seconds is not None else ''
+        print( Fore.GREEN + f'{iCase:>20} {iSize:>5}s {"i" if iInterlaced else "p"} {phase:>8}: {seconds:8.2f}s (x{iSize / max( seconds, 0.001 ):.1f} realtime{cpu})' )
+
+for name, size, interlaced, ts, video_ts in sources:
+    for engine, chunks in cases:
+        runs = [ RunSplitAndClean( name, ts, size, engine, chunks, interlaced ) for _ in range( args.repeat ) ]
+        AddResults( f'{engine}' if chunks == 1 else f'{engine}.chunks-{chunks}', size, interlaced, runs )
+
+    for concat, chunks in vob_cases:
+        runs = [ RunVob( name, video_ts, chunks, concat, interlaced ) for _ in range( args.repeat ) ]
+        case = 'vob' if concat == 'virtual' else f'vob.{concat}'
+        AddResults( case if chunks == 1 else f'{case}.chunks-{chunks}', size, interlaced, runs )
+
+version = runner.Run( [ ffmpeg, '-version' ], iCapture=True ).stdout.splitlines()
+commit = runner.Run( [ 'git', 'rev-parse', 'HEAD' ], iCapture=True, cwd=Path( __file__ ).resolve().parent ).stdout.strip()
+
+output = Path( args.output ) if args.output else directory / f'results-{time.strftime( "%Y%m%d-%H%M%S" )}.json'
+output.write_text( json.dumps( { 'date': time.strftime( '%Y-%m-%d %H:%M:%S' ),
+                                 'commit': commit,
+                                 'ffmpeg': version[0] if version else None,
+                                 'python': platform.python_version(),
+                                 'machine': platform.platform(),
+                                 'cpus': os.cpu_count(),
+                                 'arguments': vars( args ),
+                                 'results': results }, indent=4 ) )
+
+print( Fore.CYAN + f'results: {output}' )
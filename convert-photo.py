@@ -10,21 +10,32 @@
 #
 
 import argparse
-import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
 from pathlib import Path
-import platform
 import sys
+import threading
+import time
 
 from colorama import init, Fore, Back, Style
 init( autoreset=True )
 
-from vidz.convert import cConvert
-from vidz.scene import cScene
+from vidz.budget import cThreadBudget
+from vidz.manifest import PartialOutput
+from vidz.runner import cRunner
+from vidz.size import FormatSize
 
 #---
 
 parser = argparse.ArgumentParser( description='Convert video to xvid.avi.' )
 parser.add_argument( 'directory', metavar='Directory', nargs=1, help='The directory to convert videos' )
+parser.add_argument( '-j', '--jobs',    type=int, default=2,     help='Number of videos converted at the same time' )
+parser.add_argument( '-q', '--qscale',  type=int, default=5,     help='The quality of the video (1: best, 31: worst)' )
+parser.add_argument( '-t', '--threads', type=int, default=os.cpu_count(), help='Number of threads shared by all the commands' )
+parser.add_argument( '-n', '--dry-run', action='store_true',     help='Only list the videos to convert' )
+parser.add_argument( '--logs',                           help='Write the stderr of each command in its own file in this directory' )
+parser.add_argument( '--ffmpeg',        default='./ffmpeg-6.0-essentials_build-win64/bin/ffmpeg.exe', help='The ffmpeg command pathfile' )
 args = parser.parse_args()
 
 #---
@@ -34,7 +45,7 @@
     print( Back.RED + f'directory doesn\'t exist: {directory}' )
     sys.exit()
 
-ffmpeg = Path( './ffmpeg-6.0-essentials_build-win64/bin/ffmpeg.exe' )
+ffmpeg = Path( args.ffmpeg )
 if not ffmpeg.exists():
     print( Back.RED + f'ffmpeg binary path doesn\'t exist: {ffmpeg}' )
     sys.exit()
@@ -43,63 +54,179 @@
 
 print( Fore.CYAN + f'source: {directory}' )
 
-def sizeof_fmt( iSize, iSuffix='o' ):
-    magnitude = int( math.floor( math.log( iSize, 1024 ) ) )
-    val = iSize / math.pow( 1024, magnitude )
-    if magnitude > 7:
-        return '{:.1f}{}{}'.format( val, 'Y', iSuffix )
-    return '{:3.1f} {}{}'.format( val, ['', 'K', 'M', 'G', 'T', 'P', 'E', 'Z'][magnitude], iSuffix )
+#                Images                                                Data                                 DVD
+IGNORED = [ '.jpg', '.jpeg', '.png', '.bmp', '.gif', '.thm' ] + [ '.pdf', '.zip', '.pps', '.ini' ] + [ '.ifo', '.dat', '.bup', '.vob' ]
+CONVERTED = [ '.avi' ] #TODO: check XVID tag
+VIDEOS = [ '.mp4', '.mpeg4', '.mpg', '.3gp', '.mov', '.wmv', '.vro' ]
 
-class cSceneSingle( cScene ):
-    def Build( self, iPathFile ):
-        self.mOutputClean = iPathFile
-        self.mOutputAvi = iPathFile.with_suffix( '.avi' )
+## The catalog file (in the directory)
+CATALOG = 'vidz.convert-photo.json'
+
+## Scan a directory (and its sub-directories)
+#
+#  Each file is stat only once (and for free on windows, with the directory entry)
+#
+#  @param  iDirectory  pathlib.Path  The directory
+#  @return             dict[]        The videos (pathfile, size, mtime_ns)
+def Scan( iDirectory ):
+    videos = []
+    directories = [ iDirectory ]
+    while directories:
+        with os.scandir( directories.pop() ) as it:
+            for entry in it:
+                if entry.is_dir():
+                    directories.append( entry.path )
+                    continue
+                if not entry.is_file() or entry.name == CATALOG:
+                    continue
+
+                suffix = Path( entry.name ).suffix.lower()
+                if suffix in IGNORED or suffix in CONVERTED:
+                    continue
+
+                stat = entry.stat()
+                if suffix in VIDEOS:
+                    videos.append( { 'pathfile': Path( entry.path ), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns } )
+                    continue
+
+                print( Fore.YELLOW + f'It\'s not an image/video/data: {entry.path} [{FormatSize( stat.st_size )}]' )
+
+    return videos
+
+## The catalog of the converted videos
+#
+#  A video is converted again only if it has changed (size or modification time) or if its avi doesn't exist anymore
+class cPhotoCatalog:
+
+    ## The constructor
+    #
+    #  @param  iPathFile  pathlib.Path  The catalog file (json)
+    def __init__( self, iPathFile ):
+        self.mPathFile = iPathFile
+        self.mVideos = {}
+
+        self.mLock = threading.Lock()
+
+        if self.mPathFile.exists():
+            try:
+                self.mVideos = json.loads( self.mPathFile.read_text() )
+            except ValueError:
+                self.mVideos = {}
+
+    ## Check if a video has already been converted
+    #
+    #  @param  iVideo  dict  The video
+    #  @return         bool  The video has been converted, and its avi still exists
+    def IsConverted( self, iVideo ):
+        with self.mLock:
+            video = self.mVideos.get( str( iVideo['pathfile'] ) )
+        if video is None or video['size'] != iVideo['size'] or video['mtime_ns'] != iVideo['mtime_ns']:
+            return False
+        return Path( video['output'] ).exists()
+
+    ## Save a converted video
+    #
+    #  @param  iVideo    dict          The video
+    #  @param  iOutput   pathlib.Path  The avi file
+    #  @param  iSeconds  float         The time of the convert (None if it was already converted)
+    def Converted( self, iVideo, iOutput, iSeconds ):
+        with self.mLock:
+            self.mVideos[str( iVideo['pathfile'] )] = { 'size': iVideo['size'],
+                                                        'mtime_ns': iVideo['mtime_ns'],
+                                                        'output': str( iOutput ),
+                                                        'output_size': iOutput.stat().st_size,
+                                                        'seconds': iSeconds }
+
+            temporary = PartialOutput( self.mPathFile )
+            temporary.write_text( json.dumps( self.mVideos, indent=4 ) )
+            os.replace( temporary, self.mPathFile )
+
+## Convert a video to an avi file
+#
+#  @param  iVideo  dict   The video
+#  @return         float  The time of the convert (in seconds)
+#  @return         None   The convert has failed
+def Convert( iVideo ):
+    output = iVideo['pathfile'].with_suffix( '.avi' )
+    temporary = PartialOutput( output )
+    command = [ ffmpeg,
+                '-nostdin', '-y',
+                '-v', 'error',
+                '-i', iVideo['pathfile'],
+                '-map', '0:v:0',
+                '-map', '0:a?',
+                '-qscale:v', str( args.qscale ),
+                '-acodec', 'mp3',
+                '-vtag', 'XVID',
+                temporary ]
+
+    allocation = budget.Acquire( command, args.jobs )
+    result = runner.Run( allocation.Apply( command ) )
+    allocation.Release()
+    if result.returncode:
+        if result.Log() is not None:
+            print( Fore.RED + f'log: {result.Log()}' )
+        temporary.unlink( missing_ok=True )
+        return None
+
+    os.replace( temporary, output )
+    return result.WallTime()
 
 #---
 
-results = []
+catalog = cPhotoCatalog( directory / CATALOG )
+budget = cThreadBudget( args.threads )
+runner = cRunner( Path( args.logs ) if args.logs else None )
+runner.CancelOnInterrupt()
 
-for element in directory.rglob( '*' ):
-    if not element.is_file():
+videos = []
+for video in Scan( directory ):
+    output = video['pathfile'].with_suffix( '.avi' )
+    if catalog.IsConverted( video ):
         continue
-
-    #                            Images                                                Data                                 DVD
-    if element.suffix.lower() in [ '.jpg', '.jpeg', '.png', '.bmp', '.gif', '.thm' ] + [ '.pdf', '.zip', '.pps', '.ini' ] + [ '.ifo', '.dat', '.bup', '.vob' ]:
+    if output.exists():
+        # Converted before the catalog
+        print( Fore.YELLOW + f'Convertion already exists: {video["pathfile"]} [{FormatSize( output.stat().st_size )}]' )
+        catalog.Converted( video, output, None )
         continue
+    videos.append( video )
 
-    if element.suffix.lower() in [ '.avi' ]: #TODO: check XVID tag
-        continue
+# Longest job first: the biggest videos start first, the small ones fill the workers at the end
+videos = sorted( videos, key=lambda iVideo: iVideo['size'], reverse=True )
 
-    if element.suffix.lower() in [ '.mp4', '.mpeg4', '.mpg', '.3gp', '.mov', '.wmv', '.vro' ]:
-        results.append( { 'pathfile': element, 'size': element.stat().st_size } )
-        continue
+full_size = sum( video['size'] for video in videos )
+print( f'to convert: {len( videos )} video(s) [{FormatSize( full_size )}]' )
 
-    print( Fore.YELLOW + f'It\'s not an image/video/data: {element} [{sizeof_fmt(element.stat().st_size)}]' )
-
-results = sorted( results, key=lambda iElement: iElement['size'], reverse=True )
+if args.dry_run:
+    for video in videos:
+        print( f'Process: {video["pathfile"]} [{FormatSize( video["size"] )}]' )
+    sys.exit()
 
 #---
 
-for result in results:
-    pathfile = result['pathfile']
-    size = result['size']
-    print( f'Process: {pathfile} [{sizeof_fmt(size)}]' )
-
-    scene = cSceneSingle( None )
-    scene.QScale( 5 )
-    scene.Build( pathfile )
-
-    if scene.OutputAvi().exists():
-        print( Fore.YELLOW + f'Convertion already exists: {pathfile} [{sizeof_fmt(pathfile.stat().st_size)}]' )
-        continue
-
-    convert = cConvert( ffmpeg, None, scene )
-    # convert.RunConvert()
-
-    # convert ~50Go mp4 to certainly + ~250Go avi -_-
+start = time.perf_counter()
+converted_size = 0
+failures = []
+with ThreadPoolExecutor( max_workers=max( args.jobs, 1 ) ) as executor:
+    futures = { executor.submit( Convert, video ): video for video in videos }
+    for future in as_completed( futures ):
+        video = futures[future]
+        elapsed = future.result()
+        if elapsed is None:
+            print( Back.RED + f'can\'t convert: {video["pathfile"]}' )
+            failures.append( video )
+            continue
+
+        output = video['pathfile'].with_suffix( '.avi' )
+        catalog.Converted( video, output, elapsed )
+
+        converted_size += video['size']
+        wall_time = time.perf_counter() - start
+        print( Fore.GREEN + f'Converted: {video["pathfile"]} [{FormatSize( video["size"] )} -> {FormatSize( output.stat().st_size )}] '
+                            f'in {elapsed:.1f}s ({FormatSize( video["size"] / max( elapsed, 0.001 ) )}/s)' )
+        print( Fore.GREEN + f'total: {FormatSize( converted_size )} / {FormatSize( full_size )} in {wall_time:.1f}s ({FormatSize( converted_size / max( wall_time, 0.001 ) )}/s)' )
 
 #---
 
 print()
-full_size = sum( [ result['size'] for result in results ] )
-print( f'size: {sizeof_fmt(full_size)}' )
+print( f'size: {FormatSize( converted_size )} converted in {time.perf_counter() - start:.1f}s, {len( failures )} failure(s)' )
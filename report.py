@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+import argparse
+from pathlib import Path
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+from colorama import init, Fore, Back
+init( autoreset=True )
+
+from vidz.history import cHistory, TRENDS
+
+#---
+
+parser = argparse.ArgumentParser( description='Show the trends of the previous runs (from the history).' )
+parser.add_argument( 'history',          nargs='?',                              help='The history file (default: vidz.history.sqlite in the output of data.xml)' )
+parser.add_argument( '-b', '--by',       choices=TRENDS, nargs='+', default=TRENDS, help='Group the commands by source drive and/or by profile (engine, qscale, chunks, deinterlacing)' )
+parser.add_argument( '-r', '--runs',     type=int,   default=10,                 help='Number of previous runs compared to the last one' )
+parser.add_argument( '-t', '--threshold', type=float, default=20,                help='Slowdown (in %%) of the last run to be a regression' )
+parser.add_argument( '-a', '--all',      action='store_true',                    help='Show all the runs of each group (not only the last ones)' )
+args = parser.parse_args()
+
+#---
+
+if args.history is not None:
+    pathfile = Path( args.history )
+else:
+    data = Path( './data.xml' )
+    if not data.exists():
+        print( Back.RED + f'data.xml file doesn\'t exist: {data}' )
+        sys.exit()
+    pathfile = Path( ET.parse( data ).getroot().get( 'output' ) ) / 'vidz.history.sqlite'
+
+if not pathfile.exists():
+    print( Back.RED + f'history file doesn\'t exist: {pathfile}' )
+    sys.exit()
+
+history = cHistory( pathfile )
+
+#---
+
+## Format a measure of a run
+#
+#  @param  iRun      dict    The run
+#  @param  iMeasure  string  The measure ('realtime', 'mbps', 'fps', 'cpu')
+#  @return           string  The measure
+def FormatMeasure( iRun, iMeasure ):
+    value = iRun[iMeasure]
+    if value is None:
+        return '?'
+    if iMeasure == 'realtime':
+        return f'x{value:.2f}'
+    if iMeasure == 'mbps':
+        return f'{value:.1f}MB/s'
+    if iMeasure == 'fps':
+        return f'{value:.0f}fps'
+    return f'{value:.1f}cpu'
+
+regressions = 0
+for by in args.by:
+    print()
+    print( Fore.CYAN + f'by {by}:' )
+
+    for trend in history.Trends( by, args.runs, args.threshold / 100 ):
+        runs = trend['runs'] if args.all else trend['runs'][-args.runs - 1:]
+        last = trend['runs'][-1]
+
+        measures = [ FormatMeasure( last, trend['measure'] ) ]
+        if trend['kind'] == 'convert':
+            measures += [ FormatMeasure( last, 'fps' ), FormatMeasure( last, 'cpu' ) ]
+        line = f'  {trend["kind"]:8} {trend["key"] or "?":32} last: {" ".join( measures )}'
+        if trend['baseline'] is not None:
+            baseline = FormatMeasure( { trend['measure']: trend['baseline'] }, trend['measure'] )
+            line += f' | baseline: {baseline} ({trend["change"]:+.0%})' if trend['change'] is not None else f' | baseline: {baseline}'
+        line += f' | {len( trend["runs"] )} run(s)'
+
+        if trend['regression']:
+            regressions += 1
+            line += ' REGRESSION'
+            if trend['ffmpeg_changed']:
+                line += f' (ffmpeg: {" -> ".join( dict.fromkeys( str( run["ffmpeg"] ) for run in runs ) )})'
+        print( ( Fore.RED if trend['regression'] else '' ) + line )
+
+        print( '    ' + ' '.join( f'{time.strftime( "%m-%d", time.localtime( run["time"] ) )}:{FormatMeasure( run, trend["measure"] )}' for run in runs ) )
+
+print()
+print( ( Fore.RED if regressions else Fore.GREEN ) + f'{regressions} regression(s)' )
@@ -10,15 +10,31 @@
 #
 
 import argparse
+import os
 from pathlib import Path
 import sys
-import xml.etree.ElementTree as ET
 
 from colorama import init, Fore, Back, Style
 init( autoreset=True )
 
-from vidz.convert import cConvert
+from vidz.budget import cThreadBudget
+from vidz.cache import cSegmentCache
+from vidz.convert import cConvert, ENGINES
+from vidz.devices import cDeviceLimits, ParseLimits
+from vidz.deinterlace import cDeinterlace, MODES, FILTERS
+from vidz.entries import cEntries
+from vidz.history import cHistory
+from vidz.passthrough import cCodecs, ParseCodecs, MODES as CODECS_MODES, VIDEO_CODECS, AUDIO_CODECS
+from vidz.pipeline import cPipeline
+from vidz.preview import cPreview
+from vidz.probe import cProbe
+from vidz.recordings import cRecordings, DRIVES
+from vidz.runner import cRunner
+from vidz.progress import cProgress, FormatEta
 from vidz.scene import cScene, cInterval
+from vidz.scratch import cScratch
+from vidz.shared import PlanBySource
+from vidz.size import ParseSize
 from vidz.source import cSource
 from vidz.video import cVideo
 
@@ -26,7 +42,19 @@
 
 parser = argparse.ArgumentParser( description='Clean and convert .ts to .avi.' )
 parser.add_argument( '-i', '--input',                       nargs='+', default=[],  help='List of id in the xml' )
-parser.add_argument( '-t', '-d', '--test-sound', type=int,  nargs='?', const=10,    help='Test sound (language) on small interval' )
+parser.add_argument( '-t', '-d', '--test-sound', type=int,  nargs='?', const=3,     help='Test sound (language) on small clips (TEST_SOUND for each interval)' )
+parser.add_argument( '-j', '--jobs',             type=int,             default=1,   help='Number of intervals cleaned at the same time' )
+parser.add_argument( '-p', '--pipeline',         type=int,  nargs='?', const=1,     help='Clean the next entries (at most PIPELINE) while converting the current one' )
+parser.add_argument( '-c', '--chunks',           type=int,             default=1,   help='Number of chunks encoded at the same time (two-pass engine)' )
+parser.add_argument( '-e', '--engine',           choices=ENGINES,       default=ENGINES[0], help='Convert from segment files (two-pass), directly from the sources (single-pass) or from the intervals streamed to the convert command (stream)' )
+parser.add_argument( '--deinterlace',             choices=MODES,         default='never', help='Deinterlace if a source is interlaced (auto: detected on samples), always or never' )
+parser.add_argument( '--deinterlacer',            choices=FILTERS,       default='yadif', help='The deinterlacing filter (yadif-fast: cheaper, bwdif: slower but better quality)' )
+parser.add_argument( '--filter-threads',   type=int,                                help='Number of threads of the deinterlacing filter (default: from the budget of threads)' )
+parser.add_argument( '--codecs',                  choices=CODECS_MODES,  default='transcode', help='Always transcode the streams (transcode), copy the ones compatible with the audio-codecs/video-codecs of the xml (auto), or never transcode them (remux)' )
+parser.add_argument( '--threads',          type=int,             default=os.cpu_count(), help='Number of threads shared by all the commands' )
+parser.add_argument( '-k', '--keep-temporary',   action='store_true',                help='Keep the working directories (tmp-<name>) of the converted videos' )
+parser.add_argument( '-s', '--status',                                          help='Write the progress of the batch in this file (json)' )
+parser.add_argument( '-n', '--estimate',         action='store_true',                help='Only print the estimated duration of each video (from the speed of the previous runs)' )
 args = parser.parse_args()
 
 #---
@@ -36,8 +64,10 @@
     print( Back.RED + f'data.xml file doesn\'t exist: {data}' )
     sys.exit()
 
-tree = ET.parse( data )
-root = tree.getroot()
+entries = cEntries( data )
+if not entries.Load():
+    sys.exit()
+root = entries.Root()
 
 ffmpeg = Path( root.get( 'ffmpeg' ) )
 if not ffmpeg.exists():
@@ -54,68 +84,163 @@
     print( Back.RED + f'output path doesn\'t exist: {output}' )
     sys.exit()
 
+# The stderr of each command is in its own log file (not interleaved on the terminal)
+runner = cRunner( output / 'vidz.logs' )
+runner.CancelOnInterrupt()
+
+probe = cProbe( ffprobe, output / 'vidz.probe.json', ffmpeg, runner )
+deinterlace = cDeinterlace( probe, args.deinterlace, args.deinterlacer, args.filter_threads )
+budget = cThreadBudget( args.threads )
+
+# The measures of each command are saved, for the estimated duration of the next runs and the trends (report.py)
+history = cHistory( output / 'vidz.history.sqlite', ffmpeg, 'split-and-clean', runner )
+
+# The streams already accepted by the players are copied (not encoded again)
+codecs = cCodecs( args.codecs, ParseCodecs( root.get( 'video-codecs' ), VIDEO_CODECS ), ParseCodecs( root.get( 'audio-codecs' ), AUDIO_CODECS ) )
+
+# The drives of the dvr are scanned once (only the changed recordings since the previous run)
+drives = root.get( 'drives' ).split( ',' ) if root.get( 'drives' ) is not None else DRIVES
+recordings = cRecordings( [ drive.strip() for drive in drives ], output / 'vidz.recordings.json', probe )
+
+# The copies (clean) on the same (spinning) disk run one after the other (by default, only the dvr drives are limited),
+# and the encodes (convert) on the same disk are limited too (but much more of them)
+default_limit, limits, encode_limit = ParseLimits( root.get( 'device-limits' ) )
+if root.get( 'device-limits' ) is None:
+    limits = { drive.strip(): 1 for drive in drives }
+devices = cDeviceLimits( default_limit, limits, encode_limit )
+
+# Optional: keep the segments to not extract them again on the next runs
+cache = None
+if root.get( 'cache' ) is not None:
+    cache = cSegmentCache( Path( root.get( 'cache' ) ), ParseSize( root.get( 'cache-size', '50G' ) ) )
+
+# The working directories on a fast disk (the output by default), with the size of their files limited
+scratch_size = root.get( 'scratch-size' )
+# The stale working directories are removed only in a dedicated scratch (by default, the output is shared with the other script)
+scratch_age = root.get( 'scratch-age', '7' if root.get( 'scratch' ) is not None else None )
+scratch = cScratch( Path( root.get( 'scratch', output ) ),
+                    ParseSize( scratch_size ) if scratch_size is not None else None,
+                    float( scratch_age ) if scratch_age else None,
+                    args.keep_temporary )
+
 #---
 
-def BuildVideo( iXMLRoot, iEntry ):
-    xml_videos = iXMLRoot.findall( f'./video[@id="{iEntry}"]' )
-    if not xml_videos:
+def BuildVideo( iEntries, iEntry ):
+    if not iEntries.Count( iEntry ):
         print( Back.RED + f'no video for this id: {iEntry}' )
-        return None
-    if len( xml_videos ) > 1:
+        return None, None
+    if iEntries.Count( iEntry ) > 1:
         print( Back.RED + f'multiple videos with same id: {iEntry}' )
-        return None
+        return None, None
 
-    xml_video = xml_videos[0]
+    entry_video = iEntries.Video( iEntry )
+    if entry_video['errors']:
+        for error in entry_video['errors']:
+            print( Back.RED + error )
+        return None, None
 
-    video = cVideo( xml_video.get( 'id' ), xml_video.get( 'name' ), xml_video.get( 'qscale' ) )
-    video.BuildOutput( output )
+    video = cVideo( entry_video['id'], entry_video['name'], entry_video['qscale'] )
+    video.BuildOutput( output, scratch.Root() )
 
     print( Fore.CYAN + f'video: {video.Name()}' )
 
     scenes = []
-    for xml_scene in xml_video.findall( 'scene' ):
+    for entry_scene in entry_video['scenes']:
         scene = cScene( video )
 
-        source = cSource.Create( xml_scene )
+        source = cSource.Create( entry_scene, recordings )
         if not source.Build():
             print( Back.RED + f'can\'t build source: {iEntry}' )
-            return None
+            return None, None
 
         scene.Source( source )
 
         print( Fore.CYAN + f'scene: {scene.Source().PathFile()}' )
 
-        for xml_interval in xml_scene.findall( 'interval' ):
+        for entry_interval in entry_scene['intervals']:
             interval = cInterval()
-            interval.SS( xml_interval.get( 'ss' ) )
-            interval.To( xml_interval.get( 'to' ) )
-            if args.test_sound is not None:
-                tc_ss = interval.SS().split( ':' )
-                tc_to = interval.SS().split( ':' ) # with tc_to = tc_ss, they will share the same data
-                new_start = int( tc_ss[1] ) + args.test_sound
-                if( new_start > 59 ):
-                    new_start = 58
-                tc_ss[1] = f'{ new_start }'
-                tc_to[1] = f'{ new_start + 1 }' # add 1 min
-                interval.SS( ':'.join( tc_ss ) )
-                interval.To( ':'.join( tc_to ) )
-            interval.VMap( xml_interval.get( 'vmap' ) )
-            interval.AMap( xml_interval.get( 'amap' ) )
+            interval.SS( entry_interval['ss'] )
+            interval.To( entry_interval['to'] )
+            interval.VMap( entry_interval['vmap'] )
+            interval.AMap( entry_interval['amap'] )
             scene.AddInterval( interval )
 
-            if args.test_sound is not None:
-                break
+        # Without amap, the audio streams are ordered with the french one(s) first
+        if any( interval.AMap() is None for interval in scene.Intervals() ):
+            amap = probe.AudioOrder( scene.Source().PathFile() )
+            if amap is not None:
+                print( Fore.CYAN + f'amap (probed): {amap}' )
+                for interval in scene.Intervals():
+                    if interval.AMap() is None:
+                        interval.AMap( amap )
 
-        scene.BuildOutput( output )
+        scene.BuildOutput()
         scenes.append( scene )
 
     return video, scenes
 
+if args.test_sound is not None:
+    preview = cPreview( ffmpeg, max( args.jobs, 4 ), iRun=runner.Run )
+    for entry in args.input:
+        video, scenes = BuildVideo( entries, entry )
+        if video is None:
+            continue
+
+        if preview.Run( video, scenes, args.test_sound, output / f'preview-{video.Name()}' ) is None:
+            print( Back.RED + f'can\'t preview video: {entry}' )
+
+    sys.exit()
+
+# All the videos are built first, to know the work of the whole batch (for the eta)
+progress = cProgress( Path( args.status ) if args.status else None )
+converts = []
 for entry in args.input:
-    video, scenes = BuildVideo( root, entry )
+    video, scenes = BuildVideo( entries, entry )
     if video is None:
         continue
 
-    convert = cConvert( ffmpeg, ffprobe, video, scenes )
-    convert.RunClean()
+    convert = cConvert( ffmpeg, probe, video, scenes )
+    convert.Engine( args.engine )
+    convert.Chunks( args.chunks )
+    convert.Cache( cache )
+    convert.Progress( progress )
+    convert.Deinterlace( deinterlace )
+    convert.Codecs( codecs )
+    convert.Budget( budget )
+    convert.Devices( devices )
+    convert.Runner( runner )
+    convert.Scratch( scratch )
+    convert.History( history )
+    for kind, seconds in convert.Work():
+        progress.AddWork( kind, seconds )
+    converts.append( convert )
+
+estimates = [ convert.Estimate() for convert in converts ]
+if args.estimate:
+    for convert, estimate in zip( converts, estimates ):
+        print( f'{convert.Video().Name()}: {FormatEta( estimate )}' )
+# One video after the other (without -j/-p), from the speed of the same profile/drive in the previous runs
+unknown = estimates.count( None )
+print( Fore.CYAN + f'estimate: {FormatEta( sum( estimate for estimate in estimates if estimate is not None ) )}'
+                   + ( f' (+ {unknown} video(s) without previous run)' if unknown else '' ) )
+if args.estimate:
+    sys.exit()
+
+scratch.Evict( [ convert.Video().Name() for convert in converts ] )
+
+# The videos of the same source are processed one after the other, and their intervals are extracted with one read of the source.
+# Without a scratch quota, a shared extraction is limited to the videos which may be cleaned at the same time (the current one and the pipeline ones)
+converts = PlanBySource( converts, ( args.pipeline or 0 ) + 1 if scratch_size is None else None )
+
+if args.pipeline is not None:
+    pipeline = cPipeline( args.pipeline, args.jobs )
+    for convert in pipeline.Run( converts ):
+        print( Back.RED + f'can\'t clean/convert video: {convert.Video().Id()}' )
+
+    sys.exit()
+
+for convert in converts:
+    if not convert.RunClean( args.jobs ):
+        print( Back.RED + f'can\'t clean video: {convert.Video().Id()}' )
+        continue
     convert.RunConvert()
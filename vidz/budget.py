@@ -0,0 +1,118 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package budget
+#  Manage the threads of the commands
+
+import os
+import threading
+
+## The filters which decode/encode all the frames (and can run with multiple threads)
+DEINTERLACE_FILTERS = [ 'yadif', 'bwdif', 'w3fdif' ]
+
+## Get the type of an ffmpeg command
+#
+#  @param  iCommand  string[]  The command
+#  @return           string    'copy' (no encode), 'deinterlace' (encode with a deinterlacing filter) or 'encode'
+def JobType( iCommand ):
+    arguments = [ str( argument ) for argument in iCommand ]
+    pairs = list( zip( arguments, arguments[1:] ) )
+    if ( '-c', 'copy' ) in pairs or ( '-codec', 'copy' ) in pairs:
+        return 'copy'
+
+    filters = [ value for option, value in pairs if option in ( '-vf', '-filter:v', '-filter_complex' ) ]
+    if any( name in graph for graph in filters for name in DEINTERLACE_FILTERS ):
+        return 'deinterlace'
+
+    return 'encode'
+
+#---
+
+## An allocation of threads for a command
+class cAllocation:
+
+    ## The constructor
+    #
+    #  @param  iBudget   cThreadBudget  The budget
+    #  @param  iType     string         The type of the command
+    #  @param  iThreads  int            The number of threads (0 for a copy, which doesn't use the budget)
+    def __init__( self, iBudget, iType, iThreads ):
+        self.mBudget = iBudget
+        self.mType = iType
+        self.mThreads = iThreads
+
+    ## Get the parameters of the command for this allocation
+    #
+    #  @param  iCommand  string[]  The command (the existing parameters are not changed)
+    #  @return           string[]  The command with the parameters of the threads (before the output)
+    def Apply( self, iCommand ):
+        if self.mType == 'copy':
+            return iCommand
+
+        parameters = []
+        if '-threads' not in iCommand:
+            parameters += [ '-threads', str( self.mThreads ) ]
+        if self.mType == 'deinterlace' and '-filter_threads' not in iCommand and '-filter_complex_threads' not in iCommand:
+            parameters += [ '-filter_complex_threads' if '-filter_complex' in iCommand else '-filter_threads', str( self.mThreads ) ]
+        return [ *iCommand[:-1], *parameters, iCommand[-1] ]
+
+    ## Give back the threads to the budget
+    def Release( self ):
+        self.mBudget._Release( self )
+
+#---
+
+## The budget of threads of all the commands
+#
+#  Each command gets a part of the cores depending on its type and on the number of commands
+#  which run at the same time (given by the caller, like the number of chunks).
+#  A copy ('-c copy') uses (almost) no cpu: it's never blocked and doesn't use the budget.
+#  An encode waits if all the threads are used, and gets the threads released by the finished commands
+class cThreadBudget:
+
+    ## The constructor
+    #
+    #  @param  iThreads  int  The number of threads of the budget (the number of cores by default)
+    def __init__( self, iThreads=None ):
+        self.mThreads = iThreads if iThreads is not None else os.cpu_count()
+        self.mFree = self.mThreads
+
+        self.mCondition = threading.Condition()
+
+    ## Get threads for a command
+    #
+    #  @param  iCommand   string[]     The command
+    #  @param  iParallel  int          The number of similar commands which run at the same time
+    #  @return            cAllocation  The allocation (to release at the end of the command)
+    def Acquire( self, iCommand, iParallel=1 ):
+        type = JobType( iCommand )
+        if type == 'copy':
+            return cAllocation( self, type, 0 )
+
+        wanted = max( 1, self.mThreads // max( iParallel, 1 ) )
+        with self.mCondition:
+            while self.mFree < 1:
+                self.mCondition.wait()
+
+            threads = min( wanted, self.mFree )
+            self.mFree -= threads
+
+        return cAllocation( self, type, threads )
+
+    #---
+
+    def _Release( self, iAllocation ):
+        if not iAllocation.mThreads:
+            return
+
+        with self.mCondition:
+            self.mFree += iAllocation.mThreads
+            iAllocation.mThreads = 0
+            self.mCondition.notify_all()
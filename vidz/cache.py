@@ -0,0 +1,126 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package cache
+#  Manage cache of segments
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import threading
+
+from colorama import Fore
+
+from .size import FormatSize
+
+## The cache of segments
+#
+#  A segment is stored with a key made of the identity of its source (path, size, modification time)
+#  and the parameters of its interval, so the same interval is extracted only once.
+#  The files are hard-linked (or copied if it's not possible) between the cache and the outputs.
+#  The least recently used segments are removed when the cache is bigger than its maximum size
+class cSegmentCache:
+
+    ## The constructor
+    #
+    #  @param  iRoot     pathlib.Path  The directory of the cache
+    #  @param  iMaxSize  int           The maximum size of the cache (in bytes)
+    def __init__( self, iRoot, iMaxSize ):
+        self.mRoot = iRoot
+        self.mMaxSize = iMaxSize
+
+        self.mLock = threading.Lock()
+
+        self.mRoot.mkdir( parents=True, exist_ok=True )
+
+    ## Get the key of an interval
+    #
+    #  @param  iSource    cSource    The source of the interval
+    #  @param  iInterval  cInterval  The interval
+    #  @return            string     The key
+    def Key( self, iSource, iInterval ):
+        fingerprint = [ *iSource.Fingerprint(), iInterval.SS(), iInterval.To(), iInterval.VMap(), iInterval.AMap() ]
+        return hashlib.sha256( json.dumps( fingerprint ).encode() ).hexdigest()[:32]
+
+    ## Get a segment from the cache
+    #
+    #  @param  iKey     string        The key of the segment
+    #  @param  iOutput  pathlib.Path  The segment to create from the cache
+    #  @return          bool          The segment was in the cache
+    def Get( self, iKey, iOutput ):
+        with self.mLock:
+            pathfile = self._PathFile( iKey, iOutput.suffix )
+            if not pathfile.exists():
+                return False
+
+            self._Link( pathfile, iOutput )
+
+            # Most recently used
+            os.utime( pathfile )
+
+        print( Fore.CYAN + f'segment from cache: {iOutput.name}' )
+        return True
+
+    ## Check if a segment is in the cache
+    #
+    #  @param  iKey     string  The key of the segment
+    #  @param  iSuffix  string  The extension of the segment
+    #  @return          bool    The segment is in the cache
+    def Contains( self, iKey, iSuffix ):
+        with self.mLock:
+            return self._PathFile( iKey, iSuffix ).exists()
+
+    ## Add a segment to the cache
+    #
+    #  @param  iKey      string        The key of the segment
+    #  @param  iSegment  pathlib.Path  The segment
+    def Put( self, iKey, iSegment ):
+        with self.mLock:
+            self._Link( iSegment, self._PathFile( iKey, iSegment.suffix ) )
+            self._Evict()
+
+    #---
+
+    def _PathFile( self, iKey, iSuffix ):
+        return self.mRoot / f'{iKey}{iSuffix}'
+
+    ## Create/replace a file with the content of another one
+    #
+    #  @param  iSource       pathlib.Path  The existing file
+    #  @param  iDestination  pathlib.Path  The file to create
+    def _Link( self, iSource, iDestination ):
+        temporary = iDestination.with_name( iDestination.name + '.tmp' )
+        temporary.unlink( missing_ok=True )
+        try:
+            os.link( iSource, temporary )
+        except OSError:
+            # Not on the same drive or not supported by the filesystem
+            shutil.copyfile( iSource, temporary )
+        os.replace( temporary, iDestination )
+
+    ## Remove the least recently used segments until the cache fits in its maximum size
+    def _Evict( self ):
+        entries = []
+        with os.scandir( self.mRoot ) as it:
+            for entry in it:
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append( ( stat.st_mtime, stat.st_size, Path( entry.path ) ) )
+        size = sum( entry_size for _, entry_size, _ in entries )
+
+        for _, entry_size, entry in sorted( entries, key=lambda iEntry: iEntry[0] ):
+            if size <= self.mMaxSize:
+                break
+
+            entry.unlink( missing_ok=True )
+            size -= entry_size
+            print( Fore.CYAN + f'segment removed from cache: {entry.name} [{FormatSize( entry_size )}]' )
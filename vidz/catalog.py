@@ -0,0 +1,115 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package catalog
+#  Manage the catalog of the dvd folders
+
+import json
+import os
+from pathlib import Path
+
+from colorama import Fore
+
+from .manifest import PartialOutput
+
+## The catalog of the dvd folders
+#
+#  The dvd folders are the folders '<id>.<name>' (with a 'VIDEO_TS' folder) directly in the root.
+#  The root is read once (no recursive walk), and the 'VIDEO_TS' folder of a dvd is read again
+#  only if its modification time has changed since the previous run (saved in the index)
+class cCatalog:
+
+    ## The constructor
+    #
+    #  @param  iRoot   pathlib.Path  The root of the dvd folders
+    #  @param  iIndex  pathlib.Path  The index file (json), None to scan the root on each run
+    def __init__( self, iRoot, iIndex=None ):
+        self.mRoot = iRoot
+        self.mIndex = iIndex
+
+        self.mFolders = {}      # folder name -> { id, path, mtime_ns, files }
+        self.mDVDs = None       # id -> folder names
+
+        if self.mIndex is not None and self.mIndex.exists():
+            try:
+                self.mFolders = json.loads( self.mIndex.read_text() )
+            except ValueError:
+                self.mFolders = {}
+
+    ## Get a dvd
+    #
+    #  The root is scanned on the first call
+    #
+    #  @param  iId  string  The id of the dvd
+    #  @return      dict    The name of the folder, the 'VIDEO_TS' path and its files (name -> size)
+    #  @return      None    There is no dvd (or multiple dvds) with this id
+    def DVD( self, iId ):
+        if self.mDVDs is None:
+            self.Scan()
+
+        names = self.mDVDs.get( iId, [] )
+        if len( names ) != 1:
+            return None
+        return { 'name': names[0], **self.mFolders[names[0]] }
+
+    ## Scan the root
+    def Scan( self ):
+        folders = {}
+        dvds = {}
+        scanned = 0
+        try:
+            entries = list( os.scandir( self.mRoot ) )
+        except OSError:
+            print( Fore.RED + f'dvd root doesn\'t exist: {self.mRoot}' )
+            entries = []
+
+        for entry in entries:
+            id, dot, _ = entry.name.partition( '.' )
+            if not dot or not entry.is_dir():
+                continue
+
+            video_ts = Path( entry.path ) / 'VIDEO_TS'
+            try:
+                mtime_ns = video_ts.stat().st_mtime_ns
+            except OSError:
+                continue
+
+            folder = self.mFolders.get( entry.name )
+            if folder is None or folder['mtime_ns'] != mtime_ns:
+                folder = { 'id': id, 'path': str( video_ts ), 'mtime_ns': mtime_ns, 'files': self._ScanFiles( video_ts ) }
+                scanned += 1
+
+            folders[entry.name] = folder
+            dvds.setdefault( id, [] ).append( entry.name )
+
+        if scanned:
+            print( Fore.CYAN + f'catalog: {scanned} dvd(s) scanned, {len( folders ) - scanned} from the index' )
+
+        self.mFolders = folders
+        self.mDVDs = dvds
+        self._Save()
+
+    #---
+
+    def _ScanFiles( self, iPath ):
+        files = {}
+        with os.scandir( iPath ) as it:
+            for entry in it:
+                if entry.is_file():
+                    files[entry.name] = entry.stat().st_size
+        return files
+
+    def _Save( self ):
+        if self.mIndex is None:
+            return
+
+        temporary = PartialOutput( self.mIndex )
+        temporary.write_text( json.dumps( self.mFolders, indent=4 ) )
+        os.replace( temporary, self.mIndex )
@@ -0,0 +1,166 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package chunk
+#  Manage chunked conversion
+
+from concurrent.futures import ThreadPoolExecutor
+import math
+import time
+
+from colorama import Fore
+
+from .runner import cRunner
+
+## The chunk encoder
+#
+#  The mpeg4 encoder doesn't use all the cores, so the video is split in chunks (at keyframes)
+#  which are encoded at the same time (1 ffmpeg process for each).
+#  The audio is encoded once for the whole input (by another process) to keep the sync,
+#  then the chunks and the audio are joined without re-encoding
+class cChunkEncoder:
+
+    ## The constructor
+    #
+    #  @param  iFFmpeg         string    The ffmpeg command pathfile
+    #  @param  iProbe          cProbe    The prober to find the keyframes (no alignment if None)
+    #  @param  iJobs           int       The number of chunks encoded at the same time
+    #  @param  iChunkDuration  float     The maximum duration of a chunk (in seconds)
+    #  @param  iRun            function  Execute a command (and the duration of its media) and return its cResult (a new cRunner by default)
+    #  @param  iBaselineSpeed  float     The speed of a single process with the same profile (seconds of media encoded in 1 second, from the history), None if it's unknown
+    def __init__( self, iFFmpeg, iProbe, iJobs, iChunkDuration=300, iRun=None, iBaselineSpeed=None ):
+        self.mFFmpeg = iFFmpeg
+        self.mProbe = iProbe
+        self.mJobs = max( iJobs, 1 )
+        self.mChunkDuration = iChunkDuration
+        self.mRun = iRun if iRun is not None else lambda iCommand, iDuration=None: cRunner().Run( iCommand )
+        self.mBaselineSpeed = iBaselineSpeed
+
+    ## Encode a part of an input
+    #
+    #  @param  iPathFile          pathlib.Path  The input
+    #  @param  iInputParameters   string[]      The parameters of the input (-f concat, ...)
+    #  @param  iStart             float         The start of the part (in seconds)
+    #  @param  iEnd               float         The end of the part (in seconds), None for the end of the input
+    #  @param  iVideoParameters   string[]      The parameters of the video encoding (map, filters, codec)
+    #  @param  iAudioParameters   string[]      The parameters of the audio encoding (map, codec)
+    #  @param  iOutput            pathlib.Path  The output avi file
+    #  @param  iDirectory         pathlib.Path  The directory of the temporary files (chunks, audio, list)
+    #  @return                    bool          The avi file has been created
+    def Run( self, iPathFile, iInputParameters, iStart, iEnd, iVideoParameters, iAudioParameters, iOutput, iDirectory ):
+        end = iEnd
+        if end is None and self.mProbe is not None:
+            end = self.mProbe.Duration( iPathFile, iInputParameters )
+        if end is None:
+            print( Fore.RED + f'unknown duration, can\'t split in chunks: {iPathFile}' )
+            return False
+
+        boundaries = self._Split( iPathFile, iInputParameters, iStart, end )
+
+        chunks = [ iDirectory / f'{iOutput.stem}.chunk.{i+1:03}.avi' for i in range( len( boundaries ) - 1 ) ]
+        audio = iDirectory / f'{iOutput.stem}.audio.mkv'
+        chunk_list = iDirectory / f'{iOutput.stem}.chunks.txt'
+
+        commands = []
+        durations = []
+        for i, chunk in enumerate( chunks ):
+            # The last chunk goes to the real end when it's unknown (a probed duration may be an estimation)
+            duration = [ '-t', f'{boundaries[i+1] - boundaries[i]:.3f}' ] if iEnd is not None or i < len( chunks ) - 1 else []
+            commands.append( [ self.mFFmpeg,
+                               '-nostdin',
+                               *iInputParameters,
+                               '-ss', f'{boundaries[i]:.3f}',
+                               '-i', iPathFile,
+                               *duration,
+                               *iVideoParameters,
+                               '-an',
+                               chunk ] )
+            durations.append( boundaries[i+1] - boundaries[i] )
+
+        # The audio is the longest job (the whole part), so it starts first
+        duration = [ '-t', f'{iEnd - iStart:.3f}' ] if iEnd is not None else []
+        commands.insert( 0, [ self.mFFmpeg,
+                              '-nostdin',
+                              *iInputParameters,
+                              '-ss', f'{iStart:.3f}',
+                              '-i', iPathFile,
+                              *duration,
+                              '-vn',
+                              *iAudioParameters,
+                              audio ] )
+        durations.insert( 0, None )
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor( max_workers=self.mJobs ) as executor:
+            results = list( executor.map( self._Encode, commands, durations ) )
+        wall_time = time.perf_counter() - start
+
+        if not all( success for success, _ in results ):
+            return False
+
+        # The chunks compete for the cpu: their sum is not the time of a single process,
+        # so the speedup is against the time of a single process with the speed of the previous runs
+        if self.mBaselineSpeed and wall_time > 0:
+            baseline_time = ( end - iStart ) / self.mBaselineSpeed
+            print( Fore.CYAN + f'chunks: {len( chunks )} encoded in {wall_time:.1f}s, speedup: x{baseline_time / wall_time:.2f} (single process: ~{baseline_time:.1f}s from the history)' )
+        else:
+            print( Fore.CYAN + f'chunks: {len( chunks )} encoded in {wall_time:.1f}s, speedup: ? (no single process run with the same profile in the history)' )
+
+        with open( chunk_list, 'w' ) as outfile:
+            outfile.write( "# this is a comment\n" )
+            for chunk in chunks:
+                outfile.write( f"file '{chunk.name}'\n" )
+
+        command = [ self.mFFmpeg,
+                    '-nostdin',
+                    '-f', 'concat',
+                    '-safe', '0',
+                    '-i', chunk_list,
+                    '-i', audio,
+                    '-map', '0:v',
+                    '-map', '1:a?',
+                    '-c', 'copy',
+                    '-vtag', 'XVID',
+                    iOutput ]
+        cp = self.mRun( command )
+
+        return cp.returncode == 0
+
+    ## Split a part of the input in chunks
+    #
+    #  @return  float[]  The boundaries of the chunks (start of the first one ... end of the last one)
+    def _Split( self, iPathFile, iInputParameters, iStart, iEnd ):
+        count = max( self.mJobs, math.ceil( ( iEnd - iStart ) / self.mChunkDuration ) )
+        step = ( iEnd - iStart ) / count
+
+        boundaries = [ iStart ]
+        for i in range( 1, count ):
+            boundary = iStart + i * step
+            if self.mProbe is not None:
+                keyframe = self.mProbe.NextKeyframe( iPathFile, boundary, iInputParameters )
+                if keyframe is not None:
+                    boundary = keyframe
+
+            # Keep only increasing boundaries (multiple ones may snap on the same keyframe)
+            if boundaries[-1] < boundary < iEnd:
+                boundaries.append( boundary )
+        boundaries.append( iEnd )
+
+        return boundaries
+
+    ## Encode a chunk (or the audio)
+    #
+    #  @param  iCommand   string[]  The command which will be executed
+    #  @param  iDuration  float     The duration (in seconds) of the encoded media (None if it's not followed)
+    #  @return            tuple     The success and the elapsed time (in seconds)
+    def _Encode( self, iCommand, iDuration ):
+        start = time.perf_counter()
+        cp = self.mRun( iCommand, iDuration )
+        return cp.returncode == 0, time.perf_counter() - start
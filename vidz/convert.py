@@ -11,10 +11,41 @@
 ## @package scene
 #  Manage conversion
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
+import os
+from pathlib import Path
 import subprocess
+import threading
 
-from colorama import init, deinit, Fore, Back, Style
+from colorama import Fore, Back
+
+from .budget import JobType
+from .chunk import cChunkEncoder
+from .devices import CommandFiles
+from .history import Drive, Profile
+from .manifest import cManifest, PartialOutput
+from .runner import cRunner
+from .scene import TimecodeToSeconds
+
+## The available engines
+#
+#  - 'two-pass': extract each interval in its own segment file, then concat and convert the segments
+#  - 'single-pass': convert all the intervals directly from the sources with only one command (no segment file)
+#  - 'stream': extract each interval to a pipe read by the convert command (no segment file)
+ENGINES = [ 'two-pass', 'single-pass', 'stream' ]
+
+## Get the map parameters of the video of an interval
+#
+#  @param  iInterval  cInterval  The interval
+#  @return            string[]   The parameters (all the video streams, or the one of the legacy vmap)
+def VMapParameters( iInterval ):
+    # All video streams
+    if iInterval.VMap() is None:
+        return [ '-map', '0:v' ]
+
+    # Legacy: only 1 video stream
+    return [ '-map', iInterval.VMap() ]
 
 ## The converter
 #
@@ -24,23 +55,389 @@ class cConvert:
     ## The constructor
     #
     #  @param  iFFmpeg  string   The ffmpeg command pathfile
+    #  @param  iProbe   cProbe   The prober (may be None)
     #  @param  iVideo   cVideo   The video file
     #  @param  iScenes  cScene[] The scenes to convert
-    def __init__( self, iFFmpeg, iFFprobe, iVideo, iScenes ):
+    def __init__( self, iFFmpeg, iProbe, iVideo, iScenes ):
         self.mFFmpeg = iFFmpeg
+        self.mProbe = iProbe
         self.mVideo = iVideo
         self.mScenes = iScenes
 
+        self.mInteractive = True
+        self.mEngine = 'two-pass'
+        self.mChunks = 1
+        self.mCache = None
+        self.mManifest = cManifest( iVideo.Manifest() )
+        self.mProgress = None
+        self.mDeinterlace = None
+        self.mBudget = None
+        self.mDevices = None
+        self.mScratch = None
+        self.mCodecs = None
+        self.mShared = None
+        self.mRunner = cRunner()
+        self.mHistory = None
+
+        self.mPrintLock = threading.Lock()
+
+    ## Get the video
+    #
+    #  @return  cVideo  The video
+    def Video( self ):
+        return self.mVideo
+
+    ## Manage the interaction of the commands with the terminal
+    #
+    #  Must be disabled when other commands may run at the same time,
+    #  otherwise they all read stdin (to ask for overwriting, ...)
+    #
+    #  @param  iInteractive  bool  Set the interaction (if not None)
+    #  @return               bool  The previous/current interaction
+    def Interactive( self, iInteractive=None ):
+        if iInteractive is None:
+            return self.mInteractive
+
+        previous_value = self.mInteractive
+        self.mInteractive = iInteractive
+        return previous_value
+
+    ## Manage the engine
+    #
+    #  The single-pass engine needs to know the audio streams of each interval (to build the concat filter).
+    #  If it's not possible, the two-pass engine is used
+    #
+    #  @param  iEngine  string  Set the engine (if not None)
+    #  @return          string  The previous/current engine
+    def Engine( self, iEngine=None ):
+        if iEngine is None:
+            return self.mEngine
+
+        previous_value = self.mEngine
+        self.mEngine = iEngine
+        if self.mEngine == 'single-pass' and self._GetSinglePassInputs() is None:
+            print( Fore.YELLOW + f'single-pass engine not available (audio streams unknown or different), use two-pass: {self.mVideo.Name()}' )
+            self.mEngine = 'two-pass'
+        return previous_value
+
+    ## Manage the number of chunks encoded at the same time
+    #
+    #  Only used when converting from a source or from the segment files (not for single-pass/stream engines)
+    #
+    #  @param  iChunks  int  Set the number of chunks (if not None), 1 to encode with a single process
+    #  @return          int  The previous/current number of chunks
+    def Chunks( self, iChunks=None ):
+        if iChunks is None:
+            return self.mChunks
+
+        previous_value = self.mChunks
+        self.mChunks = iChunks
+        return previous_value
+
+    ## Manage the cache of segments
+    #
+    #  @param  iCache  cSegmentCache  Set the cache (if not None)
+    #  @return         cSegmentCache  The previous/current cache
+    def Cache( self, iCache=None ):
+        if iCache is None:
+            return self.mCache
+
+        previous_value = self.mCache
+        self.mCache = iCache
+        return previous_value
+
+    ## Manage the progress of the commands
+    #
+    #  @param  iProgress  cProgress  Set the progress (if not None)
+    #  @return            cProgress  The previous/current progress
+    def Progress( self, iProgress=None ):
+        if iProgress is None:
+            return self.mProgress
+
+        previous_value = self.mProgress
+        self.mProgress = iProgress
+        return previous_value
+
+    ## Manage the deinterlacing
+    #
+    #  @param  iDeinterlace  cDeinterlace  Set the deinterlacing (if not None)
+    #  @return               cDeinterlace  The previous/current deinterlacing (None to not deinterlace)
+    def Deinterlace( self, iDeinterlace=None ):
+        if iDeinterlace is None:
+            return self.mDeinterlace
+
+        previous_value = self.mDeinterlace
+        self.mDeinterlace = iDeinterlace
+        return previous_value
+
+    ## Manage the budget of threads
+    #
+    #  @param  iBudget  cThreadBudget  Set the budget (if not None)
+    #  @return          cThreadBudget  The previous/current budget (None to let ffmpeg use all the cores)
+    def Budget( self, iBudget=None ):
+        if iBudget is None:
+            return self.mBudget
+
+        previous_value = self.mBudget
+        self.mBudget = iBudget
+        return previous_value
+
+    ## Manage the limits of the devices
+    #
+    #  @param  iDevices  cDeviceLimits  Set the limits (if not None)
+    #  @return           cDeviceLimits  The previous/current limits (None to not limit the accesses)
+    def Devices( self, iDevices=None ):
+        if iDevices is None:
+            return self.mDevices
+
+        previous_value = self.mDevices
+        self.mDevices = iDevices
+        return previous_value
+
+    ## Manage the scratch space of the working directory
+    #
+    #  @param  iScratch  cScratch  Set the scratch space (if not None)
+    #  @return           cScratch  The previous/current scratch space (None to keep the working directory)
+    def Scratch( self, iScratch=None ):
+        if iScratch is None:
+            return self.mScratch
+
+        previous_value = self.mScratch
+        self.mScratch = iScratch
+        return previous_value
+
+    ## Manage the choice of the codecs (copy or transcode each stream)
+    #
+    #  @param  iCodecs  cCodecs  Set the choice (if not None)
+    #  @return          cCodecs  The previous/current choice (None to always transcode)
+    def Codecs( self, iCodecs=None ):
+        if iCodecs is None:
+            return self.mCodecs
+
+        previous_value = self.mCodecs
+        self.mCodecs = iCodecs
+        return previous_value
+
+    ## Manage the runner of the commands
+    #
+    #  @param  iRunner  cRunner  Set the runner (if not None)
+    #  @return          cRunner  The previous/current runner
+    def Runner( self, iRunner=None ):
+        if iRunner is None:
+            return self.mRunner
+
+        previous_value = self.mRunner
+        self.mRunner = iRunner
+        return previous_value
+
+    ## Manage the history of the runs
+    #
+    #  @param  iHistory  cHistory  Set the history, to save the measures of the commands (if not None)
+    #  @return           cHistory  The previous/current history
+    def History( self, iHistory=None ):
+        if iHistory is None:
+            return self.mHistory
+
+        previous_value = self.mHistory
+        self.mHistory = iHistory
+        return previous_value
+
+    ## Manage the extraction shared with the other videos of the same sources
+    #
+    #  @param  iShared  cSharedClean  Set the shared extraction (if not None)
+    #  @return          cSharedClean  The previous/current shared extraction (None to extract the intervals of this video alone)
+    def Shared( self, iShared=None ):
+        if iShared is None:
+            return self.mShared
+
+        previous_value = self.mShared
+        self.mShared = iShared
+        return previous_value
+
+    ## Get the sources of the video
+    #
+    #  @return  pathlib.Path[]  The sources (in the order of the scenes)
+    def Sources( self ):
+        return list( dict.fromkeys( scene.Source().PathFile() for scene in self.mScenes ) )
+
+    ## Get the estimated size of the intermediate files (segments and chunks)
+    #
+    #  The size of an interval is the part of its source (proportional to their durations)
+    #
+    #  @return  int  The size (in bytes)
+    def TemporarySize( self ):
+        size = 0
+        for scene in self.mScenes:
+            try:
+                source_size = scene.Source().PathFile().stat().st_size
+            except OSError:
+                continue
+            duration = self.mProbe.Duration( scene.Source().PathFile() ) if self.mProbe is not None else None
+            for interval in scene.Intervals():
+                size += source_size * min( interval.Duration() / duration, 1 ) if duration else source_size
+
+        copies = int( self._HasSegments() ) + int( self.mChunks > 1 )
+        return int( size * copies )
+
+    ## Get the work of the video
+    #
+    #  The video already converted, and the segments already extracted (manifest) or in the cache, are not counted
+    #
+    #  @return  tuple[]  The kind of steps and the duration (in seconds) of the media they will produce
+    def Work( self ):
+        if self._IsConverted():
+            return []
+
+        duration = self._Duration()
+        if self._HasSegments():
+            return [ ( 'clean', sum( interval.Duration() for _, interval, _ in self.PendingCleans() ) ), ( 'convert', duration ) ]
+        return [ ( 'convert', duration ) ]
+
+    ## Estimate the duration of the video, from the speed of the previous runs
+    #
+    #  @return  float  The duration (in seconds)
+    #  @return  None   There is no history
+    def Estimate( self ):
+        if self.mHistory is None:
+            return None
+        if self._IsConverted():
+            return 0
+
+        drive = Drive( self.Sources()[0] ) if self.Sources() else None
+        seconds = 0
+        for kind, duration in self.Work():
+            speed = self.mHistory.Speed( kind, self._Profile( kind ), drive )
+            if speed is None:
+                return None
+            seconds += duration / speed
+        return seconds
+
+    ## Check if the intervals must be extracted in segment files before the conversion
+    #
+    #  @return  bool  The segments are needed
+    def _HasSegments( self ):
+        if len( self.mScenes ) == 1 and len( self.mScenes[0].Intervals() ) == 1:
+            return False
+
+        return self.mEngine == 'two-pass'
+
     #---
 
     ## Create a 'clean' file (without ads) of the scene
-    def RunClean( self ):
-        if len( self.mScenes ) == 1 and len( self.mScenes[0].Intervals() ) == 1:
-            return
+    #
+    #  Each interval is an independent 'copy' command, so they can be run concurrently.
+    #  The segments keep their order (they are defined by the scenes), only the execution order changes
+    #
+    #  @param  iJobs  int   The number of intervals extracted at the same time
+    #  @return        bool  All the intervals have been extracted
+    def RunClean( self, iJobs=1 ):
+        if self.mScratch is not None:
+            self.mScratch.Admit( self.mVideo.Name(), self.TemporarySize() )
+
+        # The working directory (and the segments) is removed when the video is converted
+        if not self._HasSegments() or self._IsConverted():
+            return True
+
+        # The intervals of the other videos of the same sources are extracted at the same time,
+        # the remaining ones (if it has failed) are extracted below
+        if self.mShared is not None:
+            self.mShared.Run()
+
+        if not self._RunCleanSegments( iJobs ):
+            if self.mScratch is not None:
+                self.mScratch.Release( self.mVideo.Name(), False )
+            return False
+
+        return True
+
+    def _RunCleanSegments( self, iJobs ):
+        tasks = []
+        for scene in self.mScenes:
+            for interval, segment in zip( scene.Intervals(), scene.Segments() ):
+                tasks.append( ( scene, interval, segment ) )
+
+        if iJobs <= 1:
+            for scene, interval, segment in tasks:
+                if not self._RunCleanInterval( scene, interval, segment ):
+                    return False
+            return True
+
+        # Stop everything at the first failure: the video can't be converted without all its segments
+        with ThreadPoolExecutor( max_workers=iJobs ) as executor:
+            futures = [ executor.submit( self._RunCleanInterval, scene, interval, segment, True ) for scene, interval, segment in tasks ]
+            for future in as_completed( futures ):
+                if not future.result():
+                    for other_future in futures:
+                        other_future.cancel()
+                    return False
+
+        return True
+
+    ## Get the intervals which still must be extracted (not done, and not in the cache)
+    #
+    #  @return  tuple[]  The (scene, interval, segment) of each interval
+    def PendingCleans( self ):
+        if not self._HasSegments() or self._IsConverted():
+            return []
 
+        pending = []
         for scene in self.mScenes:
             for interval, segment in zip( scene.Intervals(), scene.Segments() ):
-                self._RunCleanInterval( scene, interval, segment )
+                if self.mManifest.IsDone( *self._CleanStep( scene, interval, segment ), segment ):
+                    continue
+                if self.mCache is not None and self.mCache.Contains( self.mCache.Key( scene.Source(), interval ), segment.suffix ):
+                    continue
+                pending.append( ( scene, interval, segment ) )
+        return pending
+
+    ## Extract intervals (of this video or of other ones) from a source with only one command
+    #
+    #  The source is read once (from the keyframe before the first interval), and each interval is an output of the command
+    #
+    #  @param  iPathFile  pathlib.Path  The source
+    #  @param  iTasks     tuple[]       The (converter, scene, interval, segment) of each interval
+    #  @return            bool          All the intervals have been extracted
+    def RunCleanShared( self, iPathFile, iTasks ):
+        starts = [ TimecodeToSeconds( interval.SS() ) for _, _, interval, _ in iTasks ]
+        keyframe = None
+        if self.mProbe is not None:
+            keyframe = self.mProbe.PreviousKeyframe( iPathFile, min( starts ) )
+
+        command = [ self.mFFmpeg, *self._GetStdinParameters() ]
+        if keyframe is not None:
+            command += [ '-ss', f'{keyframe:.3f}' ]
+        command += [ '-i', iPathFile ]
+
+        for ( convert, _, interval, segment ), start in zip( iTasks, starts ):
+            seek_output = [ '-ss', interval.SS(), '-to', interval.To() ]
+            if keyframe is not None:
+                seek_output = [ '-ss', f'{start - keyframe:.3f}', '-t', f'{interval.Duration():.3f}' ]
+
+            temporary = PartialOutput( segment )
+            temporary.unlink( missing_ok=True )
+            command += [ *convert._GetVMapParameters( interval ),
+                         *convert._GetAMapParameters( interval ),
+                         '-c', 'copy',
+                         *seek_output,
+                         temporary ]
+
+        cp = self._Execute( command, 'clean', sum( interval.Duration() for _, _, interval, _ in iTasks ) )
+
+        for convert, scene, interval, segment in iTasks:
+            temporary = PartialOutput( segment )
+            if cp.returncode:
+                temporary.unlink( missing_ok=True )
+                continue
+
+            os.replace( temporary, segment )
+            convert._CleanDone( scene, interval, segment )
+
+        return cp.returncode == 0
+
+    def _GetStdinParameters( self, iConcurrent=False ):
+        if iConcurrent or not self.mInteractive:
+            return [ '-nostdin' ]
+        return []
 
     def _GetAMapParameters( self, iInterval ):
         # All audio streams
@@ -59,19 +456,71 @@ def _GetAMapParameters( self, iInterval ):
         return maps
 
     def _GetVMapParameters( self, iInterval ):
-        # All video streams
-        if iInterval.VMap() is None:
-            return [ '-map', '0:v' ]
+        return VMapParameters( iInterval )
 
-        # Legacy: only 1 video stream
-        return [ '-map', iInterval.VMap() ]
+    ## Get the parameters to cut an interval of a source
+    #
+    #  With the keyframes of the source, the input seeks directly to the keyframe before the start
+    #  (the source is not read before it), then the output is trimmed exactly to the interval.
+    #  Without them, the source is read from its start until the interval (output seeking)
+    #
+    #  @param  iSource    cSource    The source
+    #  @param  iInterval  cInterval  The interval
+    #  @return            tuple      The parameters before the input (string[]) and after the input (string[])
+    def _GetSeekParameters( self, iSource, iInterval ):
+        keyframe = None
+        if self.mProbe is not None:
+            keyframe = self.mProbe.PreviousKeyframe( iSource.PathFile(), TimecodeToSeconds( iInterval.SS() ) )
+        if keyframe is None:
+            return [], [ '-ss', iInterval.SS(), '-to', iInterval.To() ]
+
+        offset = TimecodeToSeconds( iInterval.SS() ) - keyframe
+        return [ '-ss', f'{keyframe:.3f}' ], [ '-ss', f'{offset:.3f}', '-t', f'{iInterval.Duration():.3f}' ]
 
     ## Create a 'clean' file for an interval
     #
-    #  @param  iInterval  cInterval     The interval to make a clean
-    #  @param  iOutput    pathlib.Path  The output 'clean' file of the interval
-    def _RunCleanInterval( self, iScene, iInterval, iOutput ):
+    #  @param  iScene       cScene        The scene of the interval
+    #  @param  iInterval    cInterval     The interval to make a clean
+    #  @param  iOutput      pathlib.Path  The output 'clean' file of the interval
+    #  @param  iConcurrent  bool          Other commands run at the same time (no interaction on stdin)
+    #  @return              bool          The segment has been created
+    def _RunCleanInterval( self, iScene, iInterval, iOutput, iConcurrent=False ):
+        step, inputs = self._CleanStep( iScene, iInterval, iOutput )
+        return self._RunStep( step, inputs, iOutput,
+                              lambda iTemporary: self._CleanInterval( iScene, iInterval, iTemporary, iConcurrent ) )
+
+    ## Get the step of the extraction of an interval
+    #
+    #  @param  iScene     cScene        The scene of the interval
+    #  @param  iInterval  cInterval     The interval
+    #  @param  iOutput    pathlib.Path  The segment of the interval
+    #  @return            tuple         The name of the step and its inputs
+    def _CleanStep( self, iScene, iInterval, iOutput ):
+        inputs = { 'source': iScene.Source().Fingerprint(),
+                   'interval': [ iInterval.SS(), iInterval.To(), iInterval.VMap(), iInterval.AMap() ] }
+        return f'clean:{iOutput.name}', inputs
+
+    ## Save an interval extracted by another command
+    #
+    #  @param  iScene     cScene        The scene of the interval
+    #  @param  iInterval  cInterval     The interval
+    #  @param  iOutput    pathlib.Path  The segment of the interval
+    def _CleanDone( self, iScene, iInterval, iOutput ):
+        self.mManifest.Done( *self._CleanStep( iScene, iInterval, iOutput ), iOutput )
+        if self.mCache is not None:
+            self.mCache.Put( self.mCache.Key( iScene.Source(), iInterval ), iOutput )
+
+    def _CleanInterval( self, iScene, iInterval, iOutput, iConcurrent ):
+        key = None
+        if self.mCache is not None:
+            key = self.mCache.Key( iScene.Source(), iInterval )
+            if self.mCache.Get( key, iOutput ):
+                return True
+
+        seek_input, seek_output = self._GetSeekParameters( iScene.Source(), iInterval )
         command = [ self.mFFmpeg,
+                    *self._GetStdinParameters( iConcurrent ),
+                    *seek_input,
                     '-i', iScene.Source().PathFile(),
                         #TODO: add options to get subtitle streams, but do it for each command
                         # '-probesize', '100M',
@@ -79,37 +528,85 @@ def _RunCleanInterval( self, iScene, iInterval, iOutput ):
                     *self._GetVMapParameters( iInterval ),
                     *self._GetAMapParameters( iInterval ),
                     '-c', 'copy',
-                    '-ss', iInterval.SS(),
-                    '-to', iInterval.To(),
+                    *seek_output,
                     iOutput ]
 
-        self._PrintHeader( command )
-        cp = self._Run( command )
-        self._PrintFooter( cp )
+        cp = self._Execute( command, 'clean', iInterval.Duration() )
+
+        if cp.returncode:
+            return False
+
+        if key is not None:
+            self.mCache.Put( key, iOutput )
+
+        return True
 
     #---
 
     ## Convert a 'clean' file (without ads) of the scene to an AVI-XVID file
+    #
+    #  @return  bool  The avi file has been created
     def RunConvert( self ):
+        success = self._RunStep( 'convert', self._ConvertInputs(), self.mVideo.OutputAvi(), self._Convert )
+
+        if self.mScratch is not None:
+            self.mScratch.Release( self.mVideo.Name(), success )
+
+        return success
+
+    ## Check if the video has already been converted (with the same inputs)
+    #
+    #  @return  bool  The avi file is done
+    def _IsConverted( self ):
+        return self.mManifest.IsDone( 'convert', self._ConvertInputs(), self.mVideo.OutputAvi() )
+
+    ## Get the inputs of the convert step
+    #
+    #  @return  dict  The inputs
+    def _ConvertInputs( self ):
+        return { 'engine': self.mEngine,
+                 'qscale': self.mVideo.QScale(),
+                 'deinterlace': self._GetDeinterlaceFilter(),
+                 'codecs': [ *self._GetVideoParameters(), *self._GetAudioParameters() ],
+                 'intervals': [ [ *scene.Source().Fingerprint(), interval.SS(), interval.To(), interval.VMap(), interval.AMap() ]
+                                for scene in self.mScenes for interval in scene.Intervals() ] }
+
+    ## Convert to an AVI-XVID file
+    #
+    #  @param  iOutput  pathlib.Path  The avi file
+    #  @return          bool          The avi file has been created
+    def _Convert( self, iOutput ):
         if len( self.mScenes ) == 1 and len( self.mScenes[0].Intervals() ) == 1:
             scene = self.mScenes[0]
             interval = self.mScenes[0].Intervals()[0]
 
+            if self.mChunks > 1 and not self._IsVideoCopy():
+                return self._RunConvertChunks( scene.Source().PathFile(), [],
+                                               TimecodeToSeconds( interval.SS() ), TimecodeToSeconds( interval.To() ),
+                                               [ *self._GetVMapParameters( interval ) ],
+                                               [ *self._GetAMapParameters( interval ) ],
+                                               iOutput )
+
             # Make convertion
+            seek_input, seek_output = self._GetSeekParameters( scene.Source(), interval )
             command = [ self.mFFmpeg,
+                        *self._GetStdinParameters(),
+                        *seek_input,
                         '-i', scene.Source().PathFile(),
                         *self._GetVMapParameters( interval ),
                         *self._GetAMapParameters( interval ),
-                        '-ss', interval.SS(),
-                        '-to', interval.To(),
-                        '-qscale:v', str( self.mVideo.QScale() ),
-                        '-acodec', 'mp3',
-                        '-vtag', 'XVID',
-                        self.mVideo.OutputAvi() ]
-
-            self._PrintHeader( command )
-            cp = self._Run( command )
-            self._PrintFooter( cp )
+                        *seek_output,
+                        *self._GetVideoParameters(),
+                        *self._GetAudioParameters(),
+                        iOutput ]
+
+            cp = self._Execute( command, 'convert', interval.Duration() )
+
+            return cp.returncode == 0
+        elif self.mEngine == 'single-pass':
+            return self._RunConvertSinglePass( iOutput )
+        elif self.mEngine == 'stream':
+            return self._RunConvertStream( iOutput )
         else:
             with open( self.mVideo.SegmentList(), 'w' ) as outfile:
                 outfile.write( "# this is a comment\n" )
@@ -117,47 +614,425 @@ def RunConvert( self ):
                     for segment in scene.Segments():
                         outfile.write( f"file '{segment.name}'\n" )
 
+            # The real duration of the segments may be different from the intervals one (cut on packets)
+            if self.mChunks > 1 and not self._IsVideoCopy():
+                return self._RunConvertChunks( self.mVideo.SegmentList(), [ '-f', 'concat', '-safe', '0' ],
+                                               0, None,
+                                               [ '-map', '0:v' ],
+                                               [ '-map', '0:a', '-async', '1' ],
+                                               iOutput )
+
             # Make concat & convertion
             command = [ self.mFFmpeg,
+                        *self._GetStdinParameters(),
                         '-f', 'concat',
                         '-safe', '0',
                         '-i', self.mVideo.SegmentList(),
                         '-map', '0',
-                        '-qscale:v', str( self.mVideo.QScale() ),
-                        '-acodec', 'mp3',
-                        '-vtag', 'XVID',
+                        *self._GetVideoParameters(),
+                        *self._GetAudioParameters(),
                         '-fflags', '+genpts', '-async', '1',
-                        self.mVideo.OutputAvi() ]
+                        iOutput ]
+
+            cp = self._Execute( command, 'convert', self._Duration() )
+
+            return cp.returncode == 0
 
-            self._PrintHeader( command )
-            cp = self._Run( command )
-            self._PrintFooter( cp )
+    ## Convert a part of an input to the AVI-XVID file, with multiple processes (1 for each chunk)
+    #
+    #  @param  iPathFile         pathlib.Path  The input
+    #  @param  iInputParameters  string[]      The parameters of the input (-f concat, ...)
+    #  @param  iStart            float         The start of the part (in seconds)
+    #  @param  iEnd              float         The end of the part (in seconds), None for the end of the input
+    #  @param  iVMapParameters   string[]      The video streams (the parameters of the codec are added)
+    #  @param  iAMapParameters   string[]      The audio streams and their options (the parameters of the codec are added)
+    #  @param  iOutput           pathlib.Path  The avi file
+    #  @return                   bool          The avi file has been created
+    def _RunConvertChunks( self, iPathFile, iInputParameters, iStart, iEnd, iVMapParameters, iAMapParameters, iOutput ):
+        baseline_speed = None
+        if self.mHistory is not None:
+            baseline_speed = self.mHistory.Speed( 'convert', Profile( self.mEngine, self.mVideo.QScale(), 1, self._GetDeinterlaceFilter() ),
+                                                  Drive( iPathFile ), iFallback=False )
+
+        encoder = cChunkEncoder( self.mFFmpeg, self.mProbe, self.mChunks,
+                                 iRun=lambda iCommand, iDuration=None: self._Execute( iCommand, 'convert', iDuration, self.mChunks ),
+                                 iBaselineSpeed=baseline_speed )
+        return encoder.Run( iPathFile, iInputParameters, iStart, iEnd,
+                            [ *iVMapParameters, *self._GetVideoParameters() ],
+                            [ *iAMapParameters, *self._GetAudioParameters() ],
+                            iOutput, self.mVideo.Temporary() )
+
+    ## Get the deinterlacing filter (only if a source is interlaced)
+    #
+    #  @return  string  The filter
+    #  @return  None    The video is not deinterlaced
+    def _GetDeinterlaceFilter( self ):
+        if self.mDeinterlace is None:
+            return None
+        return self.mDeinterlace.Filter( list( dict.fromkeys( scene.Source().PathFile() for scene in self.mScenes ) ) )
+
+    ## Get the parameters of the deinterlacing (only if a source is interlaced)
+    #
+    #  @return  string[]  The parameters
+    def _GetDeinterlaceParameters( self ):
+        if self.mDeinterlace is None:
+            return []
+        return self.mDeinterlace.Parameters( list( dict.fromkeys( scene.Source().PathFile() for scene in self.mScenes ) ) )
+
+    ## Get the streams of the sources mapped to the output
+    #
+    #  @return  tuple  The video stream of each interval (dict[]),
+    #                  and for each output audio stream, the audio stream of each interval (dict[][])
+    def _GetMappedStreams( self ):
+        videos = []
+        audios = []
+        for scene in self.mScenes:
+            info = self.mProbe.Info( scene.Source().PathFile() ) if self.mProbe is not None else None
+            streams = info['streams'] if info is not None else []
+            for interval in scene.Intervals():
+                video_streams = self._FindStreams( streams, 'video', interval.VMap() )
+                videos.append( video_streams[0] if video_streams else None )
+                audios.append( self._FindStreams( streams, 'audio', interval.AMap() ) )
+
+        count = max( ( len( audio_streams ) for audio_streams in audios ), default=0 )
+        return videos, [ [ audio_streams[i] if i < len( audio_streams ) else None for audio_streams in audios ] for i in range( count ) ]
+
+    ## Find the streams of a map
+    #
+    #  @param  iStreams  dict[]  The streams of the source (from cProbe.Info)
+    #  @param  iType     string  The type of the streams (video, audio)
+    #  @param  iMap      string  The map of the interval (None for all the streams, '0:1' for the stream 1, '1,0' for the audio streams 1 and 0)
+    #  @return           dict[]  The streams (None if a stream is unknown)
+    def _FindStreams( self, iStreams, iType, iMap ):
+        typed_streams = [ stream for stream in iStreams if stream['type'] == iType ]
+        if iMap is None:
+            return typed_streams
+
+        # Legacy: '0:1' is the stream 1
+        if iMap.startswith( '0:' ):
+            return [ next( ( stream for stream in iStreams if str( stream['index'] ) == iMap.split( ':', 1 )[1] ), None ) ]
+
+        return [ typed_streams[int( index )] if int( index ) < len( typed_streams ) else None for index in iMap.split( ',' ) ]
+
+    ## Check if the video stream is copied (compatible and not deinterlaced)
+    #
+    #  @return  bool  The video stream is copied
+    def _IsVideoCopy( self ):
+        if self.mCodecs is None:
+            return False
+
+        videos, _ = self._GetMappedStreams()
+        return self.mCodecs.IsVideoCopy( videos, self._GetDeinterlaceFilter() is not None )
+
+    ## Get the parameters of the video stream of the output (deinterlacing and codec)
+    #
+    #  @return  string[]  The parameters
+    def _GetVideoParameters( self ):
+        if self.mCodecs is None:
+            return [ *self._GetDeinterlaceParameters(), '-qscale:v', str( self.mVideo.QScale() ), '-vtag', 'XVID' ]
+
+        videos, _ = self._GetMappedStreams()
+        deinterlaced = self._GetDeinterlaceFilter() is not None
+        parameters = self.mCodecs.VideoParameters( videos, self.mVideo.QScale(), deinterlaced )
+        if self.mCodecs.IsVideoCopy( videos, deinterlaced ):
+            return parameters
+        return [ *self._GetDeinterlaceParameters(), *parameters ]
+
+    ## Get the parameters of the audio streams of the output (codecs)
+    #
+    #  @return  string[]  The parameters
+    def _GetAudioParameters( self ):
+        if self.mCodecs is None:
+            return [ '-acodec', 'mp3' ]
+
+        _, audios = self._GetMappedStreams()
+        return self.mCodecs.AudioParameters( audios )
+
+    ## Get the duration of all the intervals
+    #
+    #  @return  float  The duration (in seconds)
+    def _Duration( self ):
+        return sum( interval.Duration() for scene in self.mScenes for interval in scene.Intervals() )
+
+    ## Get the profile of a kind of step (for the history)
+    #
+    #  @param  iKind  string  The kind of step ('clean', 'convert')
+    #  @return        string  The profile
+    def _Profile( self, iKind ):
+        if iKind != 'convert':
+            return iKind
+
+        if self.mEngine == 'single-pass':
+            return Profile( self.mEngine, self.mVideo.QScale(), 1, self._GetDeinterlaceFilter() )
+        return Profile( self.mEngine, self.mVideo.QScale(), self.mChunks, self._GetDeinterlaceFilter(), self._IsVideoCopy() )
+
+    ## Get the inputs of the single-pass command
+    #
+    #  There is 1 input for each interval, each one with 1 video stream and the same number of audio streams
+    #
+    #  @return  tuple[]  The (scene, interval, video stream, audio streams) of each input
+    #  @return  None     The inputs can't be used by the concat filter
+    def _GetSinglePassInputs( self ):
+        inputs = []
+        for scene in self.mScenes:
+            for interval in scene.Intervals():
+                index = len( inputs )
+
+                # Legacy: '0:1' is the stream 1 of the input 0
+                video = f'{index}:v:0' if interval.VMap() is None else f'{index}:{interval.VMap().split( ":", 1 )[1]}'
+
+                # All audio streams, but their number is unknown
+                if interval.AMap() is None:
+                    return None
+
+                if interval.AMap().startswith( '0:' ):
+                    audios = [ f'{index}:{interval.AMap().split( ":", 1 )[1]}' ]
+                else:
+                    audios = [ f'{index}:a:{audio}' for audio in interval.AMap().split( ',' ) ]
+
+                inputs.append( ( scene, interval, video, audios ) )
+
+        if len( { len( audios ) for _, _, _, audios in inputs } ) != 1:
+            return None
+
+        return inputs
+
+    ## Convert all the intervals to the AVI-XVID file with only one command
+    #
+    #  Each interval is an input (with input seeking), and they are joined by the concat filter.
+    #  There is no segment file, but all the sources must share the same video/audio parameters.
+    #  The concat filter decodes the streams, so they are always transcoded (never copied)
+    #
+    #  @param  iOutput  pathlib.Path  The avi file
+    #  @return          bool          The avi file has been created
+    def _RunConvertSinglePass( self, iOutput ):
+        inputs = self._GetSinglePassInputs()
+        audio_count = len( inputs[0][3] )
+
+        command = [ self.mFFmpeg, *self._GetStdinParameters() ]
+        for scene, interval, _, _ in inputs:
+            command += [ '-ss', interval.SS(),
+                         '-t', f'{interval.Duration():.3f}',
+                         '-i', scene.Source().PathFile() ]
+
+        streams = ''.join( f'[{video}]' + ''.join( f'[{audio}]' for audio in audios ) for _, _, video, audios in inputs )
+        outputs = '[v]' + ''.join( f'[a{i}]' for i in range( audio_count ) )
+
+        graph = f'{streams}concat=n={len( inputs )}:v=1:a={audio_count}{outputs}'
+        deinterlace_graph = self.mDeinterlace.Graph( self.Sources() ) if self.mDeinterlace is not None else None
+        if deinterlace_graph is not None:
+            graph = graph.replace( '[v]', '[vc]', 1 ) + f';[vc]{deinterlace_graph}[v]'
+            if self.mDeinterlace.Threads() is not None:
+                command += [ '-filter_complex_threads', str( self.mDeinterlace.Threads() ) ]
+
+        command += [ '-filter_complex', graph,
+                     '-map', '[v]' ]
+        for i in range( audio_count ):
+            command += [ '-map', f'[a{i}]' ]
+        command += [ '-qscale:v', str( self.mVideo.QScale() ),
+                     '-acodec', 'mp3',
+                     '-vtag', 'XVID',
+                     iOutput ]
+
+        cp = self._Execute( command, 'convert', self._Duration() )
+
+        return cp.returncode == 0
+
+    ## Convert all the intervals to the AVI-XVID file, streaming the 'clean' intervals to the convert command
+    #
+    #  The intervals are extracted one after the other (as mpegts) to the stdin of the convert command,
+    #  which encodes them while they are produced.
+    #  Each interval is shifted by the duration of the previous ones to keep increasing timestamps
+    #
+    #  @param  iOutput  pathlib.Path  The avi file
+    #  @return          bool          The avi file has been created
+    def _RunConvertStream( self, iOutput ):
+        command = [ self.mFFmpeg,
+                    '-nostdin',
+                    '-fflags', '+genpts',
+                    '-f', 'mpegts',
+                    '-i', 'pipe:0',
+                    '-map', '0',
+                    *self._GetVideoParameters(),
+                    *self._GetAudioParameters(),
+                    '-async', '1',
+                    iOutput ]
+
+        self._PrintHeader( command )
+        encoder, wait = self._Start( command, 'convert', self._Duration(), stdin=subprocess.PIPE )
+        encoder_process = encoder.Process()
+
+        offset = 0.0
+        success = True
+        for scene in self.mScenes:
+            for interval in scene.Intervals():
+                seek_input, seek_output = self._GetSeekParameters( scene.Source(), interval )
+                clean_command = [ self.mFFmpeg,
+                                  '-nostdin',
+                                  *seek_input,
+                                  '-i', scene.Source().PathFile(),
+                                  *self._GetVMapParameters( interval ),
+                                  *self._GetAMapParameters( interval ),
+                                  '-c', 'copy',
+                                  *seek_output,
+                                  '-output_ts_offset', f'{offset:.3f}',
+                                  '-f', 'mpegts',
+                                  'pipe:1' ]
+
+                cp = self._Execute( clean_command, stdout=encoder_process.stdin )
+
+                offset += interval.Duration()
+
+                if cp.returncode:
+                    success = False
+                    break
+            if not success:
+                break
+
+        encoder_process.stdin.close()
+        if not success:
+            encoder.Cancel()
+        result = wait()
+
+        self._PrintFooter( result )
+
+        return success and result.returncode == 0
 
     #---
 
+    ## Run a step of the job, unless it has already been done with the same inputs
+    #
+    #  The output is written with a temporary name and renamed only when the step succeeds,
+    #  so an interrupted run never leaves a truncated output
+    #
+    #  @param  iStep    string        The name of the step
+    #  @param  iInputs  dict          The inputs of the step
+    #  @param  iOutput  pathlib.Path  The output of the step
+    #  @param  iRun     function      Create the output (to the given pathfile) and return the success
+    #  @return          bool          The output has been created
+    def _RunStep( self, iStep, iInputs, iOutput, iRun ):
+        if self.mManifest.IsDone( iStep, iInputs, iOutput ):
+            print( Fore.CYAN + f'already done: {iStep} ({iOutput.name})' )
+            return True
+
+        temporary = PartialOutput( iOutput )
+        temporary.unlink( missing_ok=True )
+        if not iRun( temporary ):
+            temporary.unlink( missing_ok=True )
+            return False
+
+        os.replace( temporary, iOutput )
+        self.mManifest.Done( iStep, iInputs, iOutput )
+        return True
+
     ## Print information before running a command
     #
     #  @param  iCommand  string[]  The command which will be executed
     def _PrintHeader( self, iCommand ):
-        deinit()
-        init( autoreset=False )
-        print( Fore.YELLOW )
-        print( *iCommand )
-        print( Style.RESET_ALL )
+        with self.mPrintLock:
+            print( Fore.YELLOW + ' '.join( map( str, iCommand ) ) )
 
     ## Execute a command
     #
-    #  @param  iCommand  string[]  The command which will be executed
-    def _Run( self, iCommand ):
-        # return 'xxxxxxxxxxxxxxxxxx'
-        return subprocess.run( iCommand )
+    #  @param  iCommand   string[]  The command which will be executed
+    #  @param  iKind      string    The kind of step for the progress ('clean', 'convert'), None to not follow it
+    #  @param  iDuration  float     The duration (in seconds) of the media produced by the command
+    #  @param  iParallel  int       The number of similar commands which run at the same time (for the budget of threads)
+    #  @param  iOptions   dict      The options of subprocess.Popen (stdout, ...)
+    #  @return            cResult   The result of the command
+    def _Run( self, iCommand, iKind=None, iDuration=None, iParallel=1, **iOptions ):
+        job, wait = self._Start( iCommand, iKind, iDuration, iParallel, **iOptions )
+        return wait()
+
+    ## Start a command, with its progress read from its stdout (if it's free)
+    #
+    #  The command waits for its threads if there is a budget,
+    #  and a copy (limited by the reads/writes) waits for the devices of its files if there are limits
+    #
+    #  @param  iCommand   string[]  The command which will be executed
+    #  @param  iKind      string    The kind of step for the progress ('clean', 'convert'), None to not follow it
+    #  @param  iDuration  float     The duration (in seconds) of the media produced by the command, None to not follow it
+    #  @param  iParallel  int       The number of similar commands which run at the same time (for the budget of threads)
+    #  @param  iOptions   dict      The options of subprocess.Popen (stdin, stdout, ...)
+    #  @return            tuple     The job (cJob) and the function to call to wait the end of the command (which returns the cResult)
+    def _Start( self, iCommand, iKind, iDuration, iParallel=1, **iOptions ):
+        release_devices = None
+        if self.mDevices is not None:
+            release_devices = self.mDevices.Acquire( CommandFiles( iCommand ), 'copy' if JobType( iCommand ) == 'copy' else 'encode' )
+
+        allocation = None
+        if self.mBudget is not None:
+            allocation = self.mBudget.Acquire( iCommand, iParallel )
+            iCommand = allocation.Apply( iCommand )
+
+        def Wait( iJob, iReader=None, iStep=None ):
+            try:
+                if iReader is not None:
+                    iReader.join()
+                result = iJob.Wait()
+            finally:
+                if allocation is not None:
+                    allocation.Release()
+                if release_devices is not None:
+                    release_devices()
+            if iStep is not None:
+                iStep.Finish( result.returncode == 0 )
+            self._Record( iKind, iDuration, iParallel, result )
+            return result
+
+        if self.mProgress is None or iKind is None or iDuration is None or 'stdout' in iOptions:
+            job = self.mRunner.Start( iCommand, **iOptions )
+            return job, lambda: Wait( job )
+
+        command = [ iCommand[0], '-progress', 'pipe:1', '-nostats', *iCommand[1:] ]
+        job = self.mRunner.Start( command, stdout=subprocess.PIPE, text=True, **iOptions )
+        step = self.mProgress.Start( iKind, Path( iCommand[-1] ).name, iDuration )
+
+        def Read():
+            values = {}
+            for line in job.Process().stdout:
+                key, _, value = line.strip().partition( '=' )
+                values[key] = value
+                if key == 'progress':
+                    step.Update( values )
+                    values = {}
+
+        thread = threading.Thread( target=Read, daemon=True )
+        thread.start()
+        return job, lambda: Wait( job, thread, step )
+
+    ## Save the measures of a command in the history
+    #
+    #  @param  iKind      string   The kind of step ('clean', 'convert'), None to not save it
+    #  @param  iDuration  float    The duration (in seconds) of the media produced by the command, None to not save it
+    #  @param  iParallel  int      The number of similar commands which run at the same time
+    #  @param  iResult    cResult  The result of the command
+    def _Record( self, iKind, iDuration, iParallel, iResult ):
+        if self.mHistory is None or iKind is None or iDuration is None:
+            return
+
+        sources = self.Sources()
+        frame_rate = self.mProbe.FrameRate( sources[0] ) if self.mProbe is not None and sources else None
+        self.mHistory.Record( iKind, self.mVideo.Name(), iResult, sources[0] if sources else None,
+                              iDuration, self._Profile( iKind ), self.mVideo.QScale(), iParallel, frame_rate )
+
+    ## Execute a command and print information around it
+    #
+    #  @param  iCommand   string[]                     The command which will be executed
+    #  @param  iKind      string                       The kind of step for the progress ('clean', 'convert')
+    #  @param  iDuration  float                        The duration (in seconds) of the media produced by the command
+    #  @param  iParallel  int                          The number of similar commands which run at the same time (for the budget of threads)
+    #  @param  iOptions   dict                         The options of subprocess.Popen (stdout, ...)
+    #  @return            cResult                      The result of the command
+    def _Execute( self, iCommand, iKind=None, iDuration=None, iParallel=1, **iOptions ):
+        self._PrintHeader( iCommand )
+        cp = self._Run( iCommand, iKind, iDuration, iParallel, **iOptions )
+        self._PrintFooter( cp )
+        return cp
 
     ## Print information after running a command
     #
-    #  @param  iCompletedProcess  subprocess.cCompletedProcess  The result of the command which was executed
-    def _PrintFooter( self, iCompletedProcess ):
-        print( Fore.YELLOW )
-        print( iCompletedProcess )
-        print( Style.RESET_ALL )
-        deinit()
-        init( autoreset=True )
+    #  @param  iResult  cResult  The result of the command which was executed
+    def _PrintFooter( self, iResult ):
+        with self.mPrintLock:
+            print( ( Fore.YELLOW if iResult.returncode == 0 else Fore.RED ) + f'{Path( str( iResult.args[-1] ) ).name}: {iResult!r}' )
@@ -0,0 +1,103 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package deinterlace
+#  Manage deinterlacing
+
+from colorama import Fore
+
+## The modes: detect the interlacing of the inputs (auto), or always/never deinterlace
+MODES = [ 'auto', 'always', 'never' ]
+
+## The deinterlacing filters (name -> filter graph)
+#
+#  yadif-fast skips the spatial check of yadif and only deinterlaces the frames flagged as interlaced (cheaper, a bit lower quality),
+#  bwdif is slower than yadif but gives a better quality
+FILTERS = { 'yadif': 'yadif',
+            'yadif-fast': 'yadif=mode=send_frame_nospatial:deint=interlaced',
+            'bwdif': 'bwdif' }
+
+## The deinterlacing
+#
+#  The filter runs with multiple threads (slices of each frame),
+#  and only if at least one input is interlaced (with the 'auto' mode)
+class cDeinterlace:
+
+    ## The constructor
+    #
+    #  @param  iProbe    cProbe  The prober (to detect the interlacing)
+    #  @param  iMode     string  The mode (auto, always, never)
+    #  @param  iFilter   string  The filter (yadif, yadif-fast, bwdif)
+    #  @param  iThreads  int     The number of threads of the filter (None to get it from the budget of threads)
+    def __init__( self, iProbe, iMode='auto', iFilter='yadif', iThreads=None ):
+        self.mProbe = iProbe
+        self.mMode = iMode
+        self.mFilter = iFilter
+        self.mThreads = iThreads
+
+    ## Get the number of threads of the filter
+    #
+    #  @return  int   The number of threads
+    #  @return  None  It's not set
+    def Threads( self ):
+        return self.mThreads
+
+    ## Check if the inputs must be deinterlaced
+    #
+    #  @param  iPathFiles  pathlib.Path[]  The inputs
+    #  @return             bool            At least one input is interlaced (or its interlacing is unknown)
+    def IsNeeded( self, iPathFiles ):
+        if self.mMode != 'auto':
+            return self.mMode == 'always'
+        if not iPathFiles:
+            return True
+
+        for pathfile in iPathFiles:
+            interlaced = self.mProbe.Interlaced( pathfile )
+            if interlaced is None:
+                print( Fore.YELLOW + f'unknown interlacing, deinterlace: {pathfile}' )
+                return True
+            if interlaced:
+                return True
+
+        return False
+
+    ## Get the filter
+    #
+    #  @param  iPathFiles  pathlib.Path[]  The inputs
+    #  @return             string          The filter
+    #  @return             None            The inputs are not deinterlaced
+    def Filter( self, iPathFiles ):
+        if not self.IsNeeded( iPathFiles ):
+            return None
+        return self.mFilter
+
+    ## Get the filter graph
+    #
+    #  @param  iPathFiles  pathlib.Path[]  The inputs
+    #  @return             string          The filter graph ('yadif=mode=send_frame_nospatial:deint=interlaced')
+    #  @return             None            The inputs are not deinterlaced
+    def Graph( self, iPathFiles ):
+        deinterlace_filter = self.Filter( iPathFiles )
+        if deinterlace_filter is None:
+            return None
+        return FILTERS[deinterlace_filter]
+
+    ## Get the parameters of the filter (for an output)
+    #
+    #  @param  iPathFiles  pathlib.Path[]  The inputs
+    #  @return             string[]        The parameters (empty if the inputs are not deinterlaced)
+    def Parameters( self, iPathFiles ):
+        graph = self.Graph( iPathFiles )
+        if graph is None:
+            return []
+        if self.mThreads is None:
+            return [ '-vf', graph ]
+        return [ '-vf', graph, '-filter_threads', str( self.mThreads ) ]
@@ -0,0 +1,128 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package devices
+#  Manage the concurrent accesses to the devices
+
+import os
+from pathlib import Path
+import threading
+
+## The default number of encodes at the same time on each device
+#
+#  An encode is cpu bound (it reads/writes slowly), so the limit only avoids too many of them on the same disk
+#  (the chunks of a convert, the videos of a pipeline), without serializing them
+ENCODE_LIMIT = 2 * ( os.cpu_count() or 2 )
+
+## Parse the limits of the devices
+#
+#  @param  iLimits  string  The limits ('default=4,F:=1,/mnt/h=2,encode=8')
+#  @return          tuple   The default limit of the copies (None for no limit), the limit of the copies of each path (dict)
+#                           and the limit of the encodes on each device
+def ParseLimits( iLimits ):
+    default = None
+    limits = {}
+    encode = ENCODE_LIMIT
+    for item in ( iLimits or '' ).split( ',' ):
+        path, _, limit = item.strip().rpartition( '=' )
+        if not path:
+            continue
+        if path == 'default':
+            default = int( limit )
+        elif path == 'encode':
+            encode = int( limit )
+        else:
+            limits[path] = int( limit )
+    return default, limits, encode
+
+## Get the files of an ffmpeg command (its inputs and its output)
+#
+#  @param  iCommand  string[]        The command
+#  @return           pathlib.Path[]  The files (without the pipes)
+def CommandFiles( iCommand ):
+    arguments = [ str( argument ) for argument in iCommand ]
+    files = [ value for option, value in zip( arguments, arguments[1:] ) if option == '-i' ] + arguments[-1:]
+
+    pathfiles = []
+    for pathfile in files:
+        if pathfile.startswith( 'pipe:' ) or pathfile == '-':
+            continue
+        if pathfile.startswith( 'concat:' ):
+            pathfiles += [ Path( part ) for part in pathfile[len( 'concat:' ):].split( '|' ) ]
+            continue
+        pathfiles.append( Path( pathfile ) )
+    return pathfiles
+
+#---
+
+## The limits of concurrent accesses to the devices
+#
+#  The device of a file is found with its (or its first existing parent) st_dev,
+#  so all the files of a drive (sources, segments, outputs) share the same limit.
+#  The copies and the encodes have their own limits (an encode doesn't wait for the copies of the pipeline).
+#  The devices of a command are locked in the same order for all the commands (no deadlock)
+class cDeviceLimits:
+
+    ## The constructor
+    #
+    #  @param  iDefault      int   The number of concurrent copies on a device (None for no limit)
+    #  @param  iLimits       dict  The number of concurrent copies on the device of some paths ('F:' -> 2)
+    #  @param  iEncodeLimit  int   The number of concurrent encodes on a device (None for no limit)
+    def __init__( self, iDefault=None, iLimits={}, iEncodeLimit=None ):
+        self.mDefault = iDefault
+        self.mEncodeLimit = iEncodeLimit
+        self.mLimits = {}
+        for path, limit in iLimits.items():
+            # Not connected
+            if not Path( path ).exists():
+                continue
+            self.mLimits[self.Device( Path( path ) )] = limit
+
+        self.mSemaphores = {}
+        self.mLock = threading.Lock()
+
+    ## Get the device of a file
+    #
+    #  @param  iPathFile  pathlib.Path  The file (which may not exist yet)
+    #  @return            int           The device
+    #  @return            None          The device is unknown
+    def Device( self, iPathFile ):
+        for path in ( iPathFile, *iPathFile.absolute().parents ):
+            try:
+                return path.stat().st_dev
+            except OSError:
+                continue
+        return None
+
+    ## Wait for the devices of some files
+    #
+    #  @param  iPathFiles  pathlib.Path[]  The files
+    #  @param  iType       string          The type of the command ('copy', 'encode')
+    #  @return             function        The function to call to release the devices
+    def Acquire( self, iPathFiles, iType='copy' ):
+        devices = sorted( { device for device in map( self.Device, iPathFiles ) if device is not None } )
+
+        semaphores = []
+        with self.mLock:
+            for device in devices:
+                limit = self.mLimits.get( device, self.mDefault ) if iType == 'copy' else self.mEncodeLimit
+                if limit is None:
+                    continue
+                if ( device, iType ) not in self.mSemaphores:
+                    self.mSemaphores[( device, iType )] = threading.Semaphore( limit )
+                semaphores.append( self.mSemaphores[( device, iType )] )
+
+        for semaphore in semaphores:
+            semaphore.acquire()
+
+        def Release():
+            for semaphore in reversed( semaphores ):
+                semaphore.release()
+        return Release
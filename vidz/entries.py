@@ -0,0 +1,193 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package entries
+#  Manage the entries of the data file
+
+import hashlib
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+
+from colorama import Fore
+
+from .manifest import PartialOutput
+from .scene import TimecodeToSeconds
+
+## The format of a timecode in the data file ('01:02:03.456')
+TIMECODE = re.compile( r'^\d{2}:[0-5]\d:[0-5]\d(\.\d{1,3})?$' )
+
+## The version of the index, to rebuild the indexes of a previous version
+VERSION = 1
+
+## The entries of the data file
+#
+#  The xml file is compiled once in an index (json): the attributes of the root,
+#  and the records of all the videos (scenes and intervals) by id.
+#  The index is rebuilt only when the xml file has changed (size and modification time, then hash),
+#  and the whole file is checked when it's built (duplicated ids, malformed timecodes)
+class cEntries:
+
+    ## The constructor
+    #
+    #  @param  iPathFile  pathlib.Path  The data file (xml)
+    #  @param  iIndex     pathlib.Path  The index file (json), None to use '<data>.index.json' next to the data file
+    def __init__( self, iPathFile, iIndex=None ):
+        self.mPathFile = iPathFile
+        self.mIndex = iIndex if iIndex is not None else iPathFile.with_name( f'{iPathFile.stem}.index.json' )
+
+        self.mRoot = {}
+        self.mVideos = {}
+        self.mDuplicates = {}
+        self.mErrors = []
+
+    ## Load the entries (from the index, or from the data file if it has changed)
+    #
+    #  @return  bool  The entries are loaded (False if the data file can't be parsed)
+    def Load( self ):
+        stat = self.mPathFile.stat()
+
+        index = None
+        if self.mIndex.exists():
+            try:
+                index = json.loads( self.mIndex.read_text() )
+            except ValueError:
+                index = None
+        if index is not None and index.get( 'version' ) != VERSION:
+            index = None
+
+        if index is not None and ( index['size'] != stat.st_size or index['mtime_ns'] != stat.st_mtime_ns ):
+            # Only touched (or saved without change): the index is still valid
+            if index['hash'] == self._Hash():
+                index['mtime_ns'] = stat.st_mtime_ns
+                self._Save( index )
+            else:
+                index = None
+
+        if index is None:
+            index = self._Build()
+            if index is None:
+                return False
+            self._Save( index )
+
+            for error in index['errors']:
+                print( Fore.YELLOW + f'{self.mPathFile.name}: {error}' )
+
+        self.mRoot = index['root']
+        self.mVideos = index['videos']
+        self.mDuplicates = index['duplicates']
+        self.mErrors = index['errors']
+        return True
+
+    ## Get the attributes of the root
+    #
+    #  @return  dict  The attributes (ffmpeg, ffprobe, output, ...)
+    def Root( self ):
+        return self.mRoot
+
+    ## Get a video
+    #
+    #  @param  iId  string  The id of the video
+    #  @return      dict    The video (id, name, qscale, scenes with the attributes of the source and the intervals, errors)
+    #  @return      None    There is no video (or multiple videos) with this id
+    def Video( self, iId ):
+        if iId in self.mDuplicates:
+            return None
+        return self.mVideos.get( iId )
+
+    ## Get the number of videos with an id
+    #
+    #  @param  iId  string  The id of the video
+    #  @return      int     The number of videos
+    def Count( self, iId ):
+        if iId in self.mDuplicates:
+            return self.mDuplicates[iId]
+        return 1 if iId in self.mVideos else 0
+
+    ## Get the errors found in the whole data file
+    #
+    #  @return  string[]  The errors
+    def Errors( self ):
+        return self.mErrors
+
+    #---
+
+    def _Hash( self ):
+        return hashlib.sha256( self.mPathFile.read_bytes() ).hexdigest()
+
+    ## Compile the data file
+    #
+    #  @return  dict  The index
+    #  @return  None  The data file can't be parsed
+    def _Build( self ):
+        print( Fore.CYAN + f'index the entries: {self.mPathFile}' )
+
+        try:
+            root = ET.parse( self.mPathFile ).getroot()
+        except ET.ParseError as e:
+            print( Fore.RED + f'can\'t parse {self.mPathFile}: {e}' )
+            return None
+
+        videos = {}
+        counts = {}
+        errors = []
+        for xml_video in root.findall( 'video' ):
+            id = xml_video.get( 'id' )
+            counts[id] = counts.get( id, 0 ) + 1
+
+            video = { 'id': id, 'name': xml_video.get( 'name' ), 'qscale': xml_video.get( 'qscale' ), 'scenes': [], 'errors': [] }
+            for xml_scene in xml_video.findall( 'scene' ):
+                scene = { **xml_scene.attrib, 'intervals': [] }
+                for xml_interval in xml_scene.findall( 'interval' ):
+                    interval = { 'ss': xml_interval.get( 'ss' ), 'to': xml_interval.get( 'to' ),
+                                 'vmap': xml_interval.get( 'vmap' ), 'amap': xml_interval.get( 'amap' ) }
+                    video['errors'] += self._CheckInterval( id, interval )
+                    scene['intervals'].append( interval )
+                video['scenes'].append( scene )
+            errors += video['errors']
+
+            videos.setdefault( id, video )
+
+        duplicates = { id: count for id, count in counts.items() if count > 1 }
+        for id, count in duplicates.items():
+            errors.append( f'multiple videos with same id: {id} ({count})' )
+
+        stat = self.mPathFile.stat()
+        return { 'version': VERSION,
+                 'size': stat.st_size,
+                 'mtime_ns': stat.st_mtime_ns,
+                 'hash': self._Hash(),
+                 'root': dict( root.attrib ),
+                 'videos': videos,
+                 'duplicates': duplicates,
+                 'errors': errors }
+
+    ## Check the timecodes of an interval
+    #
+    #  @param  iId        string    The id of the video
+    #  @param  iInterval  dict      The interval
+    #  @return            string[]  The errors
+    def _CheckInterval( self, iId, iInterval ):
+        errors = []
+        for key in ( 'ss', 'to' ):
+            if iInterval[key] is None or not TIMECODE.match( iInterval[key] ):
+                errors.append( f'malformed timecode in video {iId}: {key}="{iInterval[key]}"' )
+        if errors:
+            return errors
+
+        if TimecodeToSeconds( iInterval['ss'] ) >= TimecodeToSeconds( iInterval['to'] ):
+            errors.append( f'empty interval in video {iId}: ss="{iInterval["ss"]}" to="{iInterval["to"]}"' )
+        return errors
+
+    def _Save( self, iIndex ):
+        temporary = PartialOutput( self.mIndex )
+        temporary.write_text( json.dumps( iIndex ) )
+        os.replace( temporary, self.mIndex )
@@ -0,0 +1,250 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package history
+#  Manage the history of the runs (the measures of each command)
+
+import os
+from pathlib import Path
+import platform
+import re
+import sqlite3
+import statistics
+import subprocess
+import threading
+import time
+
+from .runner import cRunner
+
+## The columns of the trends
+TRENDS = [ 'drive', 'profile' ]
+
+## Get the drive of a file
+#
+#  @param  iPathFile  pathlib.Path  The file
+#  @return            string        The drive ('F:') or the mount point ('/mnt/h')
+def Drive( iPathFile ):
+    path = Path( iPathFile ).absolute()
+    if path.drive:
+        return path.drive
+
+    for parent in ( path, *path.parents ):
+        if os.path.ismount( parent ):
+            return str( parent )
+    return path.anchor
+
+## Get the build of ffmpeg
+#
+#  @param  iFFmpeg  string   The ffmpeg command pathfile
+#  @param  iRunner  cRunner  The runner of the commands
+#  @return          string   The version ('6.0-essentials_build-www.gyan.dev')
+#  @return          None     The version is unknown
+def FFmpegBuild( iFFmpeg, iRunner=None ):
+    runner = iRunner if iRunner is not None else cRunner()
+    try:
+        cp = runner.Run( [ iFFmpeg, '-version' ], iCapture=True, stdin=subprocess.DEVNULL )
+    except OSError:
+        return None
+
+    match = re.match( r'\S+ version (\S+)', cp.stdout )
+    return match.group( 1 ) if match else None
+
+## Get the profile of a convert
+#
+#  @param  iEngine       string  The engine ('two-pass', ...)
+#  @param  iQScale       int     The quality of the video
+#  @param  iChunks       int     The number of chunks encoded at the same time
+#  @param  iDeinterlace  string  The deinterlacing filter, None if the video is not deinterlaced
+#  @param  iVideoCopy    bool    The video is copied (not encoded)
+#  @return               string  The profile ('two-pass q5 chunks4 yadif')
+def Profile( iEngine, iQScale, iChunks=1, iDeinterlace=None, iVideoCopy=False ):
+    if iVideoCopy:
+        return f'{iEngine} copy'
+
+    parts = [ iEngine, f'q{iQScale}' ]
+    if iChunks > 1:
+        parts.append( f'chunks{iChunks}' )
+    if iDeinterlace is not None:
+        parts.append( iDeinterlace.split( '=' )[0] )
+    return ' '.join( parts )
+
+#---
+
+## The history of the runs
+#
+#  Each command (clean, concat, convert) of each run is saved in a sqlite database with its measures
+#  (the duration of its media, wall/cpu time, written size) and what may change them (source drive, profile, ffmpeg build).
+#  The speed of the previous commands gives the estimated duration of the next ones, and the trends show the regressions
+class cHistory:
+
+    ## The constructor
+    #
+    #  @param  iPathFile  pathlib.Path  The database
+    #  @param  iFFmpeg    string        The ffmpeg command pathfile (for its build)
+    #  @param  iScript    string        The name of the script ('split-and-clean', 'vob', ...)
+    #  @param  iRunner    cRunner       The runner of the commands
+    def __init__( self, iPathFile, iFFmpeg=None, iScript='', iRunner=None ):
+        self.mPathFile = iPathFile
+        self.mFFmpeg = FFmpegBuild( iFFmpeg, iRunner ) if iFFmpeg is not None else None
+        self.mScript = iScript
+        self.mRun = None
+
+        self.mLock = threading.Lock()
+
+        self.mConnection = sqlite3.connect( self.mPathFile, check_same_thread=False )
+        self.mConnection.executescript( '''
+            CREATE TABLE IF NOT EXISTS runs( id INTEGER PRIMARY KEY,
+                                             time REAL,
+                                             script TEXT,
+                                             host TEXT,
+                                             ffmpeg TEXT );
+            CREATE TABLE IF NOT EXISTS steps( id INTEGER PRIMARY KEY,
+                                              run INTEGER REFERENCES runs( id ),
+                                              time REAL,
+                                              kind TEXT,
+                                              video TEXT,
+                                              output TEXT,
+                                              drive TEXT,
+                                              profile TEXT,
+                                              qscale INTEGER,
+                                              ffmpeg TEXT,
+                                              parallel INTEGER,
+                                              media_seconds REAL,
+                                              frames REAL,
+                                              wall_seconds REAL,
+                                              cpu_seconds REAL,
+                                              bytes_written INTEGER,
+                                              realtime REAL,
+                                              fps REAL,
+                                              returncode INTEGER );
+            CREATE INDEX IF NOT EXISTS steps_kind ON steps( kind, profile, drive, time );
+        ''' )
+
+    ## Save a command
+    #
+    #  The cancelled commands are not saved
+    #
+    #  @param  iKind          string        The kind of step ('clean', 'concat', 'convert')
+    #  @param  iVideo         string        The name of the video
+    #  @param  iResult        cResult       The result of the command
+    #  @param  iSource        pathlib.Path  The source of the video (for its drive)
+    #  @param  iMediaSeconds  float         The duration (in seconds) of the media produced by the command, None if it's unknown
+    #  @param  iProfile       string        The profile of the command (see Profile())
+    #  @param  iQScale        int           The quality of the video
+    #  @param  iParallel      int           The number of similar commands which run at the same time (chunks)
+    #  @param  iFrameRate     float         The frame rate of the source, None if it's unknown
+    def Record( self, iKind, iVideo, iResult, iSource=None, iMediaSeconds=None, iProfile=None, iQScale=None, iParallel=1, iFrameRate=None ):
+        if iResult.IsCancelled():
+            return
+
+        wall_time = iResult.WallTime()
+        frames = iMediaSeconds * iFrameRate if iMediaSeconds is not None and iFrameRate else None
+        realtime = iMediaSeconds / wall_time if iMediaSeconds is not None and wall_time > 0 else None
+        fps = frames / wall_time if frames is not None and wall_time > 0 else None
+
+        with self.mLock, self.mConnection:
+            # The run is saved with its first command (not when the history is only read)
+            if self.mRun is None:
+                cursor = self.mConnection.execute( 'INSERT INTO runs( time, script, host, ffmpeg ) VALUES ( ?, ?, ?, ? )',
+                                                   ( time.time(), self.mScript, platform.node(), self.mFFmpeg ) )
+                self.mRun = cursor.lastrowid
+
+            self.mConnection.execute( '''INSERT INTO steps( run, time, kind, video, output, drive, profile, qscale, ffmpeg, parallel,
+                                                            media_seconds, frames, wall_seconds, cpu_seconds, bytes_written, realtime, fps, returncode )
+                                         VALUES ( ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ? )''',
+                                      ( self.mRun, time.time(), iKind, iVideo, Path( str( iResult.args[-1] ) ).name,
+                                        Drive( iSource ) if iSource is not None else None, iProfile or iKind, iQScale, self.mFFmpeg, iParallel,
+                                        iMediaSeconds, frames, wall_time, iResult.CpuTime(), iResult.BytesWritten(), realtime, fps, iResult.returncode ) )
+
+    ## Get the speed of the previous commands
+    #
+    #  The commands of the same profile on the same drive are used first, then the same profile, the same drive,
+    #  and finally the same kind of step
+    #
+    #  @param  iKind     string  The kind of step ('clean', 'convert')
+    #  @param  iProfile  string  The profile
+    #  @param  iDrive    string  The drive of the source
+    #  @param  iCount    int     The number of previous commands used (the median of their speed)
+    #  @param  iFallback bool    Use the commands of the other profiles if there is none with the profile
+    #  @return           float   The speed (seconds of media produced in 1 second, with all the parallel commands)
+    #  @return           None    There is no previous command
+    def Speed( self, iKind, iProfile=None, iDrive=None, iCount=20, iFallback=True ):
+        filters = [ ( 'profile = ? AND drive = ?', ( iProfile or iKind, iDrive ) ),
+                    ( 'profile = ?', ( iProfile or iKind, ) ) ]
+        if iFallback:
+            filters += [ ( 'drive = ?', ( iDrive, ) ),
+                         ( '1', () ) ]
+
+        for where, parameters in filters:
+            with self.mLock:
+                rows = self.mConnection.execute( f'''SELECT realtime * parallel FROM steps
+                                                     WHERE kind = ? AND returncode = 0 AND realtime > 0 AND {where}
+                                                     ORDER BY time DESC LIMIT ?''',
+                                                 ( iKind, *parameters, iCount ) ).fetchall()
+            if rows:
+                return statistics.median( row[0] for row in rows )
+
+        return None
+
+    ## Get the trends of the previous runs
+    #
+    #  The commands are grouped by kind of step and by drive (or profile), and the measures of each run are summed,
+    #  the last run is compared to the median of the previous ones
+    #
+    #  @param  iBy         string  The column of the groups ('drive', 'profile')
+    #  @param  iRuns       int     The number of previous runs of the baseline
+    #  @param  iThreshold  float   The slowdown (0.2: 20% slower) of the last run to be a regression
+    #  @return             dict[]  The groups (kind, key, runs, baseline, change, regression)
+    def Trends( self, iBy='drive', iRuns=10, iThreshold=0.2 ):
+        if iBy not in TRENDS:
+            raise ValueError( f'unknown trend: {iBy}' )
+
+        with self.mLock:
+            rows = self.mConnection.execute( f'''SELECT kind, {iBy}, run, MIN( time ), ffmpeg,
+                                                        SUM( media_seconds ), SUM( frames ), SUM( wall_seconds * 1.0 / parallel ),
+                                                        SUM( cpu_seconds ), SUM( bytes_written ), COUNT( * )
+                                                 FROM steps
+                                                 WHERE returncode = 0 AND wall_seconds > 0
+                                                 GROUP BY kind, {iBy}, run, ffmpeg
+                                                 ORDER BY kind, {iBy}, MIN( time )''' ).fetchall()
+
+        groups = {}
+        for kind, key, _, start, ffmpeg, media_seconds, frames, wall_time, cpu_time, bytes_written, count in rows:
+            groups.setdefault( ( kind, key ), [] ).append( { 'time': start,
+                                                             'ffmpeg': ffmpeg,
+                                                             'commands': count,
+                                                             'realtime': media_seconds / wall_time if media_seconds else None,
+                                                             'fps': frames / wall_time if frames else None,
+                                                             'mbps': bytes_written / wall_time / 2**20 if bytes_written else None,
+                                                             'cpu': cpu_time / wall_time if cpu_time is not None else None } )
+
+        trends = []
+        for ( kind, key ), runs in groups.items():
+            # The speed of the copies is their throughput, the one of the encodes is their realtime factor
+            measure = 'mbps' if kind in [ 'clean', 'concat' ] else 'realtime'
+
+            previous = [ run[measure] for run in runs[-iRuns - 1:-1] if run[measure] is not None ]
+            baseline = statistics.median( previous ) if previous else None
+            change = runs[-1][measure] / baseline - 1 if baseline and runs[-1][measure] is not None else None
+
+            trends.append( { 'kind': kind,
+                             'key': key,
+                             'measure': measure,
+                             'runs': runs,
+                             'baseline': baseline,
+                             'change': change,
+                             'regression': change is not None and change < -iThreshold,
+                             'ffmpeg_changed': len( { run['ffmpeg'] for run in runs[-iRuns - 1:] } ) > 1 } )
+        return trends
+
+    ## Close the database
+    def Close( self ):
+        with self.mLock:
+            self.mConnection.close()
@@ -0,0 +1,104 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package manifest
+#  Manage the steps of a job
+
+import hashlib
+import json
+import os
+import threading
+
+## Get a quick hash of a file
+#
+#  Only the beginning and the end of the file are read (files are multi-GB)
+#
+#  @param  iPathFile  pathlib.Path  The file
+#  @param  iSample    int           The number of bytes read at the beginning and at the end
+#  @return            string        The hash
+def QuickHash( iPathFile, iSample=1024 * 1024 ):
+    size = iPathFile.stat().st_size
+
+    sha = hashlib.sha256( str( size ).encode() )
+    with open( iPathFile, 'rb' ) as infile:
+        sha.update( infile.read( iSample ) )
+        if size > iSample:
+            infile.seek( max( size - iSample, iSample ) )
+            sha.update( infile.read( iSample ) )
+
+    return sha.hexdigest()
+
+## Get the temporary pathfile of an output
+#
+#  The output is written with this name, and renamed when it's complete,
+#  so an output with its real name is never a truncated one
+#
+#  @param  iOutput  pathlib.Path  The output
+#  @return          pathlib.Path  The temporary output (with the same extension)
+def PartialOutput( iOutput ):
+    return iOutput.with_name( f'{iOutput.stem}.part{iOutput.suffix}' )
+
+#---
+
+## The manifest of a job
+#
+#  Each completed step is saved with its inputs and its output (size and hash),
+#  to skip it on the next runs if nothing has changed
+class cManifest:
+
+    ## The constructor
+    #
+    #  @param  iPathFile  pathlib.Path  The manifest file (json)
+    def __init__( self, iPathFile ):
+        self.mPathFile = iPathFile
+        self.mSteps = {}
+
+        self.mLock = threading.Lock()
+
+        if self.mPathFile.exists():
+            try:
+                self.mSteps = json.loads( self.mPathFile.read_text() )
+            except ValueError:
+                self.mSteps = {}
+
+    ## Check if a step has already been done
+    #
+    #  @param  iStep    string        The name of the step
+    #  @param  iInputs  dict          The inputs of the step (must be json-compatible)
+    #  @param  iOutput  pathlib.Path  The output of the step
+    #  @return          bool          The step has been done with the same inputs, and its output is still the same
+    def IsDone( self, iStep, iInputs, iOutput ):
+        with self.mLock:
+            step = self.mSteps.get( iStep )
+
+        if step is None or step['inputs'] != json.loads( json.dumps( iInputs ) ) or step['output'] != str( iOutput ):
+            return False
+        if not iOutput.exists() or iOutput.stat().st_size != step['size']:
+            return False
+
+        return QuickHash( iOutput ) == step['hash']
+
+    ## Save a completed step
+    #
+    #  @param  iStep    string        The name of the step
+    #  @param  iInputs  dict          The inputs of the step (must be json-compatible)
+    #  @param  iOutput  pathlib.Path  The output of the step
+    def Done( self, iStep, iInputs, iOutput ):
+        step = { 'inputs': iInputs,
+                 'output': str( iOutput ),
+                 'size': iOutput.stat().st_size,
+                 'hash': QuickHash( iOutput ) }
+
+        with self.mLock:
+            self.mSteps[iStep] = step
+
+            temporary = PartialOutput( self.mPathFile )
+            temporary.write_text( json.dumps( self.mSteps, indent=4 ) )
+            os.replace( temporary, self.mPathFile )
@@ -0,0 +1,138 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package passthrough
+#  Choose to copy or to transcode each stream
+
+import threading
+
+from colorama import Fore
+
+## The modes: always transcode (default, the output of the previous versions), copy the compatible streams (auto), or never transcode (remux)
+MODES = [ 'transcode', 'auto', 'remux' ]
+
+## The video codecs accepted by the players (in an avi), by default
+VIDEO_CODECS = [ 'mpeg4' ]
+
+## The audio codecs accepted by the players (in an avi), by default
+AUDIO_CODECS = [ 'mp3', 'ac3', 'mp2' ]
+
+## Parse a list of codecs
+#
+#  @param  iCodecs   string    The codecs ('mp3,ac3')
+#  @param  iDefault  string[]  The codecs if the string is not set
+#  @return          string[]  The codecs
+def ParseCodecs( iCodecs, iDefault ):
+    if iCodecs is None:
+        return iDefault
+    return [ codec.strip().lower() for codec in iCodecs.split( ',' ) if codec.strip() ]
+
+#---
+
+## The choice of the codecs of the output streams
+#
+#  A stream is copied if it's compatible with the profile (its codec) in all the inputs,
+#  with the same parameters in all of them (a concat can't change them).
+#  The video is transcoded if it's filtered (deinterlaced), even with 'remux' (with a warning).
+#  So a compatible input is converted at the disk speed instead of the encoder speed
+class cCodecs:
+
+    ## The constructor
+    #
+    #  @param  iMode         string    The mode (auto, transcode, remux)
+    #  @param  iVideoCodecs  string[]  The compatible video codecs (ffprobe names)
+    #  @param  iAudioCodecs  string[]  The compatible audio codecs (ffprobe names)
+    def __init__( self, iMode='transcode', iVideoCodecs=VIDEO_CODECS, iAudioCodecs=AUDIO_CODECS ):
+        self.mMode = iMode
+        self.mVideoCodecs = iVideoCodecs
+        self.mAudioCodecs = iAudioCodecs
+
+        self.mWarned = False
+        self.mLock = threading.Lock()
+
+    ## Get the mode
+    #
+    #  @return  string  The mode
+    def Mode( self ):
+        return self.mMode
+
+    ## Check if the video stream can be copied
+    #
+    #  @param  iStreams   dict[]  The video stream of each input (from cProbe.Info, None if it's unknown)
+    #  @param  iFiltered  bool    The video must be filtered (deinterlaced)
+    #  @return            bool    The video stream is copied
+    def IsVideoCopy( self, iStreams, iFiltered=False ):
+        # A filter can't be applied on a copied stream: the deinterlacing is not dropped
+        if self.mMode == 'remux' and iFiltered:
+            with self.mLock:
+                if not self.mWarned:
+                    print( Fore.YELLOW + 'remux: the video must be deinterlaced, it\'s transcoded (use --deinterlace never to copy it)' )
+                    self.mWarned = True
+            return False
+        if self.mMode == 'remux':
+            return True
+        if self.mMode == 'transcode' or iFiltered:
+            return False
+
+        return self._IsCompatible( iStreams, self.mVideoCodecs, [ 'codec', 'width', 'height' ] )
+
+    ## Check if an audio stream can be copied
+    #
+    #  @param  iStreams  dict[]  The audio stream of each input (from cProbe.Info, None if it's unknown)
+    #  @return           bool    The audio stream is copied
+    def IsAudioCopy( self, iStreams ):
+        if self.mMode != 'auto':
+            return self.mMode == 'remux'
+
+        return self._IsCompatible( iStreams, self.mAudioCodecs, [ 'codec', 'channels', 'sample_rate' ] )
+
+    ## Get the parameters of the video stream (for an output)
+    #
+    #  @param  iStreams   dict[]    The video stream of each input
+    #  @param  iQScale    int       The quality (if it's transcoded)
+    #  @param  iFiltered  bool      The video must be filtered (deinterlaced)
+    #  @return            string[]  The parameters
+    def VideoParameters( self, iStreams, iQScale, iFiltered=False ):
+        if not self.IsVideoCopy( iStreams, iFiltered ):
+            return [ '-qscale:v', str( iQScale ), '-vtag', 'XVID' ]
+
+        # The mpeg4 part 2 variants (FMP4, DX50, ...) are played as xvid
+        if all( stream is not None and stream['codec'] == 'mpeg4' for stream in iStreams ):
+            return [ '-c:v', 'copy', '-vtag', 'XVID' ]
+        return [ '-c:v', 'copy' ]
+
+    ## Get the parameters of the audio streams (for an output)
+    #
+    #  @param  iStreams  dict[][]  For each output audio stream, the audio stream of each input
+    #  @return           string[]  The parameters
+    def AudioParameters( self, iStreams ):
+        # The streams are unknown
+        if not iStreams:
+            return [ '-c:a', 'copy' ] if self.mMode == 'remux' else [ '-acodec', 'mp3' ]
+
+        copies = [ self.IsAudioCopy( streams ) for streams in iStreams ]
+        if all( copies ):
+            return [ '-c:a', 'copy' ]
+        if not any( copies ):
+            return [ '-acodec', 'mp3' ]
+
+        parameters = []
+        for i, copy in enumerate( copies ):
+            parameters += [ f'-c:a:{i}', 'copy' if copy else 'mp3' ]
+        return parameters
+
+    #---
+
+    def _IsCompatible( self, iStreams, iCodecs, iKeys ):
+        if not iStreams or any( stream is None for stream in iStreams ):
+            return False
+        if any( stream['codec'] not in iCodecs for stream in iStreams ):
+            return False
+        return len( { tuple( stream.get( key ) for key in iKeys ) for stream in iStreams } ) == 1
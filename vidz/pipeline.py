@@ -0,0 +1,84 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package pipeline
+#  Manage multiple conversions
+
+import queue
+import threading
+
+## The pipeline
+#
+#  Run the clean of the next entries while the current one is converted
+#  The clean is a copy (disk bound) and the convert is an encoding (cpu bound),
+#  so both can run at the same time without slowing each other
+class cPipeline:
+
+    ## The constructor
+    #
+    #  @param  iLookahead  int  The maximum number of entries cleaned in advance of the current convert
+    #  @param  iJobs       int  The number of intervals cleaned at the same time (for each entry)
+    def __init__( self, iLookahead=1, iJobs=1 ):
+        self.mLookahead = max( iLookahead, 1 )
+        self.mJobs = iJobs
+
+    ## Clean and convert all the entries
+    #
+    #  @param  iConverts  cConvert[]  The converters of the entries (in the processing order)
+    #  @return            cConvert[]  The converters which have failed
+    def Run( self, iConverts ):
+        # +1 for the entry being converted: its segments are still on the disk
+        slots = threading.Semaphore( self.mLookahead + 1 )
+        stop = threading.Event()
+        cleaned = queue.Queue()
+        errors = []
+
+        def Clean():
+            try:
+                for convert in iConverts:
+                    slots.acquire()
+                    if stop.is_set():
+                        break
+                    cleaned.put( ( convert, convert.RunClean( self.mJobs ) ) )
+            except Exception as e:
+                errors.append( e )
+            finally:
+                cleaned.put( None )
+
+        for convert in iConverts:
+            convert.Interactive( False )
+
+        thread = threading.Thread( target=Clean, daemon=True )
+        thread.start()
+
+        failures = []
+        try:
+            while True:
+                item = cleaned.get()
+                if item is None:
+                    break
+
+                convert, success = item
+                if not success or not convert.RunConvert():
+                    failures.append( convert )
+
+                slots.release()
+        finally:
+            # Stop the clean of the next entries (if the convert has raised), and unblock it if it waits for a slot
+            stop.set()
+            for _ in range( self.mLookahead + 1 ):
+                slots.release()
+            thread.join()
+
+        # The error of the clean thread is raised in the main thread
+        if errors:
+            raise errors[0]
+
+        return failures
@@ -0,0 +1,123 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package preview
+#  Manage previews
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+
+from colorama import Fore
+
+from .convert import VMapParameters
+from .manifest import PartialOutput
+from .runner import cRunner
+from .scene import TimecodeToSeconds, SecondsToTimecode
+
+## The preview
+#
+#  Create small clips (low resolution, the video streams of the convert, all the audio streams) at multiple offsets of each interval,
+#  to check the sound (language) and the cuts quickly.
+#  The clips stay inside their interval (a clip is shorter if the interval is shorter than a clip).
+#  A clip is named with the key of its parameters, so an existing clip is not created again
+class cPreview:
+
+    ## The constructor
+    #
+    #  @param  iFFmpeg    string    The ffmpeg command pathfile
+    #  @param  iJobs      int       The number of clips created at the same time
+    #  @param  iDuration  float     The duration of a clip (in seconds)
+    #  @param  iRun       function  Execute a command and return its cResult (a new cRunner by default)
+    def __init__( self, iFFmpeg, iJobs=4, iDuration=15, iRun=None ):
+        self.mFFmpeg = iFFmpeg
+        self.mJobs = max( iJobs, 1 )
+        self.mDuration = iDuration
+        self.mRun = iRun if iRun is not None else cRunner().Run
+
+    ## Create the clips of a video
+    #
+    #  @param  iVideo      cVideo        The video
+    #  @param  iScenes     cScene[]      The scenes of the video
+    #  @param  iCount      int           The number of clips for each interval
+    #  @param  iDirectory  pathlib.Path  The directory of the clips
+    #  @return             pathlib.Path[]  The clips (in the order of the intervals)
+    #  @return             None            At least one clip can't be created
+    def Run( self, iVideo, iScenes, iCount, iDirectory ):
+        iDirectory.mkdir( exist_ok=True )
+
+        clips = []
+        number = 0
+        for scene in iScenes:
+            for interval in scene.Intervals():
+                number += 1
+                start = TimecodeToSeconds( interval.SS() )
+                end = start + interval.Duration()
+                duration = min( self.mDuration, interval.Duration() )
+                step = interval.Duration() / ( iCount + 1 )
+                for i in range( iCount ):
+                    offset = start + step * ( i + 1 ) - duration / 2
+                    offset = max( start, min( offset, end - duration ) )
+                    pathfile = self._PathFile( iDirectory, iVideo, number, offset, duration, scene.Source(), interval )
+                    # A short interval may give the same clip multiple times
+                    if any( pathfile == clip[-1] for clip in clips ):
+                        continue
+                    clips.append( ( scene.Source(), VMapParameters( interval ), offset, duration, pathfile ) )
+
+        with ThreadPoolExecutor( max_workers=self.mJobs ) as executor:
+            results = list( executor.map( lambda iClip: self._CreateClip( *iClip ), clips ) )
+
+        if not all( results ):
+            return None
+
+        for _, _, offset, _, pathfile in clips:
+            print( Fore.CYAN + f'preview: {SecondsToTimecode( offset )} -> {pathfile}' )
+
+        return [ pathfile for _, _, _, _, pathfile in clips ]
+
+    #---
+
+    def _PathFile( self, iDirectory, iVideo, iNumber, iOffset, iDuration, iSource, iInterval ):
+        key = json.dumps( [ *iSource.Fingerprint(), round( iOffset, 3 ), round( iDuration, 3 ), iInterval.VMap() ] )
+        return iDirectory / f'{iVideo.Name()}.{iNumber}.{int( iOffset ):05}.{hashlib.sha1( key.encode() ).hexdigest()[:8]}.mkv'
+
+    ## Create a clip
+    #
+    #  @param  iSource          cSource       The source
+    #  @param  iVMapParameters  string[]      The map parameters of the video (the same as the convert)
+    #  @param  iOffset          float         The start of the clip (in seconds)
+    #  @param  iDuration        float         The duration of the clip (in seconds)
+    #  @param  iPathFile        pathlib.Path  The clip
+    #  @return                  bool          The clip exists
+    def _CreateClip( self, iSource, iVMapParameters, iOffset, iDuration, iPathFile ):
+        if iPathFile.exists():
+            return True
+
+        temporary = PartialOutput( iPathFile )
+        command = [ self.mFFmpeg,
+                    '-nostdin', '-y',
+                    '-v', 'error',
+                    '-ss', f'{iOffset:.3f}',
+                    '-i', iSource.PathFile(),
+                    '-t', f'{iDuration:.3f}',
+                    *iVMapParameters,
+                    '-map', '0:a?',
+                    '-vf', 'scale=320:-2',
+                    '-c:v', 'mpeg4', '-qscale:v', '10',
+                    '-c:a', 'mp3', '-b:a', '96k',
+                    temporary ]
+        cp = self.mRun( command )
+        if cp.returncode:
+            temporary.unlink( missing_ok=True )
+            return False
+
+        os.replace( temporary, iPathFile )
+        return True
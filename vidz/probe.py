@@ -0,0 +1,383 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package probe
+#  Get information of media files
+
+import json
+import os
+import re
+import subprocess
+import threading
+
+from .manifest import PartialOutput
+from .runner import cRunner
+
+## The language codes of french audio streams
+FRENCH = [ 'fra', 'fre', 'fr' ]
+
+## The result of the idet filter (on all the analyzed frames)
+IDET = re.compile( r'Multi frame detection: TFF:\s*(\d+)\s+BFF:\s*(\d+)\s+Progressive:\s*(\d+)' )
+
+## The prober
+#
+#  Run ffprobe to get information of an input.
+#  The information of the files (streams, languages, duration, codecs) is saved in an index
+#  with the identity of the file (path, size, modification time), so a file is probed only once
+class cProbe:
+
+    ## The constructor
+    #
+    #  @param  iFFprobe  string        The ffprobe command pathfile
+    #  @param  iIndex    pathlib.Path  The index file (json), None to not save the information
+    #  @param  iFFmpeg   string        The ffmpeg command pathfile (to analyze the frames), None to not analyze them
+    #  @param  iRunner   cRunner       The runner of the commands
+    def __init__( self, iFFprobe, iIndex=None, iFFmpeg=None, iRunner=None ):
+        self.mFFprobe = iFFprobe
+        self.mIndex = iIndex
+        self.mFFmpeg = iFFmpeg
+        self.mRunner = iRunner if iRunner is not None else cRunner()
+        self.mFiles = {}
+
+        self.mLock = threading.Lock()
+
+        if self.mIndex is not None and self.mIndex.exists():
+            try:
+                self.mFiles = json.loads( self.mIndex.read_text() )
+            except ValueError:
+                self.mFiles = {}
+
+    ## Get the information of a file
+    #
+    #  @param  iPathFile  pathlib.Path  The file
+    #  @return            dict          The duration, start_time and streams (index, type, codec, language, ...)
+    #  @return            None          ffprobe has failed
+    def Info( self, iPathFile ):
+        key = self._Key( iPathFile )
+        with self.mLock:
+            if key in self.mFiles:
+                return self.mFiles[key]
+
+        output = self._Run( [ '-show_format', '-show_streams', '-of', 'json', iPathFile ] )
+        if output is None:
+            return None
+
+        data = json.loads( output )
+        info = { 'duration': self._Float( data.get( 'format', {} ).get( 'duration' ) ),
+                 'start_time': self._Float( data.get( 'format', {} ).get( 'start_time' ) ),
+                 'streams': [] }
+        for stream in data.get( 'streams', [] ):
+            info['streams'].append( { 'index': stream.get( 'index' ),
+                                      'type': stream.get( 'codec_type' ),
+                                      'codec': stream.get( 'codec_name' ),
+                                      'tag': stream.get( 'codec_tag_string' ),
+                                      'language': stream.get( 'tags', {} ).get( 'language' ),
+                                      'channels': stream.get( 'channels' ),
+                                      'sample_rate': stream.get( 'sample_rate' ),
+                                      'width': stream.get( 'width' ),
+                                      'height': stream.get( 'height' ),
+                                      'field_order': stream.get( 'field_order' ),
+                                      'frame_rate': stream.get( 'avg_frame_rate' ),
+                                      'bit_rate': stream.get( 'bit_rate' ) } )
+
+        with self.mLock:
+            self.mFiles[key] = info
+            self._Save()
+
+        return info
+
+    ## Get the frame rate of the (first) video stream of a file
+    #
+    #  @param  iPathFile  pathlib.Path  The file
+    #  @return            float         The frame rate (frames by second)
+    #  @return            None          The frame rate is unknown
+    def FrameRate( self, iPathFile ):
+        info = self.Info( iPathFile )
+        if info is None:
+            return None
+
+        for stream in info['streams']:
+            if stream['type'] != 'video':
+                continue
+            # Probed before the frame rate was saved in the index
+            numerator, _, denominator = ( stream.get( 'frame_rate' ) or '' ).partition( '/' )
+            numerator = self._Float( numerator )
+            denominator = self._Float( denominator or '1' )
+            if not numerator or not denominator:
+                return None
+            return numerator / denominator
+        return None
+
+    ## Get the audio streams of a file
+    #
+    #  @param  iPathFile  pathlib.Path  The file
+    #  @return            dict[]        The audio streams (in the order of ffmpeg '0:a:N')
+    def AudioStreams( self, iPathFile ):
+        info = self.Info( iPathFile )
+        if info is None:
+            return []
+        return [ stream for stream in info['streams'] if stream['type'] == 'audio' ]
+
+    ## Get the order of the audio streams with some languages first
+    #
+    #  @param  iPathFile   pathlib.Path  The file
+    #  @param  iLanguages  string[]      The language codes to put first
+    #  @return             string        The order, like the 'amap' attribute ('1,0,2')
+    #  @return             None          There is no audio stream
+    def AudioOrder( self, iPathFile, iLanguages=FRENCH ):
+        streams = self.AudioStreams( iPathFile )
+        if not streams:
+            return None
+
+        indexes = list( range( len( streams ) ) )
+        first = [ i for i in indexes if ( streams[i]['language'] or '' ).lower() in iLanguages ]
+        others = [ i for i in indexes if i not in first ]
+        return ','.join( str( i ) for i in first + others )
+
+    ## Get the duration of an input
+    #
+    #  @param  iPathFile         pathlib.Path  The input
+    #  @param  iInputParameters  string[]      The parameters of the input (-f concat, ...)
+    #  @return                   float         The duration (in seconds)
+    #  @return                   None          The duration is unknown
+    def Duration( self, iPathFile, iInputParameters=[] ):
+        if not iInputParameters:
+            info = self.Info( iPathFile )
+            return info['duration'] if info is not None else None
+
+        return self._GetFormatValue( iPathFile, iInputParameters, 'duration' )
+
+    ## Get the start time of an input
+    #
+    #  ffmpeg seeks relatively to it, but ffprobe uses the real timestamps
+    #
+    #  @param  iPathFile         pathlib.Path  The input
+    #  @param  iInputParameters  string[]      The parameters of the input (-f concat, ...)
+    #  @return                   float         The start time (in seconds)
+    def StartTime( self, iPathFile, iInputParameters=[] ):
+        if not iInputParameters:
+            info = self.Info( iPathFile )
+            start_time = info['start_time'] if info is not None else None
+        else:
+            start_time = self._GetFormatValue( iPathFile, iInputParameters, 'start_time' )
+        return start_time if start_time is not None else 0.0
+
+    ## Check if the video of a file is interlaced
+    #
+    #  Some samples of the file are analyzed by the idet filter (only once, the result is saved in the index)
+    #
+    #  @param  iPathFile  pathlib.Path  The file
+    #  @param  iSamples   int           The number of samples (spread over the file)
+    #  @param  iFrames    int           The number of frames of each sample
+    #  @return            bool          Most of the frames are interlaced
+    #  @return            None          The interlacing is unknown
+    def Interlaced( self, iPathFile, iSamples=5, iFrames=100 ):
+        info = self.Info( iPathFile )
+        if info is None:
+            return None
+        if 'interlaced' in info:
+            return info['interlaced']
+        if self.mFFmpeg is None:
+            return None
+
+        duration = info['duration'] or 0.0
+        tff, bff, progressive = 0, 0, 0
+        for i in range( iSamples ):
+            cp = self.mRunner.Run( [ self.mFFmpeg, '-nostdin', '-hide_banner',
+                                     '-ss', f'{duration * ( i + 1 ) / ( iSamples + 1 ):.3f}',
+                                     '-i', iPathFile,
+                                     '-map', '0:v:0',
+                                     '-frames:v', str( iFrames ),
+                                     '-vf', 'idet',
+                                     '-an', '-f', 'null', '-' ], iCapture=True, stdin=subprocess.DEVNULL )
+            matches = IDET.findall( cp.stderr ) if not cp.returncode else []
+            if matches:
+                tff += int( matches[-1][0] )
+                bff += int( matches[-1][1] )
+                progressive += int( matches[-1][2] )
+
+        if not tff + bff + progressive:
+            return None
+        interlaced = tff + bff > progressive
+
+        with self.mLock:
+            info['interlaced'] = interlaced
+            info['idet'] = { 'tff': tff, 'bff': bff, 'progressive': progressive }
+            self._Save()
+
+        return interlaced
+
+    ## Get the last video keyframe at (or before) a time
+    #
+    #  Only a small window is read before the time (bigger and bigger until a keyframe is found),
+    #  so the cost depends on the window and not on the size of the file.
+    #  The keyframe is saved in the index, the same cut is never probed again
+    #
+    #  @param  iPathFile  pathlib.Path  The file
+    #  @param  iTime      float         The time (in seconds, relative to the start of the file)
+    #  @param  iWindow    float         The duration (in seconds) read before the time (the first time)
+    #  @param  iTries     int           The number of windows (each one 4 times bigger than the previous one)
+    #  @return            float         The time of the keyframe
+    #  @return            None          There is no keyframe before (or ffprobe has failed)
+    def PreviousKeyframe( self, iPathFile, iTime, iWindow=20, iTries=3 ):
+        cache_key = f'previous:{iTime:.3f}'
+        found, keyframe = self._CachedKeyframe( iPathFile, cache_key )
+        if found:
+            return keyframe
+
+        start_time = self.StartTime( iPathFile )
+        window = iWindow
+        keyframe = None
+        for _ in range( iTries ):
+            begin = max( iTime - window, 0.0 )
+            keyframes = self._WindowKeyframes( iPathFile, [], start_time, begin, iTime - begin + 0.001 )
+            if keyframes is None:
+                return None
+
+            previous = [ time for time in keyframes if time <= iTime + 0.0005 ]
+            if previous:
+                keyframe = round( max( previous ), 3 )
+                break
+            if begin <= 0:
+                break
+            window *= 4
+
+        self._CacheKeyframe( iPathFile, cache_key, keyframe )
+        return keyframe
+
+    ## Get the first video keyframe at (or after) a time
+    #
+    #  Only a small window is read after the time
+    #
+    #  @param  iPathFile         pathlib.Path  The input
+    #  @param  iTime             float         The time (in seconds, relative to the start of the input)
+    #  @param  iInputParameters  string[]      The parameters of the input (-f concat, ...)
+    #  @param  iWindow           float         The duration (in seconds) read to find the keyframe
+    #  @return                   float         The time of the keyframe (relative to the start of the input)
+    #  @return                   None          There is no keyframe in the window
+    def NextKeyframe( self, iPathFile, iTime, iInputParameters=[], iWindow=20 ):
+        # The inputs with parameters (a concat list) are not files of the index
+        cache_key = f'next:{iTime:.3f}:{iWindow}'
+        if not iInputParameters:
+            found, keyframe = self._CachedKeyframe( iPathFile, cache_key )
+            if found:
+                return keyframe
+
+        start_time = self.StartTime( iPathFile, iInputParameters )
+        keyframes = self._WindowKeyframes( iPathFile, iInputParameters, start_time, iTime, iWindow )
+        if keyframes is None:
+            return None
+
+        keyframe = next( ( round( time, 3 ) for time in sorted( keyframes ) if time >= iTime ), None )
+        if not iInputParameters:
+            self._CacheKeyframe( iPathFile, cache_key, keyframe )
+        return keyframe
+
+    ## Get the video keyframes of a window of a file
+    #
+    #  ffprobe seeks to the start of the window, so the keyframes found may start a bit before it
+    #
+    #  @param  iPathFile         pathlib.Path  The input
+    #  @param  iInputParameters  string[]      The parameters of the input (-f concat, ...)
+    #  @param  iStartTime        float         The start time of the input (in seconds)
+    #  @param  iBegin            float         The start of the window (in seconds, relative to the start of the input)
+    #  @param  iDuration         float         The duration of the window (in seconds)
+    #  @return                   float[]       The times of the keyframes (in seconds, relative to the start of the input)
+    #  @return                   None          ffprobe has failed
+    def _WindowKeyframes( self, iPathFile, iInputParameters, iStartTime, iBegin, iDuration ):
+        output = self._Run( [ *iInputParameters,
+                              '-select_streams', 'v:0',
+                              '-read_intervals', f'{iStartTime + iBegin:.3f}%+{iDuration:.3f}',
+                              '-show_entries', 'packet=pts_time,flags',
+                              '-of', 'csv=p=0',
+                              iPathFile ] )
+        if output is None:
+            return None
+
+        keyframes = []
+        for line in output.splitlines():
+            pts_time, _, flags = line.partition( ',' )
+            if 'K' in flags and pts_time not in ( '', 'N/A' ):
+                keyframes.append( float( pts_time ) - iStartTime )
+        return keyframes
+
+    ## Get a keyframe already found
+    #
+    #  @param  iPathFile  pathlib.Path  The file
+    #  @param  iKey       string        The search ('previous:<time>', 'next:<time>:<window>')
+    #  @return            tuple         The search has already been done (bool) and the keyframe (float, None if there was none)
+    def _CachedKeyframe( self, iPathFile, iKey ):
+        info = self.Info( iPathFile )
+        if info is None:
+            return False, None
+
+        with self.mLock:
+            keyframes = info.get( 'keyframes', {} )
+            return iKey in keyframes, keyframes.get( iKey )
+
+    ## Save a keyframe found (in the index)
+    #
+    #  @param  iPathFile  pathlib.Path  The file
+    #  @param  iKey       string        The search ('previous:<time>', 'next:<time>:<window>')
+    #  @param  iKeyframe  float         The keyframe (None if there was none)
+    def _CacheKeyframe( self, iPathFile, iKey, iKeyframe ):
+        info = self.Info( iPathFile )
+        if info is None:
+            return
+
+        with self.mLock:
+            info.setdefault( 'keyframes', {} )[iKey] = iKeyframe
+            self._Save()
+
+    #---
+
+    ## Get the identity of a file
+    #
+    #  @param  iPathFile  pathlib.Path  The file
+    #  @return            string        The key of the file in the index
+    def _Key( self, iPathFile ):
+        stat = iPathFile.stat()
+        return f'{iPathFile.resolve()}|{stat.st_size}|{stat.st_mtime_ns}'
+
+    ## Save the index
+    def _Save( self ):
+        if self.mIndex is None:
+            return
+
+        temporary = PartialOutput( self.mIndex )
+        temporary.write_text( json.dumps( self.mFiles, indent=4 ) )
+        os.replace( temporary, self.mIndex )
+
+    def _GetFormatValue( self, iPathFile, iInputParameters, iKey ):
+        output = self._Run( [ *iInputParameters,
+                              '-show_entries', f'format={iKey}',
+                              '-of', 'csv=p=0',
+                              iPathFile ] )
+        if output is None:
+            return None
+
+        return self._Float( output.strip() )
+
+    def _Float( self, iValue ):
+        try:
+            return float( iValue )
+        except ( TypeError, ValueError ):
+            return None
+
+    ## Execute ffprobe
+    #
+    #  @param  iParameters  string[]  The parameters of ffprobe
+    #  @return              string    The output of ffprobe
+    #  @return              None      ffprobe has failed
+    def _Run( self, iParameters ):
+        cp = self.mRunner.Run( [ self.mFFprobe, '-v', 'error', *iParameters ], iCapture=True, stdin=subprocess.DEVNULL )
+        if cp.returncode:
+            return None
+        return cp.stdout
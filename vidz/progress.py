@@ -0,0 +1,246 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package progress
+#  Manage progress of the commands
+
+import json
+import os
+import threading
+import time
+
+from colorama import Fore
+
+from .manifest import PartialOutput
+from .scene import SecondsToTimecode
+
+## Format a duration for the eta
+#
+#  @param  iSeconds  float   The duration (in seconds)
+#  @return           string  The duration ('1h02m', '3m20s', '?')
+def FormatEta( iSeconds ):
+    if iSeconds is None:
+        return '?'
+
+    seconds = int( iSeconds )
+    if seconds >= 3600:
+        return f'{seconds // 3600}h{seconds % 3600 // 60:02}m'
+    return f'{seconds // 60}m{seconds % 60:02}s'
+
+#---
+
+## A step (1 command) of the batch
+class cStep:
+
+    ## The constructor
+    #
+    #  @param  iProgress  cProgress  The progress of the batch
+    #  @param  iKind      string     The kind of the step ('clean', 'convert', ...)
+    #  @param  iName      string     The name of the step (the output file)
+    #  @param  iDuration  float      The duration (in seconds) of the media produced by the step
+    def __init__( self, iProgress, iKind, iName, iDuration ):
+        self.mProgress = iProgress
+        self.mKind = iKind
+        self.mName = iName
+        self.mDuration = iDuration
+
+        self.mStart = time.monotonic()
+        self.mTime = 0.0
+        self.mSpeed = None
+        self.mFps = None
+
+    ## Parse a block of the '-progress' output of ffmpeg
+    #
+    #  @param  iValues  dict  The values of the block (out_time_us, fps, speed, progress, ...)
+    def Update( self, iValues ):
+        out_time = iValues.get( 'out_time_us', iValues.get( 'out_time_ms' ) ) # out_time_ms is in us too
+        if out_time not in ( None, '', 'N/A' ):
+            self.mTime = max( 0.0, int( out_time ) / 10**6 )
+        try:
+            self.mFps = float( iValues.get( 'fps' ) )
+        except ( TypeError, ValueError ):
+            pass
+        try:
+            self.mSpeed = float( iValues.get( 'speed', '' ).rstrip( 'x' ) )
+        except ( TypeError, ValueError ):
+            pass
+
+        self.mProgress._Update( self )
+
+    ## Finish the step
+    #
+    #  @param  iSuccess  bool  The command of the step has succeeded (only a succeeded step is credited to the batch)
+    def Finish( self, iSuccess=True ):
+        if iSuccess and self.mDuration is not None:
+            self.mTime = self.mDuration
+        self.mProgress._Finish( self, iSuccess )
+
+    ## Get the done part of the step
+    #
+    #  @return  float  The done media (in seconds)
+    def Done( self ):
+        if self.mDuration is None:
+            return self.mTime
+        return min( self.mTime, self.mDuration )
+
+    ## Get the eta of the step
+    #
+    #  @return  float  The remaining time (in seconds)
+    #  @return  None   It's unknown
+    def Eta( self ):
+        if self.mDuration is None or not self.mSpeed:
+            return None
+        return max( 0.0, self.mDuration - self.mTime ) / self.mSpeed
+
+    ## Get the status of the step (for the status file)
+    #
+    #  @return  dict  The status
+    def Status( self ):
+        return { 'kind': self.mKind,
+                 'name': self.mName,
+                 'time': round( self.mTime, 3 ),
+                 'duration': self.mDuration,
+                 'percent': round( 100 * self.Done() / self.mDuration, 1 ) if self.mDuration else None,
+                 'fps': self.mFps,
+                 'speed': self.mSpeed,
+                 'eta': self.Eta() }
+
+#---
+
+## The progress of a batch
+#
+#  The work of the batch is the duration of the media produced by each kind of step.
+#  The speed of each kind (media seconds / wall seconds) is measured on the finished steps,
+#  and used to get the eta of the remaining work
+class cProgress:
+
+    ## The constructor
+    #
+    #  @param  iStatus    pathlib.Path  The status file (json), None to not write it
+    #  @param  iInterval  float         The minimum time (in seconds) between 2 reports
+    def __init__( self, iStatus=None, iInterval=5 ):
+        self.mStatus = iStatus
+        self.mInterval = iInterval
+
+        self.mWork = {}         # kind -> media seconds of the batch
+        self.mDone = {}         # kind -> media seconds of the finished steps
+        self.mWallTime = {}     # kind -> wall seconds of the finished steps
+        self.mSteps = []
+
+        self.mStart = time.monotonic()
+        self.mLastReport = 0.0
+        self.mLock = threading.Lock()
+
+    ## Add work to the batch
+    #
+    #  @param  iKind     string  The kind of the steps ('clean', 'convert', ...)
+    #  @param  iSeconds  float   The duration (in seconds) of the media which will be produced
+    def AddWork( self, iKind, iSeconds ):
+        with self.mLock:
+            self.mWork[iKind] = self.mWork.get( iKind, 0.0 ) + iSeconds
+
+    ## Start a step
+    #
+    #  @param  iKind      string  The kind of the step
+    #  @param  iName      string  The name of the step
+    #  @param  iDuration  float   The duration (in seconds) of the media produced by the step (None if unknown)
+    #  @return            cStep   The step
+    def Start( self, iKind, iName, iDuration ):
+        step = cStep( self, iKind, iName, iDuration )
+        with self.mLock:
+            self.mSteps.append( step )
+        return step
+
+    ## Get the eta of the batch
+    #
+    #  @return  float  The remaining time (in seconds)
+    #  @return  None   It's unknown (no speed yet)
+    def Eta( self ):
+        with self.mLock:
+            return self._Eta()
+
+    #---
+
+    def _Eta( self ):
+        eta = 0.0
+        for kind, work in self.mWork.items():
+            done = self.mDone.get( kind, 0.0 ) + sum( step.Done() for step in self.mSteps if step.mKind == kind )
+            remaining = max( 0.0, work - done )
+            if not remaining:
+                continue
+
+            speed = None
+            if self.mWallTime.get( kind ):
+                speed = self.mDone[kind] / self.mWallTime[kind]
+            else:
+                speeds = [ step.mSpeed for step in self.mSteps if step.mKind == kind and step.mSpeed ]
+                speed = sum( speeds ) / len( speeds ) if speeds else None
+            if not speed:
+                return None
+
+            eta += remaining / speed
+        return eta
+
+    def _Percent( self ):
+        work = sum( self.mWork.values() )
+        if not work:
+            return None
+        done = sum( self.mDone.values() ) + sum( step.Done() for step in self.mSteps )
+        return min( 100.0, 100 * done / work )
+
+    def _Update( self, iStep ):
+        with self.mLock:
+            now = time.monotonic()
+            if now - self.mLastReport < self.mInterval:
+                return
+            self.mLastReport = now
+
+            self._Report()
+
+    def _Finish( self, iStep, iSuccess ):
+        with self.mLock:
+            if iStep in self.mSteps:
+                self.mSteps.remove( iStep )
+
+            # The work of a failed step will not be done (in this batch)
+            if not iSuccess:
+                if iStep.mDuration is not None:
+                    self.mWork[iStep.mKind] = max( 0.0, self.mWork.get( iStep.mKind, 0.0 ) - iStep.mDuration )
+                self._Report()
+                return
+
+            self.mDone[iStep.mKind] = self.mDone.get( iStep.mKind, 0.0 ) + iStep.Done()
+            self.mWallTime[iStep.mKind] = self.mWallTime.get( iStep.mKind, 0.0 ) + time.monotonic() - iStep.mStart
+
+            self._Report()
+
+    ## Print the progress and write the status file
+    def _Report( self ):
+        percent = self._Percent()
+        eta = self._Eta()
+
+        for step in self.mSteps:
+            step_percent = f'{100 * step.Done() / step.mDuration:5.1f}%' if step.mDuration else '  ?  '
+            fps = f'{step.mFps:.0f}' if step.mFps is not None else '?'
+            speed = f'{step.mSpeed:.2f}x' if step.mSpeed is not None else '?'
+            print( Fore.GREEN + f'[{step.mKind}] {step.mName}: {step_percent} {SecondsToTimecode( step.mTime )} fps={fps} speed={speed} eta={FormatEta( step.Eta() )}' )
+        if percent is not None:
+            print( Fore.GREEN + f'[batch] {percent:5.1f}% eta={FormatEta( eta )}' )
+
+        if self.mStatus is None:
+            return
+
+        status = { 'time': time.time(),
+                   'elapsed': time.monotonic() - self.mStart,
+                   'batch': { 'percent': percent, 'eta': eta, 'work': self.mWork, 'done': self.mDone },
+                   'steps': [ step.Status() for step in self.mSteps ] }
+        temporary = PartialOutput( self.mStatus )
+        temporary.write_text( json.dumps( status, indent=4 ) )
+        os.replace( temporary, self.mStatus )
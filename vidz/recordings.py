@@ -0,0 +1,147 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package recordings
+#  Manage the recordings of the dvr drives
+
+import json
+import os
+from pathlib import Path
+import re
+import threading
+
+from colorama import Fore
+
+from .manifest import PartialOutput
+
+## The default drives of the dvr
+DRIVES = [ 'F:', 'G:', 'H:' ]
+
+## The folder of a recording ('000000c6REC')
+RECORDING = re.compile( r'^000000(\w+)REC$' )
+
+## The recordings of the dvr drives
+#
+#  The 'LGDVR' folder of each drive is read once, and each recording folder is scanned
+#  only if its modification time has changed since the previous scan (saved in the index).
+#  Then finding the files of a recording is a lookup.
+#  The duration of a recording is probed only when it's looked up (and saved in the index)
+class cRecordings:
+
+    ## The constructor
+    #
+    #  @param  iDrives  string[]      The roots of the drives ('F:', '/mnt/f', ...)
+    #  @param  iIndex   pathlib.Path  The index file (json), None to scan all the drives on each run
+    #  @param  iProbe   cProbe        The prober to get the duration of the recordings (None to not get it)
+    def __init__( self, iDrives=DRIVES, iIndex=None, iProbe=None ):
+        self.mDrives = iDrives
+        self.mIndex = iIndex
+        self.mProbe = iProbe
+
+        self.mFolders = {}          # folder -> { mtime_ns, id, files, size, duration }
+        self.mRecordings = None     # id -> folder
+
+        self.mLock = threading.Lock()
+
+        if self.mIndex is not None and self.mIndex.exists():
+            try:
+                self.mFolders = json.loads( self.mIndex.read_text() )
+            except ValueError:
+                self.mFolders = {}
+
+    ## Get a recording
+    #
+    #  The drives are scanned on the first call, and the duration of the recording is probed on its first lookup
+    #
+    #  @param  iId  string  The id of the recording
+    #  @return      dict    The files (sorted), the size and the duration (None if unknown)
+    #  @return      None    There is no recording with this id
+    def Recording( self, iId ):
+        with self.mLock:
+            if self.mRecordings is None:
+                self.Scan()
+
+            folder = self.mRecordings.get( iId )
+            if folder is None:
+                return None
+
+            recording = self.mFolders[folder]
+            if 'duration' not in recording:
+                recording['duration'] = None
+                if self.mProbe is not None and recording['files']:
+                    recording['duration'] = self.mProbe.Duration( Path( recording['files'][0] ) )
+                self._Save()
+
+            return recording
+
+    ## Scan the drives
+    def Scan( self ):
+        folders = {}
+        recordings = {}
+        scanned = 0
+        for drive in self.mDrives:
+            root = Path( drive ) / 'LGDVR'
+            try:
+                entries = list( os.scandir( root ) )
+            except OSError:
+                # Not connected
+                continue
+
+            for entry in entries:
+                match = RECORDING.match( entry.name )
+                if match is None or not entry.is_dir():
+                    continue
+
+                mtime_ns = entry.stat().st_mtime_ns
+                folder = self.mFolders.get( entry.path )
+                if folder is None or folder['mtime_ns'] != mtime_ns:
+                    folder = self._ScanFolder( Path( entry.path ), match.group( 1 ), mtime_ns )
+                    scanned += 1
+                folders[entry.path] = folder
+
+                # The first drive wins (like the previous lookup F: / G: / H:)
+                if folder['files']:
+                    recordings.setdefault( folder['id'], entry.path )
+
+        if scanned:
+            print( Fore.CYAN + f'recordings: {scanned} folder(s) scanned, {len( folders ) - scanned} from the index' )
+
+        self.mFolders = folders
+        self.mRecordings = recordings
+        self._Save()
+
+    #---
+
+    ## Scan the folder of a recording
+    #
+    #  @param  iPath     pathlib.Path  The folder
+    #  @param  iId       string        The id of the recording
+    #  @param  iMTimeNS  int           The modification time of the folder
+    #  @return           dict          The recording
+    def _ScanFolder( self, iPath, iId, iMTimeNS ):
+        files = []
+        size = 0
+        with os.scandir( iPath ) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.upper().endswith( '.TS' ):
+                    files.append( entry.path )
+                    size += entry.stat().st_size
+        files.sort()
+
+        # The duration is probed on the lookup (only the recordings of the run)
+        return { 'mtime_ns': iMTimeNS, 'id': iId, 'files': files, 'size': size }
+
+    def _Save( self ):
+        if self.mIndex is None:
+            return
+
+        temporary = PartialOutput( self.mIndex )
+        temporary.write_text( json.dumps( self.mFolders, indent=4 ) )
+        os.replace( temporary, self.mIndex )
@@ -0,0 +1,341 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package runner
+#  Run the external commands
+
+import itertools
+import os
+from pathlib import Path
+import re
+import signal
+import subprocess
+import threading
+import time
+
+from colorama import Back
+
+from .size import FormatSize
+
+## Get the files written by a command
+#
+#  The files are the arguments (but the inputs) which are existing files modified since the start of the command
+#  (the option values are not files)
+#
+#  @param  iCommand  string[]        The command
+#  @param  iStart    float           The start of the command (time.time())
+#  @return           pathlib.Path[]  The files
+def WrittenFiles( iCommand, iStart ):
+    arguments = [ str( argument ) for argument in iCommand ]
+
+    pathfiles = []
+    for option, argument in zip( arguments, arguments[1:] ):
+        if option == '-i' or argument.startswith( '-' ) or argument.startswith( 'pipe:' ):
+            continue
+        try:
+            stat = os.stat( argument )
+        except ( OSError, ValueError ):
+            continue
+        if os.path.isfile( argument ) and stat.st_mtime >= iStart - 1:
+            pathfiles.append( Path( argument ) )
+    return list( dict.fromkeys( pathfiles ) )
+
+#---
+
+## The result of a command
+#
+#  It's a subprocess.CompletedProcess (args, returncode), with the measures of the command
+class cResult( subprocess.CompletedProcess ):
+
+    ## The constructor
+    #
+    #  @param  iArgs          string[]      The command
+    #  @param  iReturnCode    int           The exit code
+    #  @param  iWallTime      float         The duration (in seconds)
+    #  @param  iCpuTime       float         The cpu time (user + system, in seconds), None if it's unknown
+    #  @param  iBytesWritten  int           The size of the written files (in bytes)
+    #  @param  iLog           pathlib.Path  The log file (stderr), None if stderr was not captured
+    #  @param  iCancelled     bool          The command has been cancelled
+    #  @param  iStdout        string        The captured stdout, None if it was not captured
+    #  @param  iStderr        string        The captured stderr, None if it was not captured
+    def __init__( self, iArgs, iReturnCode, iWallTime, iCpuTime, iBytesWritten, iLog, iCancelled, iStdout=None, iStderr=None ):
+        super().__init__( iArgs, iReturnCode, iStdout, iStderr )
+        self.mWallTime = iWallTime
+        self.mCpuTime = iCpuTime
+        self.mBytesWritten = iBytesWritten
+        self.mLog = iLog
+        self.mCancelled = iCancelled
+
+    def __repr__( self ):
+        cpu_time = f'{self.mCpuTime:.1f}s' if self.mCpuTime is not None else '?'
+        strings = [ f'returncode: {self.returncode}',
+                    f'wall: {self.mWallTime:.1f}s',
+                    f'cpu: {cpu_time}',
+                    f'written: {FormatSize( self.mBytesWritten )}' ]
+        if self.mCancelled:
+            strings.append( 'cancelled' )
+        if self.mLog is not None:
+            strings.append( f'log: {self.mLog}' )
+        return f'[{", ".join( strings )}]'
+
+    ## Get the duration
+    #
+    #  @return  float  The duration (in seconds)
+    def WallTime( self ):
+        return self.mWallTime
+
+    ## Get the cpu time
+    #
+    #  @return  float  The cpu time (user + system, in seconds)
+    #  @return  None   It's unknown (not available on this system)
+    def CpuTime( self ):
+        return self.mCpuTime
+
+    ## Get the size of the written files
+    #
+    #  @return  int  The size (in bytes)
+    def BytesWritten( self ):
+        return self.mBytesWritten
+
+    ## Get the log file
+    #
+    #  @return  pathlib.Path  The log file (stderr of the command)
+    #  @return  None          stderr was not captured
+    def Log( self ):
+        return self.mLog
+
+    ## Check if the command has been cancelled
+    #
+    #  @return  bool  The command has been cancelled (or has reached its timeout)
+    def IsCancelled( self ):
+        return self.mCancelled
+
+#---
+
+## A running command
+class cJob:
+
+    ## The constructor
+    #
+    #  @param  iRunner   cRunner           The runner
+    #  @param  iProcess  subprocess.Popen  The process
+    #  @param  iLog      pathlib.Path      The log file, None if stderr is not captured
+    #  @param  iLogFile  file              The opened log file
+    #  @param  iCapture  bool              stdout and stderr are captured (in the result)
+    def __init__( self, iRunner, iProcess, iLog, iLogFile, iCapture=False ):
+        self.mRunner = iRunner
+        self.mProcess = iProcess
+        self.mLog = iLog
+        self.mLogFile = iLogFile
+        self.mCapture = iCapture
+
+        self.mStart = time.time()
+        self.mStartMonotonic = time.monotonic()
+        self.mCancelled = False
+        self.mTimer = None
+        self.mResult = None
+
+        self.mLock = threading.Lock()
+
+    ## Get the process
+    #
+    #  @return  subprocess.Popen  The process (to write to its stdin, read its stdout, ...)
+    def Process( self ):
+        return self.mProcess
+
+    ## Stop the command
+    #
+    #  @param  iGrace  float  The time (in seconds) to stop by itself, before being killed
+    def Cancel( self, iGrace=5 ):
+        if self.mProcess.poll() is not None:
+            return
+
+        self.mCancelled = True
+        self.mProcess.terminate()
+
+        # The process is waited by Wait() only
+        killer = threading.Timer( iGrace, lambda: self.mProcess.poll() is None and self.mProcess.kill() )
+        killer.daemon = True
+        killer.start()
+
+    ## Wait the end of the command
+    #
+    #  @return  cResult  The result
+    def Wait( self ):
+        with self.mLock:
+            if self.mResult is not None:
+                return self.mResult
+
+            stdout, stderr = self._Communicate()
+            cpu_time = self._Reap()
+            wall_time = time.monotonic() - self.mStartMonotonic
+
+            if self.mTimer is not None:
+                self.mTimer.cancel()
+            if self.mLogFile is not None:
+                self.mLogFile.close()
+
+            bytes_written = 0
+            for pathfile in WrittenFiles( self.mProcess.args, self.mStart ):
+                try:
+                    bytes_written += pathfile.stat().st_size
+                except OSError:
+                    continue
+
+            self.mResult = cResult( self.mProcess.args, self.mProcess.returncode, wall_time, cpu_time, bytes_written, self.mLog, self.mCancelled, stdout, stderr )
+
+        self.mRunner._Finish( self )
+        return self.mResult
+
+    #---
+
+    ## Read the captured outputs until the end of the process (without waiting it, to keep its resources usage)
+    #
+    #  @return  tuple  The stdout and the stderr (None if they are not captured)
+    def _Communicate( self ):
+        if not self.mCapture:
+            return None, None
+
+        # Both pipes are read at the same time: a full pipe would block the process
+        stderr = []
+        reader = threading.Thread( target=lambda: stderr.append( self.mProcess.stderr.read() ), daemon=True )
+        reader.start()
+        stdout = self.mProcess.stdout.read()
+        reader.join()
+
+        self.mProcess.stdout.close()
+        self.mProcess.stderr.close()
+        return stdout, stderr[0] if stderr else None
+
+    ## Wait the process, with its resources usage (when the system gives them)
+    #
+    #  @return  float  The cpu time (in seconds)
+    #  @return  None   It's unknown
+    def _Reap( self ):
+        if hasattr( os, 'wait4' ):
+            try:
+                _, status, usage = os.wait4( self.mProcess.pid, 0 )
+                self.mProcess.returncode = os.waitstatus_to_exitcode( status )
+                return usage.ru_utime + usage.ru_stime
+            except ChildProcessError:
+                # Already waited (by poll/cancel)
+                pass
+
+        self.mProcess.wait()
+        return None
+
+#---
+
+## The runner of the external commands (ffmpeg, ffprobe, ...)
+#
+#  The commands run in their own processes, so many of them can run at the same time (from multiple threads).
+#  The stderr of each command is written in its own log file (not interleaved on the terminal),
+#  all the running commands can be cancelled (on ctrl+c), and each result has the measures of its command
+class cRunner:
+
+    ## The constructor
+    #
+    #  @param  iLogs         pathlib.Path  The directory of the log files, None to keep stderr on the terminal
+    #  @param  iKeepResults  bool          Keep the results of the finished commands (see Results()), they are not kept for a whole batch by default
+    def __init__( self, iLogs=None, iKeepResults=False ):
+        self.mLogs = iLogs
+        self.mJobs = []
+        self.mResults = [] if iKeepResults else None
+        self.mCounter = itertools.count( 1 )
+
+        self.mLock = threading.Lock()
+
+        if self.mLogs is not None:
+            self.mLogs.mkdir( parents=True, exist_ok=True )
+
+    ## Start a command
+    #
+    #  @param  iCommand  string[]  The command
+    #  @param  iTimeout  float     The maximum duration (in seconds) of the command before being cancelled, None for no limit
+    #  @param  iCapture  bool      Capture stdout and stderr (as text, in the result) instead of the log file
+    #  @param  iOptions  dict      The options of subprocess.Popen (stdin, stdout, ...)
+    #  @return           cJob      The running command
+    def Start( self, iCommand, iTimeout=None, iCapture=False, **iOptions ):
+        if iCapture:
+            iOptions.update( stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True )
+
+        log = None
+        log_file = None
+        if self.mLogs is not None and 'stderr' not in iOptions:
+            name = re.sub( r'[^\w.-]+', '_', Path( str( iCommand[-1] ) ).name )[:80]
+            log = self.mLogs / f'{time.strftime( "%Y%m%d-%H%M%S" )}-{next( self.mCounter ):04}-{name}.log'
+            log_file = open( log, 'w' )
+            log_file.write( ' '.join( map( str, iCommand ) ) + '\n\n' )
+            log_file.flush()
+            iOptions['stderr'] = log_file
+
+        try:
+            process = subprocess.Popen( iCommand, **iOptions )
+        except OSError:
+            if log_file is not None:
+                log_file.close()
+            raise
+
+        job = cJob( self, process, log, log_file, iCapture )
+        if iTimeout is not None:
+            job.mTimer = threading.Timer( iTimeout, job.Cancel )
+            job.mTimer.daemon = True
+            job.mTimer.start()
+
+        with self.mLock:
+            self.mJobs.append( job )
+        return job
+
+    ## Run a command
+    #
+    #  @param  iCommand  string[]  The command
+    #  @param  iTimeout  float     The maximum duration (in seconds) of the command before being cancelled, None for no limit
+    #  @param  iCapture  bool      Capture stdout and stderr (as text, in the result) instead of the log file
+    #  @param  iOptions  dict      The options of subprocess.Popen (stdin, stdout, ...)
+    #  @return           cResult   The result
+    def Run( self, iCommand, iTimeout=None, iCapture=False, **iOptions ):
+        return self.Start( iCommand, iTimeout, iCapture, **iOptions ).Wait()
+
+    ## Get the results of the finished commands
+    #
+    #  @return  cResult[]  The results (in the order of their end), empty if they are not kept
+    def Results( self ):
+        with self.mLock:
+            return list( self.mResults or [] )
+
+    ## Cancel all the running commands
+    #
+    #  @return  int  The number of cancelled commands
+    def CancelAll( self ):
+        with self.mLock:
+            jobs = list( self.mJobs )
+        for job in jobs:
+            job.Cancel()
+        return len( jobs )
+
+    ## Cancel all the running commands on ctrl+c, then stop the script (KeyboardInterrupt)
+    #
+    #  Must be called from the main thread
+    def CancelOnInterrupt( self ):
+        def Interrupt( iSignal, iFrame ):
+            count = self.CancelAll()
+            print( Back.RED + f'interrupted: {count} running command(s) cancelled' )
+            signal.default_int_handler( iSignal, iFrame )
+
+        signal.signal( signal.SIGINT, Interrupt )
+
+    #---
+
+    def _Finish( self, iJob ):
+        with self.mLock:
+            if iJob in self.mJobs:
+                self.mJobs.remove( iJob )
+                if self.mResults is not None:
+                    self.mResults.append( iJob.mResult )
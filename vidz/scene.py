@@ -11,6 +11,27 @@
 ## @package scene
 #  Manage scene
 
+## Convert a timecode to seconds
+#
+#  @param  iTimecode  string  The timecode ('01:02:03.456', '02:03.456' or '3.456')
+#  @return            float   The number of seconds
+def TimecodeToSeconds( iTimecode ):
+    seconds = 0.0
+    for part in str( iTimecode ).split( ':' ):
+        seconds = seconds * 60 + float( part )
+    return seconds
+
+## Convert seconds to a timecode
+#
+#  @param  iSeconds  float   The number of seconds
+#  @return           string  The timecode ('01:02:03.456')
+def SecondsToTimecode( iSeconds ):
+    milliseconds = int( round( iSeconds * 1000 ) )
+    hours, milliseconds = divmod( milliseconds, 3600 * 1000 )
+    minutes, milliseconds = divmod( milliseconds, 60 * 1000 )
+    seconds, milliseconds = divmod( milliseconds, 1000 )
+    return f'{hours:02}:{minutes:02}:{seconds:02}.{milliseconds:03}'
+
 ## Manage scene
 #
 #  A scene is one (or more) sequence(s) inside the source file
@@ -59,10 +80,9 @@ def AddInterval( self, iInterval ):
 
     ## Build all the output pathfiles
     #
-    #  @param  iOutputRoot  pathlib.Path  The directory in which all the output files will be created
-    def BuildOutput( self, iOutputRoot ):
-        output_directory = iOutputRoot / f'tmp-{self.mVideo.Name()}'
-        output_directory.mkdir( exist_ok=True )
+    #  The segments are created in the working directory of the video
+    def BuildOutput( self ):
+        output_directory = self.mVideo.Temporary()
 
         # self.mOutputClean = output_directory / f'{self.mVideo.Name()}.clean.ts'
 
@@ -120,6 +140,12 @@ def To( self, iTo=None ):
         self.mTo = iTo
         return previous_value
 
+    ## Get the duration of the interval
+    #
+    #  @return  float  The duration (in seconds)
+    def Duration( self ):
+        return TimecodeToSeconds( self.mTo ) - TimecodeToSeconds( self.mSS )
+
     ## Manage the video stream map
     #
     #  @param  iVMap  string  Set the map (if not None)
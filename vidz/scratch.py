@@ -0,0 +1,161 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package scratch
+#  Manage the scratch space of the working directories
+
+import os
+from pathlib import Path
+import shutil
+import threading
+import time
+
+from colorama import Fore
+
+from .size import FormatSize
+
+## The prefix of the working directories
+PREFIX = 'tmp-'
+
+## The marker file of the working directories kept on purpose (never removed as stale)
+KEEP = 'vidz.keep'
+
+## Get the size of a directory (and its sub-directories)
+#
+#  @param  iPath  pathlib.Path  The directory
+#  @return        int           The size (in bytes)
+def DirectorySize( iPath ):
+    size = 0
+    directories = [ iPath ]
+    while directories:
+        try:
+            with os.scandir( directories.pop() ) as it:
+                for entry in it:
+                    if entry.is_dir( follow_symlinks=False ):
+                        directories.append( entry.path )
+                    elif entry.is_file( follow_symlinks=False ):
+                        size += entry.stat().st_size
+        except OSError:
+            continue
+    return size
+
+#---
+
+## The scratch space
+#
+#  The working directories ('tmp-<name>') of the videos are created in the root (a fast local disk, like a ssd or a tmpfs).
+#  A video is admitted only when its estimated intermediate files fit in the quota (with the ones of the running videos),
+#  otherwise it waits for them to finish (a video bigger than the quota runs alone).
+#  The working directory is removed when the video is converted (or marked as kept),
+#  and the ones of the previous runs which have not been modified for a long time (and not kept) are removed on startup
+class cScratch:
+
+    ## The constructor
+    #
+    #  @param  iRoot    pathlib.Path  The directory of the working directories
+    #  @param  iQuota   int           The maximum size of the working directories (in bytes), None for no limit
+    #  @param  iMaxAge  float         The age (in days) of the stale working directories, None to keep them
+    #  @param  iKeep    bool          Keep the working directories of the converted videos
+    def __init__( self, iRoot, iQuota=None, iMaxAge=7, iKeep=False ):
+        self.mRoot = iRoot
+        self.mQuota = iQuota
+        self.mMaxAge = iMaxAge
+        self.mKeep = iKeep
+
+        self.mReserved = {}     # name -> size
+        self.mCondition = threading.Condition()
+
+        self.mRoot.mkdir( parents=True, exist_ok=True )
+
+    ## Get the root
+    #
+    #  @return  pathlib.Path  The directory of the working directories
+    def Root( self ):
+        return self.mRoot
+
+    ## Get the working directory of a video
+    #
+    #  @param  iName  string        The name of the video
+    #  @return        pathlib.Path  The working directory
+    def Directory( self, iName ):
+        return self.mRoot / f'{PREFIX}{iName}'
+
+    ## Remove the stale working directories
+    #
+    #  The directories marked as kept (-k) are never removed
+    #
+    #  @param  iNames  string[]  The names of the videos of the current run (their directories are kept to resume them)
+    def Evict( self, iNames=[] ):
+        if self.mMaxAge is None:
+            return
+
+        kept = { f'{PREFIX}{name}' for name in iNames }
+        limit = time.time() - self.mMaxAge * 24 * 60 * 60
+        with os.scandir( self.mRoot ) as it:
+            entries = [ entry for entry in it if entry.name.startswith( PREFIX ) and entry.name not in kept and entry.is_dir() ]
+
+        for entry in entries:
+            path = Path( entry.path )
+            if ( path / KEEP ).exists() or self._LastModification( path ) > limit:
+                continue
+
+            size = DirectorySize( path )
+            shutil.rmtree( path, ignore_errors=True )
+            print( Fore.CYAN + f'stale working directory removed: {entry.name} [{FormatSize( size )}]' )
+
+    ## Wait until the intermediate files of a video fit in the quota
+    #
+    #  @param  iName  string  The name of the video
+    #  @param  iSize  int     The estimated size of its intermediate files (in bytes)
+    #  @param  iWait  bool    Wait for the space (otherwise, return immediately)
+    #  @return        bool    The video is admitted
+    def Admit( self, iName, iSize, iWait=True ):
+        with self.mCondition:
+            if iName in self.mReserved:
+                return True
+
+            # The files of a previous (interrupted) run are already on the disk
+            size = max( iSize - DirectorySize( self.Directory( iName ) ), 0 )
+            if self.mQuota is not None:
+                if size > self.mQuota:
+                    print( Fore.YELLOW + f'working directory bigger than the quota: {iName} [{FormatSize( size )} > {FormatSize( self.mQuota )}]' )
+                while self.mReserved and sum( self.mReserved.values() ) + size > self.mQuota:
+                    if not iWait:
+                        return False
+                    self.mCondition.wait()
+
+            self.mReserved[iName] = size
+            return True
+
+    ## Give back the space of a video
+    #
+    #  @param  iName     string  The name of the video
+    #  @param  iSuccess  bool    The video has been converted (its working directory is removed, or marked as kept)
+    def Release( self, iName, iSuccess ):
+        if iSuccess and not self.mKeep:
+            shutil.rmtree( self.Directory( iName ), ignore_errors=True )
+        elif iSuccess and self.Directory( iName ).exists():
+            ( self.Directory( iName ) / KEEP ).touch()
+
+        with self.mCondition:
+            self.mReserved.pop( iName, None )
+            self.mCondition.notify_all()
+
+    #---
+
+    def _LastModification( self, iPath ):
+        mtime = iPath.stat().st_mtime
+        for root, directories, files in os.walk( iPath ):
+            for name in files:
+                try:
+                    mtime = max( mtime, os.stat( os.path.join( root, name ) ).st_mtime )
+                except OSError:
+                    continue
+        return mtime
@@ -0,0 +1,111 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package shared
+#  Manage the sources shared by multiple videos
+
+import threading
+
+from colorama import Fore
+
+## Group the converters by source
+#
+#  The converters which share a source (directly or through another converter) are in the same group,
+#  they are moved next to the first one (the order of the groups and inside the groups is kept),
+#  and the groups of multiple videos (with segments) get a shared extraction.
+#  The segments of all the videos of a shared extraction are created at the same time,
+#  so a group is split in shared extractions of at most iMaxVideos videos (like the videos cleaned in advance by the pipeline)
+#
+#  @param  iConverts   cConvert[]  The converters
+#  @param  iMaxVideos  int         The maximum number of videos of a shared extraction, None for no limit
+#  @return             cConvert[]  The converters in the new order
+def PlanBySource( iConverts, iMaxVideos=None ):
+    parents = list( range( len( iConverts ) ) )
+    def Root( iIndex ):
+        while parents[iIndex] != iIndex:
+            iIndex = parents[iIndex]
+        return iIndex
+
+    owners = {}     # source -> index of the first converter
+    for i, convert in enumerate( iConverts ):
+        for pathfile in convert.Sources():
+            if pathfile not in owners:
+                owners[pathfile] = i
+                continue
+
+            # The smallest index is the root: the group stays at the place of its first converter
+            first, second = sorted( ( Root( owners[pathfile] ), Root( i ) ) )
+            parents[second] = first
+
+    groups = {}
+    for i, convert in enumerate( iConverts ):
+        groups.setdefault( Root( i ), [] ).append( convert )
+
+    converts = []
+    for group in groups.values():
+        converts += group
+
+        pending_converts = [ convert for convert in group if convert.PendingCleans() ]
+        size = iMaxVideos if iMaxVideos is not None else len( pending_converts )
+        for i in range( 0, len( pending_converts ), max( size, 1 ) ):
+            shared_converts = pending_converts[i:i + size]
+            if len( shared_converts ) < 2:
+                continue
+
+            shared = cSharedClean( shared_converts )
+            for convert in shared_converts:
+                convert.Shared( shared )
+            print( Fore.CYAN + f'shared sources: {", ".join( convert.Video().Name() for convert in shared_converts )}' )
+
+    return converts
+
+#---
+
+## The extraction of the intervals of multiple videos which share sources
+#
+#  Each source is read only once: all the intervals (of all the videos) of a source are the outputs of one command.
+#  It's run by the first video which needs its segments, the other videos find their segments already done
+class cSharedClean:
+
+    ## The constructor
+    #
+    #  @param  iConverts  cConvert[]  The converters of the videos
+    def __init__( self, iConverts ):
+        self.mConverts = iConverts
+        self.mDone = False
+
+        self.mLock = threading.Lock()
+
+    ## Extract the intervals (only the first time)
+    #
+    #  A video is included only if its segments fit in the scratch space now (it's not waited),
+    #  and the intervals of the failed commands are extracted later by each video
+    def Run( self ):
+        with self.mLock:
+            if self.mDone:
+                return
+            self.mDone = True
+
+            tasks = {}      # source -> (converter, scene, interval, segment)[]
+            for convert in self.mConverts:
+                scratch = convert.Scratch()
+                if scratch is not None and not scratch.Admit( convert.Video().Name(), convert.TemporarySize(), False ):
+                    continue
+
+                for scene, interval, segment in convert.PendingCleans():
+                    tasks.setdefault( scene.Source().PathFile(), [] ).append( ( convert, scene, interval, segment ) )
+
+            for pathfile, source_tasks in tasks.items():
+                # Only 1 video: its intervals are extracted by the video itself (maybe concurrently)
+                if len( { id( convert ) for convert, _, _, _ in source_tasks } ) < 2:
+                    continue
+
+                if not source_tasks[0][0].RunCleanShared( pathfile, source_tasks ):
+                    print( Fore.YELLOW + f'can\'t extract the shared source, extract each video: {pathfile}' )
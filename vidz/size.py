@@ -0,0 +1,40 @@
+#
+# Copyright (c) 2019-23 m-ll. All Rights Reserved.
+#
+# Licensed under the MIT License.
+# See LICENSE file in the project root for full license information.
+#
+# 2b13c8312f53d4b9202b6c8c0f0e790d10044f9a00d8bab3edf3cd287457c979
+# 29c355784a3921aa290371da87bce9c1617b8584ca6ac6fb17fb37ba4a07d191
+#
+
+## @package size
+#  Manage sizes of files
+
+import math
+
+## Convert a size string to a number of bytes
+#
+#  @param  iSize  string  The size ('123', '500M', '50G', '1.5T')
+#  @return        int     The number of bytes
+def ParseSize( iSize ):
+    size = str( iSize ).strip().upper().rstrip( 'OB' )
+    units = 'KMGTP'
+    if size and size[-1] in units:
+        return int( float( size[:-1] ) * 1024 ** ( units.index( size[-1] ) + 1 ) )
+    return int( float( size ) )
+
+## Convert a number of bytes to a readable string
+#
+#  @param  iSize    int     The number of bytes
+#  @param  iSuffix  string  The suffix of the unit
+#  @return          string  The readable size ('1.5 Go')
+def FormatSize( iSize, iSuffix='o' ):
+    if iSize <= 0:
+        return f'0 {iSuffix}'
+
+    magnitude = int( math.floor( math.log( iSize, 1024 ) ) )
+    val = iSize / math.pow( 1024, magnitude )
+    if magnitude > 7:
+        return '{:.1f}{}{}'.format( val, 'Y', iSuffix )
+    return '{:3.1f} {}{}'.format( val, ['', 'K', 'M', 'G', 'T', 'P', 'E', 'Z'][magnitude], iSuffix )
@@ -11,21 +11,22 @@
 ## @package source
 #  Manage source file
 
+import hashlib
 from pathlib import Path
-import random
 
 ## Manage source file
 class cSource:
 
     ## Create a source
     #
-    #  @param  iXMLNode  xml.etree.ElementTree.Element      The node of the source
-    #  @return           cSource  The source depending of the node
-    #  @return           None     No source was found for the node
-    def Create( iXMLNode ):
+    #  @param  iXMLNode     xml.etree.ElementTree.Element      The node of the source (or its attributes in a dict)
+    #  @param  iRecordings  cRecordings  The recordings of the dvr drives (None to search on the default drives)
+    #  @return              cSource      The source depending of the node
+    #  @return              None         No source was found for the node
+    def Create( iXMLNode, iRecordings=None ):
         dvd = iXMLNode.get( 'dvd' )
         if dvd is not None:
-            return cSourceDVD( dvd )
+            return cSourceDVD( dvd, iRecordings )
 
         pathfile = iXMLNode.get( 'file' )
         if pathfile is not None:
@@ -60,24 +61,43 @@ def Id( self ):
     def PathFile( self ):
         return self.mPathFile
 
+    ## Get the identity of the source file
+    #
+    #  It changes if the file is modified (or replaced)
+    #
+    #  @return  list  The resolved pathfile, the size and the modification time
+    def Fingerprint( self ):
+        stat = self.mPathFile.stat()
+        return [ str( self.mPathFile.resolve() ), stat.st_size, stat.st_mtime_ns ]
+
 #---
 
 ## Manage dvd source file
 #
-#  It can only manage a harddisk on drive f: / g: / h:
-#  and the structure inside must be like dvd (f:/LGDVR/000000XXREC/*.TS)
+#  The structure inside the drives must be like dvd (f:/LGDVR/000000XXREC/*.TS).
+#  The recording is found in the index of the drives, or on the drive f: / g: / h: without index
 class cSourceDVD( cSource ):
 
     ## The constructor
     #
-    #  @param  iId  int  The id of the source
-    def __init__( self, iId ):
+    #  @param  iId          int          The id of the source
+    #  @param  iRecordings  cRecordings  The recordings of the dvr drives (None to search on the default drives)
+    def __init__( self, iId, iRecordings=None ):
         super().__init__( iId )
+        self.mRecordings = iRecordings
 
     ## Build the source path
     #
     #  @return  bool  The file has been build and found
     def Build( self ):
+        if self.mRecordings is not None:
+            recording = self.mRecordings.Recording( self.Id() )
+            if recording is None:
+                return False
+
+            self.mPathFile = Path( recording['files'][0] )
+            return True
+
         path = Path( 'F:' ) / 'LGDVR' / f'000000{self.Id()}REC'
         source_pathfile = list( path.glob( '*.TS' ) )
         if source_pathfile:
@@ -108,7 +128,8 @@ class cSourceFile( cSource ):
     #  @param  iId     int     The id of the source
     #  @param  iInput  string  The input pathfile
     def __init__( self, iInput ):
-        super().__init__( random.randint( 1000, 9999 ) )
+        # Same id for each run, to find the segments of the previous runs
+        super().__init__( int( hashlib.sha1( iInput.encode() ).hexdigest(), 16 ) % 9000 + 1000 )
         self.mInput = iInput
 
     ## Build the source path
@@ -26,7 +26,9 @@ def __init__( self, iId, iName, iQScale ):
         self.mQScale = int( iQScale )
 
         # self.mOutputClean = None
+        self.mTemporary = None
         self.mSegmentList = None
+        self.mManifest = None
         self.mOutputAvi = None
 
     ## Get the id
@@ -49,21 +51,40 @@ def QScale( self ):
 
     ## Build all the output pathfiles
     #
-    #  @param  iOutputRoot  pathlib.Path  The directory in which all the output files will be created
-    def BuildOutput( self, iOutputRoot ):
-        output_directory = iOutputRoot / f'tmp-{self.mName}'
-        output_directory.mkdir( exist_ok=True )
+    #  The manifest is kept in the output root: the working directory is removed when the video is converted
+    #
+    #  @param  iOutputRoot     pathlib.Path  The directory in which all the output files will be created
+    #  @param  iTemporaryRoot  pathlib.Path  The directory in which the working directory will be created (the output root by default)
+    def BuildOutput( self, iOutputRoot, iTemporaryRoot=None ):
+        self.mTemporary = ( iTemporaryRoot or iOutputRoot ) / f'tmp-{self.mName}'
+        self.mTemporary.mkdir( exist_ok=True )
+
+        manifest_directory = iOutputRoot / 'vidz.manifests'
+        manifest_directory.mkdir( exist_ok=True )
 
-        self.mSegmentList = output_directory / f'{self.mName}.list.txt'
+        self.mSegmentList = self.mTemporary / f'{self.mName}.list.txt'
+        self.mManifest = manifest_directory / f'{self.mName}.manifest.json'
 
         self.mOutputAvi = iOutputRoot / f'{self.mName}.avi'
 
+    ## Get the working directory (for the intermediate files)
+    #
+    #  @return  Path  The working directory
+    def Temporary( self ) -> Path:
+        return self.mTemporary
+
     ## Get pathfile of the list file (a txt file containing 1 line for each subfile)
     #
     #  @return  Path  The list file
     def SegmentList( self ) -> Path:
         return self.mSegmentList
 
+    ## Get pathfile of the manifest (a json file containing the completed steps)
+    #
+    #  @return  Path  The manifest file
+    def Manifest( self ) -> Path:
+        return self.mManifest
+
     ## Get pathfile of the avi (final) file
     #
     #  @return  Path  The avi file
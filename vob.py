@@ -12,18 +12,40 @@
 import argparse
 import os
 from pathlib import Path
-import subprocess
+import shutil
 import sys
+import time
 import xml.etree.ElementTree as ET
 
-from colorama import init, deinit, Fore, Back, Style
+from colorama import init, Fore, Back
 init( autoreset=True )
 
+from vidz.budget import cThreadBudget, JobType
+from vidz.catalog import cCatalog
+from vidz.chunk import cChunkEncoder
+from vidz.devices import cDeviceLimits, ParseLimits, CommandFiles
+from vidz.deinterlace import cDeinterlace, MODES, FILTERS
+from vidz.history import cHistory, Drive, Profile
+from vidz.manifest import PartialOutput
+from vidz.passthrough import cCodecs, ParseCodecs, MODES as CODECS_MODES, VIDEO_CODECS, AUDIO_CODECS
+from vidz.probe import cProbe, FRENCH
+from vidz.runner import cRunner, cResult
+from vidz.scene import TimecodeToSeconds
+from vidz.scratch import cScratch
+from vidz.size import ParseSize
+
 #---
 
 parser = argparse.ArgumentParser( description='Concat vob files' )
 parser.add_argument( '-i', '--input', nargs='+', default=[],  help='One (or multiple) entry(ies) id in the xml' )
 parser.add_argument( '-d', action='store_true', help='Test a segment to check sound streams (to find french one)' )
+parser.add_argument( '-c', '--chunks', type=int, default=1, help='Number of chunks encoded at the same time' )
+parser.add_argument( '--deinterlace', choices=MODES, default='auto', help='Deinterlace if the video is interlaced (auto: detected on samples), always or never' )
+parser.add_argument( '--deinterlacer', choices=FILTERS, default='yadif', help='The deinterlacing filter (yadif-fast: cheaper, bwdif: slower but better quality)' )
+parser.add_argument( '--filter-threads', type=int, help='Number of threads of the deinterlacing filter (default: from the budget of threads)' )
+parser.add_argument( '--threads', type=int, default=os.cpu_count(), help='Number of threads shared by all the commands' )
+parser.add_argument( '--codecs', choices=CODECS_MODES, default='transcode', help='Always transcode the streams (transcode), copy the ones compatible with the audio-codecs/video-codecs of the xml (auto), or never transcode them (remux)' )
+parser.add_argument( '--concat', choices=[ 'virtual', 'copy', 'cat' ], default='virtual', help='Read the vob files as one input (virtual), or concat them in a file with a kernel copy (copy) or with cat (cat)' )
 args = parser.parse_args()
 
 #---
@@ -51,6 +73,63 @@
     print( Back.RED + f'output path doesn\'t exist: {output}' )
     sys.exit()
 
+budget = cThreadBudget( args.threads )
+
+# The stderr of each command is in its own log file
+runner = cRunner( output / 'vidz.logs' )
+runner.CancelOnInterrupt()
+
+# The measures of each command are saved (with the ones of split-and-clean.py, see report.py)
+history = cHistory( output / 'vidz.history.sqlite', ffmpeg, 'vob', runner )
+
+# The copies on the same (spinning) disk run one after the other (by default, only the dvd drive is limited),
+# and the encodes on the same disk are limited too (but much more of them)
+default_limit, limits, encode_limit = ParseLimits( root.get( 'device-limits' ) )
+if root.get( 'device-limits' ) is None:
+    limits = { root.get( 'dvd-root', 'G:' ): 1 }
+devices = cDeviceLimits( default_limit, limits, encode_limit )
+
+# The working directories (chunks) on a fast disk (the output by default), with the size of their files limited
+scratch_size = root.get( 'scratch-size' )
+# The stale working directories are removed only in a dedicated scratch (by default, the output is shared with the other script)
+scratch_age = root.get( 'scratch-age', '7' if root.get( 'scratch' ) is not None else None )
+scratch = cScratch( Path( root.get( 'scratch', output ) ),
+                    ParseSize( scratch_size ) if scratch_size is not None else None,
+                    float( scratch_age ) if scratch_age else None )
+
+#---
+
+## Execute a command and print information around it
+#
+#  The ffmpeg commands get their threads from the budget
+#
+#  @param  iCommand   string[]                     The command which will be executed
+#  @param  iDuration  float                        The duration (in seconds) of the media produced by the command (unused)
+#  @param  iParallel  int                          The number of similar commands which run at the same time
+#  @param  iOptions   dict                         The options of subprocess.Popen (stdout, ...)
+#  @return            cResult                      The result of the command
+def Execute( iCommand, iDuration=None, iParallel=1, **iOptions ):
+    allocation = None
+    release_devices = None
+    if iCommand[0] == ffmpeg:
+        release_devices = devices.Acquire( CommandFiles( iCommand ), 'copy' if JobType( iCommand ) == 'copy' else 'encode' )
+        allocation = budget.Acquire( iCommand, iParallel )
+        iCommand = allocation.Apply( iCommand )
+
+    print( Fore.YELLOW + ' '.join( map( str, iCommand ) ) )
+
+    try:
+        result = runner.Run( iCommand, **iOptions )
+    finally:
+        if allocation is not None:
+            allocation.Release()
+        if release_devices is not None:
+            release_devices()
+
+    print( ( Fore.YELLOW if result.returncode == 0 else Fore.RED ) + f'{Path( str( iCommand[-1] ) ).name}: {result!r}' )
+
+    return result
+
 #---
 
 ## Manage one source dvd
@@ -62,6 +141,7 @@ def __init__( self, iId ):
         self.mId = iId
         self.mPath = None
         self.mName = '' # Folder name starting with the id
+        self.mFiles = {}
 
     def __str__(self):
         strings = []
@@ -77,19 +157,23 @@ def GetId( self ):
     def GetPath( self ):
         return self.mPath
 
-    ## Build source
-    def Build( self ):
-        path = Path( f'G:' )
-        paths = [ p for p in path.rglob( '*' ) if p.is_dir() and p.name.startswith( self.mId + '.' ) ]
-        if len( paths) != 1:
-            return
+    ## Get the files of the VIDEO_TS folder
+    #
+    #  @return  dict  The size of each file (by name)
+    def GetFiles( self ):
+        return self.mFiles
 
-        path = paths[0] / 'VIDEO_TS'
-        if not path.exists():
+    ## Build source
+    #
+    #  @param  iCatalog  cCatalog  The catalog of the dvd folders
+    def Build( self, iCatalog ):
+        dvd = iCatalog.DVD( self.mId )
+        if dvd is None:
             return
 
-        self.mName = path.parts[-2]
-        self.mPath = path
+        self.mName = dvd['name']
+        self.mPath = Path( dvd['path'] )
+        self.mFiles = dvd['files']
 
 ## Manage consecutive files
 class cConsecutiveFiles:
@@ -105,11 +189,12 @@ def GetFiles( self ):
     ## Build all the files from the first one
     #
     #  @param  iFirstPathFile   pathlib.Path    The path of the first vob part
-    def Build( self, iFirstPathFile ):
+    #  @param  iFiles           dict            The files of the folder (from the catalog)
+    def Build( self, iFirstPathFile, iFiles ):
         file_parts = iFirstPathFile.stem.split( '_' )
         self.mFiles = []
         current_file = iFirstPathFile.parent / ( '_'.join( file_parts ) + '.VOB' )
-        while current_file.exists():
+        while current_file.name in iFiles:
             self.mFiles.append( current_file )
 
             file_parts[-1] = str( int(file_parts[-1]) + 1 )
@@ -128,6 +213,7 @@ def __init__( self, iSource, iName, iQScale ):
 
         self.mOutputConcat = None
         self.mOutputAvi = None
+        self.mOutputTemporary = None
 
     def __str__(self):
         strings = []
@@ -146,6 +232,8 @@ def __str__(self):
     def GetSource( self ):
         return self.mSource
 
+    def GetName( self ):
+        return self.mName
     def GetQScale( self ):
         return self.mQScale
 
@@ -160,25 +248,53 @@ def GetAllFiles( self ):
         return all_files
 
     def AddFiles( self, iVTS, iPosition ):
+        if self.mSource.GetPath() is None:
+            return
+
         first_file = self.mSource.GetPath() / f'VTS_{iVTS:02}_{iPosition}.VOB'
-        if not first_file.exists():
+        if first_file.name not in self.mSource.GetFiles():
             return
 
         consecutive_files = cConsecutiveFiles()
-        consecutive_files.Build( first_file )
+        consecutive_files.Build( first_file, self.mSource.GetFiles() )
 
         self.mFiles.append( consecutive_files )
 
     #---
 
-    def BuildOutput( self, iOutputRoot ):
+    def BuildOutput( self, iOutputRoot, iTemporaryRoot=None ):
         self.mOutputConcat = iOutputRoot / ( self.mName + '.concat.vob' )
         self.mOutputAvi = iOutputRoot / ( self.mName + '.avi' )
+        self.mOutputTemporary = ( iTemporaryRoot or iOutputRoot ) / f'tmp-{self.mName}'
 
     def GetOutputConcat( self ):
         return self.mOutputConcat
     def GetOutputAvi( self ):
         return self.mOutputAvi
+    def GetOutputTemporary( self ):
+        return self.mOutputTemporary
+
+    ## Get the input of the convert
+    #
+    #  @return  pathlib.Path  The concat file (if it exists, or if there is no vob file)
+    #  @return  string        The vob files concatenated by ffmpeg ('concat:VTS_01_1.VOB|VTS_01_2.VOB|...')
+    def GetInput( self ):
+        all_files = self.GetAllFiles()
+        if self.mOutputConcat.exists() or not all_files:
+            return self.mOutputConcat
+
+        return 'concat:' + '|'.join( str( single_file ) for single_file in all_files )
+
+    ## Get the file to probe the streams of the input
+    #
+    #  @return  pathlib.Path  The concat file, or the first vob file
+    #  @return  None          There is no file
+    def GetInputProbe( self ):
+        all_files = self.GetAllFiles()
+        if self.mOutputConcat.exists() or not all_files:
+            return self.mOutputConcat if self.mOutputConcat.exists() else None
+
+        return all_files[0]
 
 #---
 
@@ -189,7 +305,14 @@ def __init__( self, iVideo ):
         self.mVideo = iVideo
 
     ## Concat all the files
-    def Concat( self ):
+    #
+    #  With 'virtual', nothing is written: ffmpeg reads the files as one input (concat protocol)
+    #
+    #  @param  iMode  string  'virtual', 'copy' (copy in the kernel) or 'cat'
+    def Concat( self, iMode='virtual' ):
+        if iMode == 'virtual':
+            return
+
         if self.mVideo.GetOutputConcat().exists():
             return
 
@@ -197,91 +320,252 @@ def Concat( self ):
         if not all_files:
             return
 
+        release_devices = devices.Acquire( [ *all_files, self.mVideo.GetOutputConcat() ] )
+        if iMode == 'copy':
+            start = time.monotonic()
+            try:
+                self._Copy( all_files, self.mVideo.GetOutputConcat() )
+            finally:
+                release_devices()
+            self._Record( cResult( [ 'copy', *all_files, self.mVideo.GetOutputConcat() ], 0, time.monotonic() - start, None,
+                                   self.mVideo.GetOutputConcat().stat().st_size, None, False ) )
+            return
+
         command = [ 'cat' ]
         command += all_files
 
-        with self.mVideo.GetOutputConcat().open( 'w' ) as fd:
-            deinit()
-            init( autoreset=False )
-            print( Fore.YELLOW )
-            print( *command )
-            print( Style.RESET_ALL )
+        temporary = PartialOutput( self.mVideo.GetOutputConcat() )
+        try:
+            with temporary.open( 'w' ) as fd:
+                cp = Execute( command, stdout=fd )
+        finally:
+            release_devices()
+        if cp.returncode:
+            temporary.unlink( missing_ok=True )
+            return
+        os.replace( temporary, self.mVideo.GetOutputConcat() )
 
-            # completed_process = 'xxxxxxxxxxxxxxxxxx'
-            completed_process = subprocess.run( command, stdout=fd )
+        # The output of cat is its stdout (not in the command)
+        self._Record( cResult( [ *command, self.mVideo.GetOutputConcat() ], cp.returncode, cp.WallTime(), cp.CpuTime(),
+                               self.mVideo.GetOutputConcat().stat().st_size, cp.Log(), cp.IsCancelled() ) )
 
-            print( Fore.YELLOW )
-            print( completed_process )
-            print( Style.RESET_ALL )
-            deinit()
-            init( autoreset=True )
+    ## Save the measures of the concat in the history
+    #
+    #  @param  iResult  cResult  The result of the concat
+    def _Record( self, iResult ):
+        history.Record( 'concat', self.mVideo.GetName(), iResult, self.mVideo.GetAllFiles()[0], probe.Duration( self.mVideo.GetOutputConcat() ) )
+
+    ## Concat files without copying the data through python (copy_file_range, or sendfile)
+    #
+    #  @param  iFiles   pathlib.Path[]  The files
+    #  @param  iOutput  pathlib.Path    The concat file
+    def _Copy( self, iFiles, iOutput ):
+        print( Fore.YELLOW + f'copy {len( iFiles )} file(s) -> {iOutput}' )
+
+        temporary = PartialOutput( iOutput )
+        with temporary.open( 'wb' ) as outfile:
+            for single_file in iFiles:
+                with single_file.open( 'rb' ) as infile:
+                    self._CopyFile( infile, outfile, os.fstat( infile.fileno() ).st_size )
+        os.replace( temporary, iOutput )
+
+    def _CopyFile( self, iInFile, iOutFile, iSize ):
+        copied = 0
+        try:
+            while copied < iSize:
+                if hasattr( os, 'copy_file_range' ):
+                    count = os.copy_file_range( iInFile.fileno(), iOutFile.fileno(), iSize - copied )
+                else:
+                    count = os.sendfile( iOutFile.fileno(), iInFile.fileno(), copied, iSize - copied )
+                if not count:
+                    break
+                copied += count
+        except ( AttributeError, OSError ):
+            # Not supported (by the os or between these filesystems)
+            iInFile.seek( copied )
+            iOutFile.seek( 0, os.SEEK_END )
+            shutil.copyfileobj( iInFile, iOutFile, 16 * 1024 * 1024 )
 
 #---
 
 ## Convert vob file to avi
 class cConvert:
     ## The constructor
-    def __init__( self, iVideo, iFFmpeg ):
+    def __init__( self, iVideo, iFFmpeg, iProbe, iDeinterlace, iCodecs ):
         self.mVideo = iVideo
         self.mFFmpeg = iFFmpeg
+        self.mProbe = iProbe
+        self.mDeinterlace = iDeinterlace
+        self.mCodecs = iCodecs
 
         self.mDebugStart = []
         self.mDebugStop = []
         self.mAudioStreams = [ '-map', '0:a' ]
+        self.mAudioOrder = None
         self.mUnknownStreams = []
+        self.mUnknownIndexes = []
 
     ## Build data
     def Build( self, iFirstAudio, iUnknownStreams, iDebug ):
         if iFirstAudio is not None:
             self.mAudioStreams = [ '-map', f'0:a:{iFirstAudio}' ]
+            self.mAudioOrder = [ iFirstAudio ]
             for i in range( 6 ):
                 if i < iFirstAudio:
                     self.mAudioStreams += [ '-map', f'0:a:{i}' ]
+                    self.mAudioOrder.append( i )
                 elif i > iFirstAudio:
                     self.mAudioStreams += [ '-map', f'0:a:{i}?' ]
+                    self.mAudioOrder.append( i )
 
-        for unknown_stream in iUnknownStreams:
+        self.mUnknownIndexes = list( iUnknownStreams )
+        for unknown_stream in self.mUnknownIndexes:
             self.mUnknownStreams = [ '-map', f'-0:{unknown_stream}']
 
         if iDebug:
             self.mDebugStart = [ '-ss', '00:10:00.000' ]
             self.mDebugStop = [ '-to', '00:15:00.000' ]
 
-    def Convert( self ):
+    def Convert( self, iChunks=1 ):
+        # Nothing to encode in parallel
+        if iChunks > 1 and not self._IsVideoCopy():
+            return self._ConvertChunks( iChunks )
+
         command = [ self.mFFmpeg,
                     '-probesize', '100M',
                     '-analyzeduration', str( 10 * 60 * 10**6 ),
-                    '-i', self.mVideo.GetOutputConcat(),
+                    '-i', self.mVideo.GetInput(),
                     *self.mDebugStart,
                     *self.mDebugStop,
                     '-map', '0:v',
                     *self.mAudioStreams,
                     # '-map', '0:s',
                     *self.mUnknownStreams,
-                    '-vf', 'yadif', # https://ffmpeg.org/ffmpeg-filters.html#yadif-1
-                    '-qscale:v', str( self.mVideo.GetQScale() ), '-vtag', 'XVID',
-                    '-c:a', 'copy',
+                    *self._GetVideoParameters(), # https://ffmpeg.org/ffmpeg-filters.html#yadif-1
+                    *self._GetAudioParameters(),
                     self.mVideo.GetOutputAvi() ]
 
-        deinit()
-        init( autoreset=False )
-        print( Fore.YELLOW )
-        print( *command )
-        print( Style.RESET_ALL )
+        result = Execute( command )
+        self._Record( result, self._Duration(), 1 )
+
+    ## Convert with multiple processes (1 for each chunk of the video)
+    #
+    #  @param  iChunks  int  The number of chunks encoded at the same time
+    def _ConvertChunks( self, iChunks ):
+        # The chunks are (about) as big as the video
+        scratch.Admit( self.mVideo.GetName(), sum( pathfile.stat().st_size for pathfile in self.mVideo.GetAllFiles() ) )
+        self.mVideo.GetOutputTemporary().mkdir( exist_ok=True )
+
+        start = TimecodeToSeconds( self.mDebugStart[1] ) if self.mDebugStart else 0
+        end = TimecodeToSeconds( self.mDebugStop[1] ) if self.mDebugStop else None
+
+        pathfile = self.mVideo.GetInputProbe()
+        deinterlace_filter = self.mDeinterlace.Filter( [ pathfile ] if pathfile is not None else [] )
+        baseline_speed = history.Speed( 'convert', Profile( 'vob', self.mVideo.GetQScale(), 1, deinterlace_filter ),
+                                        Drive( pathfile ) if pathfile is not None else None, iFallback=False )
+
+        encoder = cChunkEncoder( self.mFFmpeg, self.mProbe, iChunks,
+                                 iRun=lambda iCommand, iDuration=None: self._Record( Execute( iCommand, iDuration, iChunks ), iDuration, iChunks ),
+                                 iBaselineSpeed=baseline_speed )
+        success = encoder.Run( self.mVideo.GetInput(),
+                               [ '-probesize', '100M', '-analyzeduration', str( 10 * 60 * 10**6 ) ],
+                               start, end,
+                               [ '-map', '0:v', *self._GetVideoParameters() ],
+                               [ *self.mAudioStreams, *self.mUnknownStreams, *self._GetAudioParameters() ],
+                               self.mVideo.GetOutputAvi(), self.mVideo.GetOutputTemporary() )
+        scratch.Release( self.mVideo.GetName(), success )
+
+    ## Save the measures of a convert command in the history
+    #
+    #  @param  iResult    cResult  The result of the command
+    #  @param  iDuration  float    The duration (in seconds) of the media produced by the command, None to not save it
+    #  @param  iParallel  int      The number of similar commands which run at the same time
+    #  @return            cResult  The result of the command
+    def _Record( self, iResult, iDuration, iParallel ):
+        if iDuration is None:
+            return iResult
+
+        pathfile = self.mVideo.GetInputProbe()
+        deinterlace_filter = self.mDeinterlace.Filter( [ pathfile ] if pathfile is not None else [] )
+        profile = Profile( 'vob', self.mVideo.GetQScale(), iParallel, deinterlace_filter, self._IsVideoCopy() )
+        history.Record( 'convert', self.mVideo.GetName(), iResult, pathfile, iDuration, profile, self.mVideo.GetQScale(), iParallel,
+                        self.mProbe.FrameRate( pathfile ) if pathfile is not None else None )
+        return iResult
+
+    ## Get the duration of the converted part of the input
+    #
+    #  @return  float  The duration (in seconds)
+    #  @return  None   The duration is unknown
+    def _Duration( self ):
+        if self.mDebugStart:
+            return TimecodeToSeconds( self.mDebugStop[1] ) - TimecodeToSeconds( self.mDebugStart[1] )
+
+        if self.mVideo.GetOutputConcat().exists():
+            return self.mProbe.Duration( self.mVideo.GetOutputConcat() )
 
-        # completed_process = 'xxxxxxxxxxxxxxxxxx'
-        completed_process = subprocess.run( command )
+        durations = [ self.mProbe.Duration( pathfile ) for pathfile in self.mVideo.GetAllFiles() ]
+        if not durations or None in durations:
+            return None
+        return sum( durations )
 
-        print( Fore.YELLOW )
-        print( completed_process )
-        print( Style.RESET_ALL )
-        deinit()
-        init( autoreset=True )
+    ## Get the video stream of the input
+    #
+    #  @return  dict  The stream (from cProbe.Info)
+    #  @return  None  The stream is unknown
+    def _GetVideoStream( self ):
+        pathfile = self.mVideo.GetInputProbe()
+        info = self.mProbe.Info( pathfile ) if pathfile is not None else None
+        if info is None:
+            return None
+        return next( ( stream for stream in info['streams'] if stream['type'] == 'video' ), None )
+
+    ## Check if the video stream is copied (compatible and not deinterlaced)
+    #
+    #  @return  bool  The video stream is copied
+    def _IsVideoCopy( self ):
+        return self.mCodecs.IsVideoCopy( [ self._GetVideoStream() ], bool( self._GetDeinterlaceParameters() ) )
+
+    ## Get the parameters of the video stream (deinterlacing and codec)
+    #
+    #  @return  string[]  The parameters
+    def _GetVideoParameters( self ):
+        parameters = self.mCodecs.VideoParameters( [ self._GetVideoStream() ], self.mVideo.GetQScale(), bool( self._GetDeinterlaceParameters() ) )
+        if self._IsVideoCopy():
+            return parameters
+        return [ *self._GetDeinterlaceParameters(), *parameters ]
+
+    ## Get the parameters of the audio streams (codecs)
+    #
+    #  The mapped audio streams are the first-audio one, then the others (without the unknown streams)
+    #
+    #  @return  string[]  The parameters
+    def _GetAudioParameters( self ):
+        pathfile = self.mVideo.GetInputProbe()
+        streams = self.mProbe.AudioStreams( pathfile ) if pathfile is not None else []
+        order = self.mAudioOrder if self.mAudioOrder is not None else range( len( streams ) )
+        mapped = [ streams[i] for i in order if i < len( streams ) and streams[i]['index'] not in self.mUnknownIndexes ]
+        return self.mCodecs.AudioParameters( [ [ stream ] for stream in mapped ] )
+
+    ## Get the parameters of the deinterlacing (only if the video is interlaced)
+    #
+    #  @return  string[]  The parameters
+    def _GetDeinterlaceParameters( self ):
+        pathfile = self.mVideo.GetInputProbe()
+        return self.mDeinterlace.Parameters( [ pathfile ] if pathfile is not None else [] )
 
 #---
 
 # https://www.internalpointers.com/post/convert-vob-files-mkv-ffmpeg
 
+probe = cProbe( ffprobe, output / 'vidz.probe.json', ffmpeg, runner )
+deinterlace = cDeinterlace( probe, args.deinterlace, args.deinterlacer, args.filter_threads )
+codecs = cCodecs( args.codecs, ParseCodecs( root.get( 'video-codecs' ), VIDEO_CODECS ), ParseCodecs( root.get( 'audio-codecs' ), AUDIO_CODECS ) )
+
+# The dvd folders are read once (only the modified ones since the previous run)
+catalog = cCatalog( Path( root.get( 'dvd-root', 'G:' ) ), output / 'vidz.dvd.json' )
+
+scratch.Evict( [ xml_video.get( 'name' ) for entry in args.input for xml_video in root.findall( f'./source[@id="{entry}"]/video' ) ] )
+
 for entry in args.input:
     xml_sources = root.findall( f'./source[@id="{entry}"]' )
     if not xml_sources:
@@ -293,27 +577,34 @@ def Convert( self ):
 
     xml_source = xml_sources[0]
     source = cSource( xml_source.get( 'id' ) )
-    # source.Build()
+    source.Build( catalog )
 
     print( source )
 
     for xml_video in xml_source.findall( 'video' ):
         video = cVideo( source, xml_video.get( 'name' ), xml_video.get( 'qscale' ) )
-        video.BuildOutput( output )
+        video.BuildOutput( output, scratch.Root() )
 
-        # for xml_file in xml_video.findall( 'file' ):
-        #     video.AddFiles( int(xml_file.get( 'vts' )), int(xml_file.get( 'position' )) )
+        for xml_file in xml_video.findall( 'file' ):
+            video.AddFiles( int(xml_file.get( 'vts' )), int(xml_file.get( 'position' )) )
 
         print( video )
 
-        # concat = cConcat( video )
-        # concat.Concat()
+        concat = cConcat( video )
+        concat.Concat( args.concat )
 
         #---
 
         first_audio = int( xml_video.get( 'first-audio' ) ) if xml_video.get( 'first-audio' ) is not None else None
+        # Without first-audio, use the french stream (if the languages are known)
+        if first_audio is None and video.GetInputProbe() is not None:
+            languages = [ ( stream['language'] or '' ).lower() for stream in probe.AudioStreams( video.GetInputProbe() ) ]
+            french = [ i for i, language in enumerate( languages ) if language in FRENCH ]
+            if french and french[0] != 0:
+                first_audio = french[0]
+                print( Fore.CYAN + f'first-audio (probed): {first_audio}' )
         unknown_streams = map( int, xml_video.get( 'unknown-streams' ).split( ',' ) ) if xml_video.get( 'unknown-streams' ) is not None else []
 
-        convert = cConvert( video, ffmpeg )
+        convert = cConvert( video, ffmpeg, probe, deinterlace, codecs )
         convert.Build( first_audio, unknown_streams, args.d )
-        convert.Convert()
+        convert.Convert( args.chunks )